@@ -0,0 +1,167 @@
+"""Compare HTTP/1.1 with HTTP/2 for many concurrent requests, against a local stand-in for the Anilist API.
+
+The stand-in server waits `HANDSHAKE_SECONDS` on every new connection (like a TCP and TLS handshake would) and `RESPONSE_SECONDS` before each response.
+It doesn't use TLS, so HTTP/2 is used with prior knowledge here instead of being negotiated like it is with Anilist (see `ANILIST_HTTP2_ENABLED`).
+
+Run with `python -m benchmarks.http2` (needs the `http2` extra and the usual `ANILIST_` settings).
+"""
+
+import asyncio
+import json
+from time import perf_counter
+from typing import Dict, List
+
+import h11
+import httpx
+from h2.config import H2Configuration
+from h2.connection import H2Connection
+from h2.events import RequestReceived, StreamEnded
+
+from nifty_anilist.settings import anilist_settings
+
+
+HANDSHAKE_SECONDS = 0.03
+RESPONSE_SECONDS = 0.02
+HTTP2_PREFACE = b"PRI * HTTP/2.0"
+
+RESPONSE_BODY = json.dumps({"data": {"Media": {"id": 1}}}).encode()
+
+
+class StandInServer:
+    """Local server that answers every request with the same GraphQL result, over HTTP/1.1 or HTTP/2."""
+
+    def __init__(self) -> None:
+        self.connection_count = 0
+
+    async def handle_connection(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter
+    ) -> None:
+        self.connection_count += 1
+        await asyncio.sleep(HANDSHAKE_SECONDS)
+        data = await reader.read(65536)
+
+        try:
+            if data.startswith(HTTP2_PREFACE):
+                await self.handle_http2(reader, writer, data)
+            else:
+                await self.handle_http1(reader, writer, data)
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def handle_http1(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: bytes
+    ) -> None:
+        connection = h11.Connection(h11.SERVER)
+
+        while data:
+            connection.receive_data(data)
+
+            while True:
+                event = connection.next_event()
+
+                if event is h11.NEED_DATA:
+                    break
+
+                if isinstance(event, h11.EndOfMessage):
+                    await asyncio.sleep(RESPONSE_SECONDS)
+                    writer.write(
+                        connection.send(
+                            h11.Response(
+                                status_code=200,
+                                headers=[
+                                    ("Content-Type", "application/json"),
+                                    ("Content-Length", str(len(RESPONSE_BODY))),
+                                ],
+                            )
+                        )
+                        + connection.send(h11.Data(data=RESPONSE_BODY))
+                        + connection.send(h11.EndOfMessage())
+                    )
+                    connection.start_next_cycle()
+
+            data = await reader.read(65536)
+
+    async def handle_http2(
+        self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter, data: bytes
+    ) -> None:
+        connection = H2Connection(H2Configuration(client_side=False))
+        connection.initiate_connection()
+        responses: List[asyncio.Task] = []
+
+        async def respond(stream_id: int) -> None:
+            await asyncio.sleep(RESPONSE_SECONDS)
+            connection.send_headers(
+                stream_id,
+                [
+                    (":status", "200"),
+                    ("content-type", "application/json"),
+                    ("content-length", str(len(RESPONSE_BODY))),
+                ],
+            )
+            connection.send_data(stream_id, RESPONSE_BODY, end_stream=True)
+            writer.write(connection.data_to_send())
+
+        while data:
+            for event in connection.receive_data(data):
+                if isinstance(event, RequestReceived) and event.stream_ended:
+                    responses.append(asyncio.create_task(respond(event.stream_id)))
+                elif isinstance(event, StreamEnded):
+                    responses.append(asyncio.create_task(respond(event.stream_id)))
+
+            writer.write(connection.data_to_send())
+            data = await reader.read(65536)
+
+        for response in responses:
+            response.cancel()
+
+
+async def run_requests(
+    url: str, http2: bool, request_count: int, concurrency: int
+) -> float:
+    """Send requests through a pooled transport with the same limits as the Anilist clients, and get how long they took."""
+    transport = httpx.AsyncHTTPTransport(
+        http1=not http2,
+        http2=http2,
+        limits=httpx.Limits(
+            max_connections=anilist_settings.http_max_connections,
+            max_keepalive_connections=anilist_settings.http_max_keepalive_connections,
+            keepalive_expiry=anilist_settings.http_keepalive_expiry_seconds,
+        ),
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=transport) as http_client:
+
+        async def send_request() -> Dict:
+            async with semaphore:
+                response = await http_client.post(
+                    url, json={"query": "{ Media(id: 1) { id } }"}
+                )
+                return response.json()
+
+        start = perf_counter()
+        await asyncio.gather(*(send_request() for _ in range(request_count)))
+        return perf_counter() - start
+
+
+async def main(request_count: int = 500, concurrency: int = 50) -> None:
+    for http2 in (False, True):
+        stand_in = StandInServer()
+        server = await asyncio.start_server(stand_in.handle_connection, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+
+        async with server:
+            seconds = await run_requests(
+                f"http://127.0.0.1:{port}/", http2, request_count, concurrency
+            )
+
+        print(
+            f"{'HTTP/2' if http2 else 'HTTP/1.1':>8}: {request_count} requests ({concurrency} at a time) in {seconds * 1000:.0f}ms, "
+            f"{stand_in.connection_count} connection(s)"
+        )
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
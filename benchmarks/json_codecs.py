@@ -0,0 +1,149 @@
+"""Compare the JSON codecs on Anilist responses, for decoding responses and encoding request bodies.
+
+Run with `python -m benchmarks.json_codecs [response.json ...]` (the usual `ANILIST_` settings need to be set).
+Give the paths of recorded Anilist responses to use them, otherwise a page of 50 media with their stats, tags, characters and staff is generated (about 1.3MB).
+Codecs whose library isn't installed are skipped.
+"""
+
+import sys
+from timeit import timeit
+from typing import Any, Dict, List
+
+from nifty_anilist.client.enums import MediaSort, MediaType
+from nifty_anilist.client.input_types import FuzzyDateInput
+from nifty_anilist.settings import JsonCodecType
+from nifty_anilist.utils.json_utils import create_json_codec, StdlibJsonCodec
+
+
+def generate_media(media_id: int) -> Dict[str, Any]:
+    """Generate a media with the same shape (and roughly the same size) as a detailed one from Anilist."""
+    return {
+        "id": media_id,
+        "idMal": media_id + 100_000,
+        "title": {
+            "romaji": f"Sousou no Frieren {media_id}",
+            "english": f"Frieren: Beyond Journey's End {media_id}",
+            "native": f"葬送のフリーレン {media_id}",
+        },
+        "type": "ANIME",
+        "format": "TV",
+        "status": "FINISHED",
+        "description": "The adventure is over but life goes on for an elf mage just beginning to learn what living is all about. <br><br>"
+        * 40,
+        "startDate": {"year": 2023, "month": 9, "day": 29},
+        "endDate": {"year": 2024, "month": 3, "day": 22},
+        "episodes": 28,
+        "genres": ["Adventure", "Drama", "Fantasy"],
+        "averageScore": 91,
+        "popularity": 350_000 + media_id,
+        "tags": [
+            {"id": tag_id, "name": f"Tag {tag_id}", "rank": 95 - tag_id}
+            for tag_id in range(20)
+        ],
+        "stats": {
+            "scoreDistribution": [
+                {"score": score, "amount": score * 123} for score in range(10, 101, 10)
+            ],
+            "statusDistribution": [
+                {"status": status, "amount": 10_000 + index}
+                for index, status in enumerate(
+                    ["CURRENT", "PLANNING", "COMPLETED", "DROPPED", "PAUSED"]
+                )
+            ],
+        },
+        "characters": {
+            "edges": [
+                {
+                    "role": "MAIN" if index < 3 else "SUPPORTING",
+                    "node": {
+                        "id": media_id * 100 + index,
+                        "name": {"full": f"Character {index}", "native": "フリーレン"},
+                        "image": {
+                            "large": f"https://s4.anilist.co/file/anilistcdn/character/large/b{media_id}-{index}.png"
+                        },
+                    },
+                    "voiceActors": [
+                        {
+                            "id": index,
+                            "name": {"full": f"Voice Actor {index}"},
+                            "languageV2": "Japanese",
+                        }
+                    ],
+                }
+                for index in range(50)
+            ]
+        },
+        "staff": {
+            "edges": [
+                {
+                    "role": f"Key Animation (ep {index})",
+                    "node": {"id": index, "name": {"full": f"Staff {index}"}},
+                }
+                for index in range(50)
+            ]
+        },
+    }
+
+
+def generate_page() -> bytes:
+    """Generate the JSON of a page of detailed media."""
+    return StdlibJsonCodec().encode(
+        {
+            "data": {
+                "Page": {
+                    "pageInfo": {"hasNextPage": True, "total": 5000},
+                    "media": [generate_media(media_id) for media_id in range(50)],
+                }
+            }
+        }
+    )
+
+
+def get_request_body() -> Dict[str, Any]:
+    """Get the body of a big paginated request, with enums and pydantic inputs in its variables."""
+    return {
+        "query": "query paginated_anilist_query($page_0: Int, $perPage_0: Int) { ... }"
+        * 50,
+        "operationName": "paginated_anilist_query",
+        "variables": {
+            "page_0": 3,
+            "perPage_0": 50,
+            "type_0": MediaType.ANIME,
+            "sort_0": [MediaSort.POPULARITY_DESC, MediaSort.SCORE_DESC],
+            "startDate_greater_0": FuzzyDateInput(year=2020, month=1, day=1),
+            "id_in_0": list(range(500)),
+        },
+    }
+
+
+def main(paths: List[str], number: int = 20) -> None:
+    payloads = {path: open(path, "rb").read() for path in paths} or {
+        "generated page": generate_page()
+    }
+    request_body = get_request_body()
+
+    for codec_type in (
+        JsonCodecType.STDLIB,
+        JsonCodecType.ORJSON,
+        JsonCodecType.MSGSPEC,
+    ):
+        try:
+            codec = create_json_codec(codec_type)
+        except ImportError:
+            print(f"{codec_type.lower():>8}: not installed")
+            continue
+
+        for name, payload in payloads.items():
+            seconds = timeit(lambda: codec.decode(payload), number=number)
+            print(
+                f"{codec.name:>8}: decode {name} ({len(payload) / 1_000_000:.1f}MB) in {seconds / number * 1000:6.2f}ms"
+            )
+
+        seconds = timeit(lambda: codec.encode(request_body), number=number * 50)
+        print(
+            f"{codec.name:>8}: encode request body in {seconds / (number * 50) * 1_000_000:6.1f}us"
+        )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,79 @@
+"""Measure how long the event loop is stalled while large responses are decoded on it, in a worker thread, or in another process.
+
+Run with `python -m benchmarks.json_decode_lag [response.json]` (the usual `ANILIST_` settings need to be set).
+Without a recorded response, the generated page of media from `benchmarks.json_codecs` is used.
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+from typing import List, Optional
+
+from nifty_anilist.settings import JsonCodecType
+from nifty_anilist.utils.json_utils import create_json_codec, get_decode_process_pool
+
+from benchmarks.json_codecs import generate_page
+
+TICK_SECONDS = 0.001
+
+
+async def measure_lag(lags: List[float], stop: asyncio.Event) -> None:
+    """Keep track of how late the event loop wakes up a task that sleeps for a millisecond at a time."""
+    while not stop.is_set():
+        start = perf_counter()
+        await asyncio.sleep(TICK_SECONDS)
+        lags.append(perf_counter() - start - TICK_SECONDS)
+
+
+async def decode_responses(
+    content: bytes,
+    codec_type: JsonCodecType,
+    thread_threshold: Optional[int],
+    process_threshold: Optional[int],
+    count: int = 10,
+) -> None:
+    codec = create_json_codec(codec_type, thread_threshold, process_threshold)
+    lags: List[float] = []
+    stop = asyncio.Event()
+    ticker = asyncio.create_task(measure_lag(lags, stop))
+    await asyncio.sleep(TICK_SECONDS * 5)
+
+    start = perf_counter()
+
+    for _ in range(count):
+        await codec.decode_async(content)
+        await asyncio.sleep(0)
+
+    seconds = perf_counter() - start
+    stop.set()
+    await ticker
+
+    mode = (
+        "process"
+        if process_threshold is not None
+        else "thread" if thread_threshold is not None else "event loop"
+    )
+    print(
+        f"{codec.name:>8} on {mode:>10}: {seconds / count * 1000:6.1f}ms per response, "
+        f"event loop stalled for {sorted(lags)[len(lags) * 95 // 100] * 1000:6.1f}ms at p95 and up to {max(lags) * 1000:6.1f}ms"
+    )
+
+
+async def main(paths: List[str]) -> None:
+    content = open(paths[0], "rb").read() if paths else generate_page()
+    print(f"Decoding a {len(content) / 1_000_000:.1f}MB response:")
+
+    # Start the worker processes before measuring.
+    await asyncio.get_running_loop().run_in_executor(
+        get_decode_process_pool(), len, b""
+    )
+
+    for codec_type in (JsonCodecType.STDLIB, JsonCodecType.AUTO):
+        for thread_threshold, process_threshold in [(None, None), (0, None), (None, 0)]:
+            await decode_responses(
+                content, codec_type, thread_threshold, process_threshold
+            )
+
+
+if __name__ == "__main__":
+    asyncio.run(main(sys.argv[1:]))
@@ -0,0 +1,50 @@
+"""Compare building a GraphQL document through the graphql-core AST with writing it straight from the fields, normally or in compact form.
+
+Run with `python -m benchmarks.operation_printing` (the usual `ANILIST_` settings need to be set).
+"""
+
+from timeit import timeit
+
+from graphql import OperationType
+
+from nifty_anilist.graphql_client import get_bytes_saved, GraphQLClient
+from nifty_anilist.prebuilt.media import MEDIA_LIST_QUERY
+
+
+def main(number: int = 2000) -> None:
+    client = GraphQLClient(url="https://graphql.anilist.co")
+    fields = MEDIA_LIST_QUERY.get_page_query(include_totals=True).fields
+
+    def print_with_ast():
+        client._compile_custom_operation(
+            *fields, operation_type=OperationType.QUERY, operation_name="benchmark"
+        )
+
+    def print_directly():
+        return client._print_custom_operation(
+            *fields, operation_type=OperationType.QUERY, operation_name="benchmark"
+        )
+
+    def print_compact():
+        return client._print_compact_operation(
+            *fields, operation_type=OperationType.QUERY, operation_name="benchmark"
+        )
+
+    for name, function in (
+        ("AST", print_with_ast),
+        ("direct", print_directly),
+        ("compact", print_compact),
+    ):
+        seconds = timeit(function, number=number)
+        print(f"{name:>8}: {seconds / number * 1_000_000:8.1f}us per operation")
+
+    query, variables = print_directly()
+    compact_query, compact_variables = print_compact()
+    bytes_saved = get_bytes_saved(query, variables, compact_query, compact_variables)
+    print(
+        f"Compact document: {len(compact_query)} bytes instead of {len(query)}, {bytes_saved} bytes saved per request with the variable names."
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,7 @@
 from .anilist_client import AnilistClient
+from .anilist_loader import AnilistLoader
 from .auth import (
+    AuthInfo,
     get_auth_info,
     get_global_user,
     logout_global_user,
@@ -9,13 +11,30 @@ from .auth import (
     sign_in_if_no_global,
     sign_in_with_token,
 )
+from .prepared_query import placeholder, Placeholder, PreparedQuery
+from .settings import CachePolicy
+from .utils.cache_utils import MemoryResponseCache, ResponseCache
+from .utils.entity_cache_utils import EntityCache
+from .utils.http_utils import close_connection_pool
+from .utils.rate_limit_utils import RequestPriority
 
 __all__ = [
     "AnilistClient",
+    "AnilistLoader",
+    "AuthInfo",
+    "CachePolicy",
+    "close_connection_pool",
+    "EntityCache",
     "get_auth_info",
     "get_global_user",
     "logout_global_user",
+    "MemoryResponseCache",
+    "placeholder",
+    "Placeholder",
+    "PreparedQuery",
     "remove_user",
+    "RequestPriority",
+    "ResponseCache",
     "set_global_user",
     "sign_in_if_no_global",
     "sign_in_with_token",
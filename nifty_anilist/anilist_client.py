@@ -1,9 +1,24 @@
-from typing import Any, Dict, List, Optional, Union
+import asyncio
+from copy import copy, deepcopy
+from math import ceil
+from typing import (
+    Any,
+    AsyncIterator,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import httpx
+from graphql import OperationType
 
-from nifty_anilist.auth import get_auth_info
-from nifty_anilist.client import Client
+from nifty_anilist.anilist_loader import AnilistLoader
+from nifty_anilist.auth import AuthInfo, get_auth_info
 from nifty_anilist.client.custom_fields import PageInfoFields
 from nifty_anilist.client.custom_queries import (
     ActivityReplyFields,
@@ -25,23 +40,115 @@ from nifty_anilist.client.custom_queries import (
     ThreadFields,
     UserFields,
 )
+from nifty_anilist.client.exceptions import (
+    GraphQLClientGraphQLError,
+    GraphQLClientGraphQLMultiError,
+    GraphQLClientHttpError,
+)
+from nifty_anilist.graphql_client import GraphQLClient
 from nifty_anilist.logging import anilist_logger as logger
+from nifty_anilist.prepared_query import (
+    PAGE_PLACEHOLDER,
+    PER_PAGE_PLACEHOLDER,
+    PreparedQuery,
+)
 
-from nifty_anilist.settings import anilist_settings
+from nifty_anilist.settings import anilist_settings, CachePolicy
 from nifty_anilist.utils.auth_utils import UserId
-from nifty_anilist.utils.request_utils import run_request_with_retry
+from nifty_anilist.utils.cache_utils import RESPONSE_CACHE, ResponseCache
+from nifty_anilist.utils.entity_cache_utils import (
+    ENTITY_CACHE,
+    EntityCache,
+    get_result_tags,
+)
+from nifty_anilist.utils.http_utils import (
+    create_pooled_transport,
+    get_request_timeout,
+    SHARED_TRANSPORT,
+)
+from nifty_anilist.utils.invalidation_utils import update_caches_after_mutation
+from nifty_anilist.utils.json_utils import create_json_codec
+from nifty_anilist.utils.request_utils import (
+    get_graphql_errors,
+    get_operation_key,
+    is_connection_error,
+    RATE_LIMITER,
+    record_rate_limit_headers,
+    RequestPriority,
+    run_request_with_retry,
+)
+
+
+PaginatedQueryRequest = Union[
+    ActivityReplyFields,
+    ActivityUnionUnion,
+    AiringScheduleFields,
+    CharacterFields,
+    MediaFields,
+    MediaListFields,
+    MediaTrendFields,
+    NotificationUnionUnion,
+    RecommendationFields,
+    ReviewFields,
+    StaffFields,
+    StudioFields,
+    ThreadCommentFields,
+    ThreadFields,
+    UserFields,
+]
+"""Fields that can be requested with a paginated request (the list fields of `Page`)."""
+
+BATCH_ALIAS_PREFIX = "batch_"
+"""Prefix of the aliases given to each query in a batch request."""
+
+
+class InFlightRequest:
+    """A request that is in progress, and that identical requests can wait on instead of being sent again."""
+
+    future: asyncio.Future
+    callers: int
+    """Number of requests waiting on its result."""
+
+    def __init__(self, future: asyncio.Future) -> None:
+        self.future = future
+        self.callers = 0
 
 
 class AnilistClient:
 
-    client: Client
+    client: GraphQLClient
+    loader: AnilistLoader
+    """Loader that batches lookups made at around the same time into fewer requests. See `AnilistLoader.load()`."""
+    cache: Optional[ResponseCache]
+    """Cache for the results of queries, or `None` if caching is turned off."""
+    entity_cache: Optional[EntityCache]
+    """Normalized cache for the entities in the results of queries, or `None` if it is turned off."""
+
+    def __init__(
+        self,
+        user_id: Optional[UserId] = None,
+        use_auth: bool = True,
+        cache: Optional[ResponseCache] = None,
+        entity_cache: Optional[EntityCache] = None,
+    ) -> None:
+        """Create a client for the Anilist API.
 
-    def __init__(self, user_id: Optional[UserId] = None, use_auth: bool = True) -> None:
+        Args:
+            user_id: ID of the user to make requests for. Leave empty to use the global user.
+            use_auth: Whether to add the auth header to requests or not. Default is `True`.
+            cache: Cache for the results of queries. Leave as `None` to use the global cache, if `ANILIST_RESPONSE_CACHE_ENABLED` is on.
+            entity_cache: Normalized cache for the entities in the results of queries. Leave as `None` to use the global one, if `ANILIST_ENTITY_CACHE_ENABLED` is on.
+        """
         self.client = self._create_client(user_id, use_auth)
+        self.loader = AnilistLoader(self)
+        self.cache = cache if cache is not None else RESPONSE_CACHE
+        self.entity_cache = entity_cache if entity_cache is not None else ENTITY_CACHE
+        self._in_flight_requests: Dict[str, InFlightRequest] = {}
+        self._background_refreshes: Dict[str, asyncio.Future] = {}
 
     def _create_client(
         self, user_id: Optional[UserId] = None, use_auth: bool = True
-    ) -> Client:
+    ) -> GraphQLClient:
         """Create a client for Anilist requests.
 
         Args:
@@ -53,11 +160,24 @@ class AnilistClient:
         """
         headers = self._create_request_headers(user_id, use_auth)
 
-        client = Client(
+        client = GraphQLClient(
             url=anilist_settings.api_url,
             headers=headers,
+            compact_queries=anilist_settings.compact_queries,
+            json_codec=create_json_codec(
+                anilist_settings.json_codec,
+                anilist_settings.json_decode_thread_threshold_bytes,
+                anilist_settings.json_decode_process_threshold_bytes,
+            ),
             http_client=httpx.AsyncClient(
-                headers=headers, timeout=anilist_settings.request_timeout_seconds
+                headers=headers,
+                timeout=get_request_timeout(),
+                transport=(
+                    SHARED_TRANSPORT
+                    if anilist_settings.http_share_connection_pool
+                    else create_pooled_transport()
+                ),
+                event_hooks={"response": [record_rate_limit_headers]},
             ),
         )
 
@@ -83,8 +203,338 @@ class AnilistClient:
 
         return headers
 
+    async def _request(
+        self,
+        *query_requests: GraphQLField,
+        operation_type: OperationType,
+        operation_name: str,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        cache_ttl_seconds: Optional[float] = None,
+        cache_policy: Optional[CachePolicy] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Make a request to the Anilist GraphQL API, with retrying if we are being rate limited.
+        If the result of the same query is cached (or all of its fields are in the entity cache), it is returned without making a request.
+        If only some of its fields are in the entity cache, only the other ones are requested.
+        If the exact same request is already being made, this will wait for its result instead of making it again.
+
+        Args:
+            query_requests: GraphQL fields to put in the operation.
+            operation_type: Type of GraphQL operation (query or mutation).
+            operation_name: Name of the GraphQL operation.
+            priority: Priority of the request when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds to wait for the rate limiter before giving up with a `TimeoutError`.
+            cache_ttl_seconds: Number of seconds to cache the result of a query for. Leave as `None` to use the cache's default TTL, or set to `0` to skip the cache.
+            cache_policy: How a cached result that is past its TTL is used. Leave as `None` to use the `ANILIST_RESPONSE_CACHE_POLICY` setting.
+            headers: Auth header of the user to make the request for (see `_get_auth_headers()`). Leave as `None` to use the client's user.
+
+        Returns:
+            result: Result of the operation, as a dictionary.
+        """
+        # Mutations change things, so they are always sent.
+        use_cache = operation_type == OperationType.QUERY and cache_ttl_seconds != 0
+        cache_scope = self._get_cache_scope(headers)
+
+        if use_cache and self.entity_cache is not None:
+            cached_result = self.entity_cache.read(query_requests, cache_scope)
+
+            if cached_result is not None:
+                logger.debug(
+                    f"Using entity cache for the result of operation {operation_name}."
+                )
+                return cached_result
+
+            missing_requests = self.entity_cache.get_missing_fields(
+                query_requests, cache_scope
+            )
+
+            if missing_requests is not None:
+                logger.debug(
+                    f"Only requesting the fields missing from the entity cache for operation {operation_name}."
+                )
+                await self._send_request(
+                    *missing_requests,
+                    operation_type=operation_type,
+                    operation_name=operation_name,
+                    priority=priority,
+                    deadline_seconds=deadline_seconds,
+                    cache_ttl_seconds=cache_ttl_seconds,
+                    cache_policy=cache_policy,
+                    headers=headers,
+                )
+
+                cached_result = self.entity_cache.read(query_requests, cache_scope)
+
+                if cached_result is not None:
+                    return cached_result
+
+                # Something changed in the meantime (ex: an entity expired), so get the whole result instead.
+
+        return await self._send_request(
+            *query_requests,
+            operation_type=operation_type,
+            operation_name=operation_name,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
+            cache_ttl_seconds=cache_ttl_seconds,
+            cache_policy=cache_policy,
+            headers=headers,
+        )
+
+    async def _send_request(
+        self,
+        *query_requests: GraphQLField,
+        operation_type: OperationType,
+        operation_name: str,
+        priority: RequestPriority,
+        deadline_seconds: Optional[float],
+        cache_ttl_seconds: Optional[float],
+        cache_policy: Optional[CachePolicy] = None,
+        operation: Optional[Tuple[str, Dict[str, Any]]] = None,
+        headers: Optional[Dict[str, str]] = None,
+    ) -> Dict[str, Any]:
+        """Send a request to the Anilist GraphQL API (unless its result is in the response cache), and store its result in the caches.
+        Depending on the cache policy, a result that is past its TTL can be returned instead, while it is refreshed in the background.
+        See `_request()` for the other arguments.
+
+        Args:
+            operation: Already built GraphQL document and variables (ex: from a `PreparedQuery`). The query requests are then only used as a template,
+                so the result is not stored in the entity cache.
+        """
+        use_cache = operation_type == OperationType.QUERY and cache_ttl_seconds != 0
+        cache_scope = self._get_cache_scope(headers)
+        cache_policy = cache_policy or anilist_settings.response_cache_policy
+
+        if operation is None:
+            query, variables = self.client.build_custom_operation(
+                *query_requests,
+                operation_type=operation_type,
+                operation_name=operation_name,
+            )
+        else:
+            query, variables = operation
+
+        cache_key: Optional[str] = None
+        stale_result: Optional[Dict[str, Any]] = None
+
+        if use_cache and self.cache is not None:
+            cache_key = get_operation_key(query, variables, cache_scope)
+            cached_entry = await self.cache.get_with_ttl_async(
+                cache_key, allow_stale=cache_policy != CachePolicy.CACHE_FIRST
+            )
+
+            if cached_entry is not None:
+                cached_result, ttl_left = cached_entry
+
+                if ttl_left > 0:
+                    logger.debug(f"Using cached result for operation {operation_name}.")
+                    return cached_result
+
+                stale_result = cached_result
+
+        async def execute_operation() -> Dict[str, Any]:
+            response = await self.client.execute(
+                query,
+                operation_name=operation_name,
+                variables=variables,
+                headers=headers or {},
+            )
+            data = await self.client.get_data_async(response)
+
+            if operation_type == OperationType.MUTATION:
+                await update_caches_after_mutation(
+                    query_requests, data, self.cache, self.entity_cache, cache_scope
+                )
+
+            if self.cache is not None and cache_key is not None:
+                await self.cache.set_async(
+                    cache_key,
+                    data,
+                    cache_ttl_seconds,
+                    tags=get_result_tags(query_requests, data),
+                )
+
+            if use_cache and self.entity_cache is not None and operation is None:
+                self.entity_cache.write(
+                    query_requests, data, cache_ttl_seconds, cache_scope
+                )
+
+            return data
+
+        def run_operation() -> Coroutine[Any, Any, Dict[str, Any]]:
+            return run_request_with_retry(
+                execute_operation, priority=priority, deadline_seconds=deadline_seconds
+            )
+
+        def run_refresh() -> Coroutine[Any, Any, Dict[str, Any]]:
+            # Nobody is waiting on a refresh, so it only uses the capacity left over by other requests.
+            return run_request_with_retry(
+                execute_operation, priority=RequestPriority.LOW
+            )
+
+        if stale_result is not None and cache_key is not None:
+            if (
+                cache_policy == CachePolicy.STALE_WHILE_REVALIDATE
+                or await RATE_LIMITER.would_wait(
+                    anilist_settings.max_requests_per_minute
+                )
+            ):
+                logger.debug(
+                    f"Using stale cached result for operation {operation_name} while it is refreshed."
+                )
+                # Refreshes aren't shared with requests that someone is waiting on, so that those never wait behind a low priority refresh.
+                self._refresh_in_background(cache_key, run_refresh)
+                return stale_result
+
+            try:
+                return await self._run_shared_request(
+                    query,
+                    variables,
+                    operation_name,
+                    run_operation,
+                    cache_scope,
+                    priority,
+                    deadline_seconds,
+                )
+            except Exception as e:
+                if not is_connection_error(e):
+                    raise
+
+                logger.warning(
+                    f"Could not reach Anilist for operation {operation_name}, using stale cached result: {e}"
+                )
+                return stale_result
+
+        # Two identical mutations are still two changes (ex: toggling a favourite twice), so they are never shared.
+        if operation_type == OperationType.MUTATION:
+            return await run_operation()
+
+        return await self._run_shared_request(
+            query,
+            variables,
+            operation_name,
+            run_operation,
+            cache_scope,
+            priority,
+            deadline_seconds,
+        )
+
+    async def _run_shared_request(
+        self,
+        query: str,
+        variables: Dict[str, Any],
+        operation_name: str,
+        run_operation: Callable[[], Coroutine[Any, Any, Dict[str, Any]]],
+        scope: str = "",
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+    ) -> Dict[str, Any]:
+        """Run a request, unless an identical one is already in progress, in which case its result is shared instead.
+
+        Args:
+            query: GraphQL document of the request.
+            variables: Variables of the request.
+            operation_name: Name of the GraphQL operation.
+            run_operation: Function that makes the request.
+            scope: Who is making the request (see `_get_cache_scope()`). Requests are only shared by the same user.
+            priority: Priority of the request when waiting for the rate limiter. Requests are only shared with the same priority, so that they never wait behind lower priority requests.
+            deadline_seconds: Max number of seconds to wait for the rate limiter. When waiting on an identical request instead, this is the max number of seconds to wait for its result.
+
+        Returns:
+            result: Result of the request. Each caller waiting on a shared request gets its own copy.
+        """
+        if not anilist_settings.deduplicate_in_flight_requests:
+            return await run_operation()
+
+        key = get_operation_key(query, variables, f"{scope}\n{priority.name}")
+        request = self._in_flight_requests.get(key)
+
+        if request is None:
+            request = InFlightRequest(asyncio.ensure_future(run_operation()))
+            self._in_flight_requests[key] = request
+            request.future.add_done_callback(
+                lambda _: self._in_flight_requests.pop(key, None)
+            )
+            # The request already gives up on its own deadline.
+            deadline_seconds = None
+        else:
+            logger.debug(
+                f"Waiting for identical in-flight request of operation {operation_name}."
+            )
+
+        request.callers += 1
+
+        # Shield the shared request so that one caller giving up doesn't cancel it for the others.
+        result = await asyncio.wait_for(
+            asyncio.shield(request.future), deadline_seconds
+        )
+
+        # Each caller gets its own copy of a shared result, so that one of them changing it doesn't change it for the others.
+        return deepcopy(result) if request.callers > 1 else result
+
+    def _refresh_in_background(
+        self,
+        cache_key: str,
+        refresh: Callable[[], Coroutine[Any, Any, Dict[str, Any]]],
+    ) -> None:
+        """Refresh a cached result without waiting for it. Only one refresh of the same result is made at a time.
+
+        Args:
+            cache_key: Key of the cached result.
+            refresh: Function that requests the result again (and stores it in the cache).
+        """
+        if cache_key in self._background_refreshes:
+            return
+
+        task = asyncio.ensure_future(refresh())
+        self._background_refreshes[cache_key] = task
+
+        def on_done(task: asyncio.Future) -> None:
+            self._background_refreshes.pop(cache_key, None)
+
+            if not task.cancelled() and task.exception() is not None:
+                logger.warning(
+                    f"Failed to refresh cached result in the background: {task.exception()}"
+                )
+
+        task.add_done_callback(on_done)
+
+    def _get_cache_scope(self, headers: Optional[Dict[str, str]] = None) -> str:
+        """Get the part of the cache key that depends on who is making the request, so that users never get each other's cached results.
+
+        Args:
+            headers: Auth header of the user the request is made for, if it isn't the client's user.
+        """
+        return (headers or self.client.headers or {}).get("Authorization", "")
+
+    def _get_auth_headers(
+        self, user: Optional[Union[UserId, AuthInfo]]
+    ) -> Optional[Dict[str, str]]:
+        """Get the auth header to add to a single request, so it is made for another user than the client's.
+
+        Args:
+            user: ID or auth info of the user to make the request for. Leave as `None` to use the client's user.
+
+        Returns:
+            headers: Auth header of the user, or `None` if the request is made for the client's user.
+        """
+        auth_info = get_request_auth_info(user)
+
+        if auth_info is None:
+            return None
+
+        return {"Authorization": f"Bearer {auth_info.token}"}
+
     async def anilist_request(
-        self, query_request: GraphQLField, operation_name: str = "anilist_query"
+        self,
+        query_request: GraphQLField,
+        operation_name: str = "anilist_query",
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        cache_ttl_seconds: Optional[float] = None,
+        cache_policy: Optional[CachePolicy] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
     ) -> Dict[str, Any]:
         """Make a request to the Anilist GraphQL API.
         This will include retrying if we are being rate limited.
@@ -94,42 +544,243 @@ class AnilistClient:
                 This can be done with `Query.{field_name}( … ).fields( … )`.
             operation_name: Name of the GraphQL operation.
                 This can pretty much be anything since we are only making one request at a time.
+            priority: Priority of the request when waiting for the rate limiter. Higher priority requests are always sent first,
+                so use `RequestPriority.HIGH` for requests someone is waiting on and `RequestPriority.LOW` for bulk/background requests.
+            deadline_seconds: Max number of seconds to wait for the rate limiter before giving up with a `TimeoutError`. Leave as `None` to wait as long as needed.
+            cache_ttl_seconds: Number of seconds to cache the result for, if the client has a cache (see `ANILIST_RESPONSE_CACHE_ENABLED`).
+                Leave as `None` to use the cache's default TTL, or set to `0` to skip the cache for this query.
+            cache_policy: How a cached result that is past its TTL is used. Leave as `None` to use the `ANILIST_RESPONSE_CACHE_POLICY` setting.
+                With `CachePolicy.STALE_WHILE_REVALIDATE`, a result that expired less than `ANILIST_RESPONSE_CACHE_STALE_GRACE_SECONDS` ago is returned right away and refreshed in the background.
+                With `CachePolicy.OFFLINE_FALLBACK`, it is only returned if the request would have to wait for the rate limiter or Anilist can't be reached.
+            user: User to make the request for, by ID or with their auth info (ex: from `sign_in_with_token()`), instead of the client's user. The same client can be used for any number of users this way.
 
         Returns:
             result: Result of the query, as a dictionary.
         """
 
-        return await run_request_with_retry(
-            lambda: self.client.query(
-                query_request,
-                operation_name=operation_name,
+        return await self._request(
+            query_request,
+            operation_type=OperationType.QUERY,
+            operation_name=operation_name,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
+            cache_ttl_seconds=cache_ttl_seconds,
+            cache_policy=cache_policy,
+            headers=self._get_auth_headers(user),
+        )
+
+    async def prepared_anilist_request(
+        self,
+        prepared_query: PreparedQuery,
+        variables: Optional[Dict[str, Any]] = None,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        cache_ttl_seconds: Optional[float] = None,
+        cache_policy: Optional[CachePolicy] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
+    ) -> Dict[str, Any]:
+        """Make a request to the Anilist GraphQL API with a prepared query, which is only built once no matter how many times it is sent.
+        This is the same as `anilist_request()`, except that the results are not stored in the entity cache (only in the response cache).
+
+        Args:
+            prepared_query: Query to make to the API, ex: `PreparedQuery(Query.media(id=placeholder("id")).fields( … ))`.
+            variables: Value of each placeholder in the query, ex: `{"id": 1}`. Placeholders that are missing (or `None`) are left out of the query.
+            priority: Priority of the request when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds to wait for the rate limiter before giving up with a `TimeoutError`. Leave as `None` to wait as long as needed.
+            cache_ttl_seconds: Number of seconds to cache the result for, if the client has a cache. Leave as `None` to use the cache's default TTL, or set to `0` to skip the cache for this query.
+            cache_policy: How a cached result that is past its TTL is used. Leave as `None` to use the `ANILIST_RESPONSE_CACHE_POLICY` setting.
+            user: User to make the request for, by ID or with their auth info, instead of the client's user.
+
+        Returns:
+            result: Result of the query, as a dictionary.
+        """
+
+        return await self._send_request(
+            *prepared_query.fields,
+            operation_type=OperationType.QUERY,
+            operation_name=prepared_query.operation_name,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
+            cache_ttl_seconds=cache_ttl_seconds,
+            cache_policy=cache_policy,
+            operation=prepared_query.build(self.client, variables),
+            headers=self._get_auth_headers(user),
+        )
+
+    async def anilist_mutation(
+        self,
+        mutation_request: GraphQLField,
+        operation_name: str = "anilist_mutation",
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
+    ) -> Dict[str, Any]:
+        """Make a mutation to the Anilist GraphQL API. This usually requires auth.
+        Cached results and entities that the mutation changed are removed from the caches, and entities returned by the mutation are updated in the entity cache.
+        This will include retrying if we are being rate limited.
+
+        Args:
+            mutation_request: GraphQL mutation to make to the API.
+                This can be done with `Mutation.{field_name}( … ).fields( … )`, ex: `Mutation.save_media_list_entry(media_id=1, progress=5).fields(MediaListFields.id)`.
+            operation_name: Name of the GraphQL operation.
+            priority: Priority of the request when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds to wait for the rate limiter before giving up with a `TimeoutError`. Leave as `None` to wait as long as needed.
+            user: User to make the mutation for, by ID or with their auth info, instead of the client's user.
+
+        Returns:
+            result: Result of the mutation, as a dictionary.
+        """
+
+        return await self._request(
+            mutation_request,
+            operation_type=OperationType.MUTATION,
+            operation_name=operation_name,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
+            headers=self._get_auth_headers(user),
+        )
+
+    async def batch_anilist_request(
+        self,
+        query_requests: Sequence[GraphQLField],
+        operation_name: str = "batch_anilist_query",
+        batch_size: Optional[int] = None,
+        return_exceptions: bool = False,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
+    ) -> List[Any]:
+        """Make many independent requests to the Anilist GraphQL API while only sending one (or a few) HTTP requests.
+        Each query is given a unique alias so they can all be put in the same GraphQL document, and the result is split back up afterwards.
+        This is a lot easier on the rate limit than making each request on its own.
+        This will include retrying if we are being rate limited.
+
+        Args:
+            query_requests: GraphQL queries to make to the API.
+                These can be done with `Query.{field_name}( … ).fields( … )`.
+            operation_name: Name of the GraphQL operation.
+            batch_size: Maximum number of queries to put in a single HTTP request. Leave as `None` to send all of them together.
+                **Note:** Anilist limits how complex a single request can be, so very large batches might need to be split up.
+            return_exceptions: If `True`, a query that fails (ex: media not found) will have its error put in the results instead of failing the whole batch.
+            priority: Priority of the request(s) when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds each request can wait for the rate limiter before giving up with a `TimeoutError`.
+            user: User to make the requests for, by ID or with their auth info, instead of the client's user.
+
+        Returns:
+            results: Result of each query, as a dictionary, in the same order as the queries.
+                Each result has the same structure as it would have with `anilist_request()`.
+        """
+
+        if batch_size is not None and batch_size < 1:
+            raise ValueError("Batch size must be at least 1.")
+
+        query_requests = list(query_requests)
+        batch_size = batch_size or max(len(query_requests), 1)
+        headers = self._get_auth_headers(user)
+
+        batches = await asyncio.gather(
+            *(
+                self._batch_request(
+                    query_requests[start : start + batch_size],
+                    operation_name,
+                    return_exceptions,
+                    priority,
+                    deadline_seconds,
+                    headers,
+                )
+                for start in range(0, len(query_requests), batch_size)
             )
         )
 
+        return [result for batch in batches for result in batch]
+
+    async def _batch_request(
+        self,
+        query_requests: List[GraphQLField],
+        operation_name: str,
+        return_exceptions: bool,
+        priority: RequestPriority,
+        deadline_seconds: Optional[float],
+        headers: Optional[Dict[str, str]] = None,
+    ) -> List[Any]:
+        """Make a single HTTP request for a batch of queries. See `batch_anilist_request()`.
+
+        Args:
+            query_requests: GraphQL queries to put in the request.
+            operation_name: Name of the GraphQL operation.
+            return_exceptions: If `True`, put the errors of failed queries in the results instead of raising them.
+            priority: Priority of the request when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds to wait for the rate limiter.
+            headers: Auth header of the user to make the request for, if it isn't the client's user.
+
+        Returns:
+            results: Result of each query, in the same order as the queries.
+        """
+        # Alias copies of the queries so the originals can be reused as-is.
+        aliases = [
+            f"{BATCH_ALIAS_PREFIX}{index}" for index in range(len(query_requests))
+        ]
+        aliased_requests = [
+            copy(query_request).alias(alias)
+            for query_request, alias in zip(query_requests, aliases)
+        ]
+
+        errors_by_alias: Dict[str, List[GraphQLClientGraphQLError]] = {}
+
+        try:
+            data = await self._request(
+                *aliased_requests,
+                operation_type=OperationType.QUERY,
+                operation_name=operation_name,
+                priority=priority,
+                deadline_seconds=deadline_seconds,
+                headers=headers,
+            )
+        except (GraphQLClientGraphQLMultiError, GraphQLClientHttpError) as e:
+            multi_error = get_graphql_errors(e)
+
+            # Errors for the whole request can't be split up, so fail the whole batch.
+            if not return_exceptions or multi_error is None or not multi_error.data:
+                raise
+
+            data = multi_error.data
+
+            for error in multi_error.errors:
+                if not error.path:
+                    raise
+
+                errors_by_alias.setdefault(str(error.path[0]), []).append(error)
+
+        results: List[Any] = []
+
+        for query_request, alias in zip(query_requests, aliases):
+            result_key = query_request._alias or query_request._field_name
+            result = {result_key: data.get(alias)}
+
+            if alias in errors_by_alias:
+                results.append(
+                    GraphQLClientGraphQLMultiError(
+                        errors=errors_by_alias[alias], data=result
+                    )
+                )
+            else:
+                results.append(result)
+
+        return results
+
     async def paginated_anilist_request(
         self,
-        query_request: Union[
-            ActivityReplyFields,
-            ActivityUnionUnion,
-            AiringScheduleFields,
-            CharacterFields,
-            MediaFields,
-            MediaListFields,
-            MediaTrendFields,
-            NotificationUnionUnion,
-            RecommendationFields,
-            ReviewFields,
-            StaffFields,
-            StudioFields,
-            ThreadCommentFields,
-            ThreadFields,
-            UserFields,
-        ],
+        query_request: Union[PaginatedQueryRequest, PreparedQuery],
         starting_page: int = 1,
         per_page: int = 50,
         max_page: Optional[int] = None,
         max_items: Optional[int] = None,
         operation_name: str = "paginated_anilist_query",
+        concurrency: int = 1,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        variables: Optional[Dict[str, Any]] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
     ) -> List[Any]:
         """Make a paginated request to the Anilist GraphQL API.
         This method abstracts away pagination logic and lets you just input the request for the fields you want.
@@ -138,6 +789,7 @@ class AnilistClient:
         Args:
             query_request: GraphQL query to make to the API.
                 This can be done with `PageFields.{field_name}( … ).fields( … )` (recommended) or `Query.{field_name}( … ).fields( … )`.
+                It can also be a `PreparedQuery` of a single list field, so that the query for each page is only built once.
             starting_page: Page to start the pagination from. **Note:** The API is 1-indexed, so the first page is not 0.
             per_page: Items to return per page (request). 50 is generally the maximum amount.
                 **Note:** Entering a value above the max should not throw an error but just return the max amount.
@@ -145,11 +797,163 @@ class AnilistClient:
             max_items: Maxiumum number of items to query for.
             operation_name: Name of the GraphQL operation.
                 This can pretty much be anything since we are only making one request at a time.
+            concurrency: Maximum number of pages to request at the same time. Default is `1` (one page after another).
+                With a higher value, the first page is used to find the last page and the remaining pages are requested in parallel.
+            priority: Priority of the page requests when waiting for the rate limiter.
+                Use `RequestPriority.LOW` for large background requests, so that they only use the capacity left over by other requests.
+            deadline_seconds: Max number of seconds each page request can wait for the rate limiter before giving up with a `TimeoutError`.
+            variables: Value of each placeholder, if the query is a `PreparedQuery`. The `page` and `per_page` placeholders are set for each page.
+            user: User to make the requests for, by ID or with their auth info, instead of the client's user.
 
         Returns:
             result: Result of the query, as a list of all the objects retrieved from the API.
         """
 
+        if concurrency < 1:
+            raise ValueError("Concurrency for a paginated request must be at least 1.")
+
+        self._fix_paginated_field_name(get_list_field(query_request))
+        user = get_request_auth_info(user)
+
+        results: List[Any] = []
+        has_next = True
+        page = starting_page
+
+        if concurrency > 1 and not (max_page and starting_page > max_page):
+            results, has_next, page = await self._get_pages_concurrently(
+                query_request,
+                starting_page,
+                per_page,
+                max_page,
+                max_items,
+                operation_name,
+                concurrency,
+                priority,
+                deadline_seconds,
+                variables,
+                user,
+            )
+
+        if has_next:
+            async for items in self._iterate_pages(
+                query_request,
+                page,
+                per_page,
+                max_page,
+                max_items,
+                operation_name,
+                priority,
+                deadline_seconds,
+                item_count=len(results),
+                variables=variables,
+                user=user,
+            ):
+                results.extend(items)
+
+        if max_items:
+            results = results[:max_items]
+
+        return results
+
+    async def stream_paginated_anilist_request(
+        self,
+        query_request: Union[PaginatedQueryRequest, PreparedQuery],
+        starting_page: int = 1,
+        per_page: int = 50,
+        max_page: Optional[int] = None,
+        max_items: Optional[int] = None,
+        operation_name: str = "paginated_anilist_query",
+        yield_pages: bool = False,
+        buffer_size: int = 1,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        variables: Optional[Dict[str, Any]] = None,
+        user: Optional[Union[UserId, AuthInfo]] = None,
+    ) -> AsyncIterator[Any]:
+        """Make a paginated request to the Anilist GraphQL API and get the results as they arrive, with `async for`.
+        Unlike `paginated_anilist_request()`, the results are not all kept in memory, so this is better for very large requests.
+        The next pages are requested in the background while you process the current one, up to `buffer_size` pages ahead.
+        This will include retrying if we are being rate limited.
+
+        Args:
+            query_request: GraphQL query to make to the API.
+                This can be done with `PageFields.{field_name}( … ).fields( … )` (recommended) or `Query.{field_name}( … ).fields( … )`.
+                It can also be a `PreparedQuery` of a single list field, so that the query for each page is only built once.
+            starting_page: Page to start the pagination from. **Note:** The API is 1-indexed, so the first page is not 0.
+            per_page: Items to return per page (request). 50 is generally the maximum amount.
+            max_page: Maximum number of pages to query for.
+            max_items: Maxiumum number of items to query for.
+            operation_name: Name of the GraphQL operation.
+            yield_pages: If `True`, yield a list of items for each page instead of yielding the items one by one.
+            buffer_size: Maximum number of pages that can be fetched ahead of the ones you have processed. Default is `1`.
+            priority: Priority of the page requests when waiting for the rate limiter.
+                Use `RequestPriority.LOW` for large background requests, so that they only use the capacity left over by other requests.
+            deadline_seconds: Max number of seconds each page request can wait for the rate limiter before giving up with a `TimeoutError`.
+            variables: Value of each placeholder, if the query is a `PreparedQuery`. The `page` and `per_page` placeholders are set for each page.
+            user: User to make the requests for, by ID or with their auth info, instead of the client's user.
+
+        Returns:
+            results: Async iterator of the objects (or pages of objects) retrieved from the API, in order.
+        """
+
+        if buffer_size < 1:
+            raise ValueError("Buffer size for a paginated request must be at least 1.")
+
+        self._fix_paginated_field_name(get_list_field(query_request))
+        user = get_request_auth_info(user)
+
+        # Holds pages of items, then "None" when there are no pages left, or the error that stopped the requests.
+        buffer: asyncio.Queue[Union[List[Any], Exception, None]] = asyncio.Queue(
+            maxsize=buffer_size
+        )
+
+        async def fill_buffer() -> None:
+            try:
+                async for items in self._iterate_pages(
+                    query_request,
+                    starting_page,
+                    per_page,
+                    max_page,
+                    max_items,
+                    operation_name,
+                    priority,
+                    deadline_seconds,
+                    variables=variables,
+                    user=user,
+                ):
+                    await buffer.put(items)
+            except Exception as e:
+                await buffer.put(e)
+            else:
+                await buffer.put(None)
+
+        producer = asyncio.create_task(fill_buffer())
+
+        try:
+            while True:
+                items = await buffer.get()
+
+                if items is None:
+                    break
+
+                if isinstance(items, Exception):
+                    raise items
+
+                if yield_pages:
+                    yield items
+                else:
+                    for item in items:
+                        yield item
+        finally:
+            # Stop requesting pages if the caller stopped iterating early.
+            producer.cancel()
+
+    def _fix_paginated_field_name(self, query_request: GraphQLField) -> None:
+        """Fix the field name of a (sub)field that will be requested inside of the `Page` field.
+
+        Args:
+            query_request: GraphQL (sub)field to request inside of the `Page` field.
+        """
         # If the user's "query_request" object was generated with Query.{field_name}(), the field name will be wrong (title case instead of camel case).
         # Fix this here just in case it happens.
         # This doesn't happen if the "query_request" object is generated with PageFields.{field_name}(), but might as well do a small hack instead of enforcing that approach.
@@ -157,43 +961,286 @@ class AnilistClient:
             query_request._field_name[0].lower() + query_request._field_name[1:]
         )
 
-        results: List[Any] = []
+    async def _iterate_pages(
+        self,
+        query_request: Union[PaginatedQueryRequest, PreparedQuery],
+        starting_page: int,
+        per_page: int,
+        max_page: Optional[int],
+        max_items: Optional[int],
+        operation_name: str,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        item_count: int = 0,
+        variables: Optional[Dict[str, Any]] = None,
+        user: Optional[AuthInfo] = None,
+    ) -> AsyncIterator[List[Any]]:
+        """Get the pages of a paginated request one after another.
+
+        Args:
+            query_request: GraphQL (sub)field to request inside of the `Page` field.
+            starting_page: Page to start the pagination from.
+            per_page: Items to return per page.
+            max_page: Maximum number of pages to query for.
+            max_items: Maxiumum number of items to query for.
+            operation_name: Name of the GraphQL operation.
+            priority: Priority of the page requests when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds each page request can wait for the rate limiter.
+            item_count: Number of items that were already retrieved before the starting page.
+            variables: Value of each placeholder, if the query is a `PreparedQuery`.
+            user: Auth info of the user to make the requests for, if it isn't the client's user.
+
+        Returns:
+            pages: Async iterator of the items in each page, cut off at the max number of items.
+        """
+        field_name = get_list_field(query_request)._field_name
         has_next = True
         page = starting_page
 
         while has_next:
             if max_page and page > max_page:
                 logger.info(
-                    f"[{query_request._field_name}] Hit max page of {max_page} for paginated request. Stopping requests here."
+                    f"[{field_name}] Hit max page of {max_page} for paginated request. Stopping requests here."
                 )
                 break
 
-            if max_items and len(results) >= max_items:
-                results = results[:max_items]
+            if max_items and item_count >= max_items:
                 logger.info(
-                    f"[{query_request._field_name}] Hit max number of items ({max_items}) for paginated request. Stopping requests here."
+                    f"[{field_name}] Hit max number of items ({max_items}) for paginated request. Stopping requests here."
                 )
                 break
 
-            logger.info(
-                f"[{query_request._field_name}] Getting page {page} of paginated request."
-            )
+            logger.info(f"[{field_name}] Getting page {page} of paginated request.")
 
-            query = Query.page(page=page, per_page=per_page).fields(
-                PageFields.page_info().fields(PageInfoFields.has_next_page),
+            page_result = await self._get_page(
                 query_request,
+                page,
+                per_page,
+                operation_name,
+                priority,
+                deadline_seconds,
+                variables=variables,
+                user=user,
             )
+            items: List[Any] = page_result[field_name]
 
-            paginated_result = await self.anilist_request(query, operation_name)
-            results.extend(paginated_result["Page"][query_request._field_name])
+            if max_items:
+                items = items[: max_items - item_count]
 
-            has_next = bool(paginated_result["Page"]["pageInfo"]["hasNextPage"])
+            item_count += len(items)
+            has_next = bool(page_result["pageInfo"]["hasNextPage"])
             page += 1
 
-        return results
+            yield items
+
+    async def _get_page(
+        self,
+        query_request: Union[PaginatedQueryRequest, PreparedQuery],
+        page: int,
+        per_page: int,
+        operation_name: str,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline_seconds: Optional[float] = None,
+        include_totals: bool = False,
+        variables: Optional[Dict[str, Any]] = None,
+        user: Optional[AuthInfo] = None,
+    ) -> Dict[str, Any]:
+        """Get a single page of a paginated request.
+
+        Args:
+            query_request: GraphQL (sub)field to request inside of the `Page` field.
+            page: Number of the page to get.
+            per_page: Items to return per page.
+            operation_name: Name of the GraphQL operation.
+            priority: Priority of the request when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds to wait for the rate limiter.
+            include_totals: Whether to also request the total item count and last page number.
+            variables: Value of each placeholder, if the query is a `PreparedQuery`.
+            user: Auth info of the user to make the request for, if it isn't the client's user.
+
+        Returns:
+            page_result: Contents of the `Page` field, including its `pageInfo`.
+        """
+        if isinstance(query_request, PreparedQuery):
+            paginated_result = await self.prepared_anilist_request(
+                query_request.get_page_query(include_totals),
+                {
+                    **(variables or {}),
+                    PAGE_PLACEHOLDER: page,
+                    PER_PAGE_PLACEHOLDER: per_page,
+                },
+                priority=priority,
+                deadline_seconds=deadline_seconds,
+                user=user,
+            )
+            return paginated_result["Page"]
+
+        page_info_fields = [PageInfoFields.has_next_page]
+
+        if include_totals:
+            page_info_fields.extend([PageInfoFields.total, PageInfoFields.last_page])
+
+        query = Query.page(page=page, per_page=per_page).fields(
+            PageFields.page_info().fields(*page_info_fields),
+            query_request,
+        )
+
+        paginated_result = await self.anilist_request(
+            query,
+            operation_name,
+            priority=priority,
+            deadline_seconds=deadline_seconds,
+            user=user,
+        )
+
+        return paginated_result["Page"]
+
+    async def _get_pages_concurrently(
+        self,
+        query_request: Union[PaginatedQueryRequest, PreparedQuery],
+        starting_page: int,
+        per_page: int,
+        max_page: Optional[int],
+        max_items: Optional[int],
+        operation_name: str,
+        concurrency: int,
+        priority: RequestPriority,
+        deadline_seconds: Optional[float],
+        variables: Optional[Dict[str, Any]] = None,
+        user: Optional[AuthInfo] = None,
+    ) -> Tuple[List[Any], bool, int]:
+        """Get the pages of a paginated request concurrently.
+        The first page is requested on its own to find the last page, then the rest are requested in parallel.
+
+        Args:
+            query_request: GraphQL (sub)field to request inside of the `Page` field.
+            starting_page: Page to start the pagination from.
+            per_page: Items to return per page.
+            max_page: Maximum number of pages to query for.
+            max_items: Maxiumum number of items to query for.
+            operation_name: Name of the GraphQL operation.
+            concurrency: Maximum number of pages to request at the same time.
+            priority: Priority of the page requests when waiting for the rate limiter.
+            deadline_seconds: Max number of seconds each page request can wait for the rate limiter.
+            variables: Value of each placeholder, if the query is a `PreparedQuery`.
+            user: Auth info of the user to make the requests for, if it isn't the client's user.
+
+        Returns:
+            results: All the objects retrieved from the API, in page order.
+            has_next: Whether the last retrieved page reported that there is a next page.
+            next_page: Number of the next page that was not requested.
+        """
+        field_name = get_list_field(query_request)._field_name
+        logger.info(
+            f"[{field_name}] Getting page {starting_page} of paginated request."
+        )
+
+        first_page = await self._get_page(
+            query_request,
+            starting_page,
+            per_page,
+            operation_name,
+            priority,
+            deadline_seconds,
+            include_totals=True,
+            variables=variables,
+            user=user,
+        )
+
+        results: List[Any] = list(first_page[field_name])
+        has_next = bool(first_page["pageInfo"]["hasNextPage"])
+        last_page: Optional[int] = first_page["pageInfo"]["lastPage"]
+
+        # Without a known last page, let the caller continue one page at a time.
+        if not has_next or last_page is None:
+            return results, has_next, starting_page + 1
+
+        end_page = last_page
+
+        if max_page:
+            end_page = min(end_page, max_page)
+
+        if max_items:
+            end_page = min(end_page, starting_page + ceil(max_items / per_page) - 1)
+
+        if end_page <= starting_page:
+            return results, has_next, starting_page + 1
+
+        logger.info(
+            f"[{field_name}] Getting pages {starting_page + 1} to {end_page} of paginated request (up to {concurrency} at a time)."
+        )
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def get_page_with_limit(page: int) -> Dict[str, Any]:
+            async with semaphore:
+                return await self._get_page(
+                    query_request,
+                    page,
+                    per_page,
+                    operation_name,
+                    priority,
+                    deadline_seconds,
+                    variables=variables,
+                    user=user,
+                )
+
+        pages = await asyncio.gather(
+            *(
+                get_page_with_limit(page)
+                for page in range(starting_page + 1, end_page + 1)
+            )
+        )
+
+        for page_result in pages:
+            results.extend(page_result[field_name])
+
+        # The last page reported by Anilist is not always accurate, so let the caller continue from here if there is more.
+        has_next = bool(pages[-1]["pageInfo"]["hasNextPage"])
+
+        return results, has_next, end_page + 1
 
     async def __aenter__(self):
         return self
 
     async def __aexit__(self, exc_type, exc_val, exc_tb):
+        # Requests that nobody is waiting on (ex: background refreshes) can't finish once the HTTP client is closed.
+        for request in [
+            *self._background_refreshes.values(),
+            *(request.future for request in self._in_flight_requests.values()),
+        ]:
+            request.cancel()
+
         await self.client.__aexit__(exc_type, exc_val, exc_tb)
+
+
+def get_list_field(query_request: Union[GraphQLField, PreparedQuery]) -> GraphQLField:
+    """Get the list field of a paginated request, which is the only field of a prepared query.
+
+    Args:
+        query_request: GraphQL (sub)field or prepared query to request inside of the `Page` field.
+
+    Returns:
+        field: The (sub)field to request inside of the `Page` field.
+    """
+    if isinstance(query_request, PreparedQuery):
+        return query_request.fields[0]
+
+    return query_request
+
+
+def get_request_auth_info(
+    user: Optional[Union[UserId, AuthInfo]],
+) -> Optional[AuthInfo]:
+    """Get the auth info of the user a request is made for, so that it is only looked up once for requests with many pages.
+
+    Args:
+        user: ID or auth info of the user, or `None` for the client's user.
+
+    Returns:
+        auth_info: Auth info of the user, or `None` for the client's user.
+    """
+    if user is None or isinstance(user, AuthInfo):
+        return user
+
+    return get_auth_info(user)
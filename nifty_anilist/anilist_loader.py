@@ -0,0 +1,285 @@
+import asyncio
+import json
+from copy import copy
+from http import HTTPStatus
+from typing import Any, Callable, Dict, List, Optional, Tuple, TYPE_CHECKING, Union
+
+from graphql import print_ast
+from pydantic_core import to_jsonable_python
+
+from nifty_anilist.client.custom_fields import (
+    CharacterFields,
+    MediaFields,
+    PageFields,
+    StaffFields,
+    StudioFields,
+)
+from nifty_anilist.client.custom_queries import GraphQLField, Query
+from nifty_anilist.client.exceptions import GraphQLClientGraphQLMultiError
+from nifty_anilist.logging import anilist_logger as logger
+
+if TYPE_CHECKING:
+    from nifty_anilist.anilist_client import AnilistClient
+
+
+ID_IN_PAGE_FIELDS: Dict[
+    str, Callable[..., Union[CharacterFields, MediaFields, StaffFields, StudioFields]]
+] = {
+    "Media": PageFields.media,
+    "Character": PageFields.characters,
+    "Staff": PageFields.staff,
+    "Studio": PageFields.studios,
+}
+"""Root fields that can be looked up in bulk with an `id_in` argument, and the `Page` field to use for it."""
+
+MAX_PAGE_SIZE = 50
+"""Maximum number of items Anilist will return in a single page."""
+
+
+class PendingLoad:
+    """A lookup that is waiting to be sent with the next batch."""
+
+    query_request: GraphQLField
+    future: asyncio.Future
+
+    def __init__(self, query_request: GraphQLField, future: asyncio.Future) -> None:
+        self.query_request = query_request
+        self.future = future
+
+
+class AnilistLoader:
+    """Collects single-entity lookups made at around the same time and sends them to Anilist together.
+    Lookups of the same kind of entity by ID (ex: `Query.media(id=…)`) with the same fields are merged into one `id_in` page query.
+    Any other lookups made in the same window are sent together as one aliased document (see `AnilistClient.batch_anilist_request()`).
+    """
+
+    client: "AnilistClient"
+    batch_window_seconds: float
+    max_batch_size: int
+
+    def __init__(
+        self,
+        client: "AnilistClient",
+        batch_window_seconds: float = 0.01,
+        max_batch_size: int = MAX_PAGE_SIZE,
+    ) -> None:
+        """Create a loader.
+
+        Args:
+            client: Anilist client to use when making the requests.
+            batch_window_seconds: How long to wait for more lookups after the first one before sending them.
+            max_batch_size: Maximum number of lookups to put in a single request. Can't be more than 50 for `id_in` page queries.
+        """
+        self.client = client
+        self.batch_window_seconds = batch_window_seconds
+        self.max_batch_size = min(max_batch_size, MAX_PAGE_SIZE)
+        self._pending: List[PendingLoad] = []
+        self._dispatch_task: Optional[asyncio.Task] = None
+
+    async def load(self, query_request: GraphQLField) -> Dict[str, Any]:
+        """Make a request to the Anilist GraphQL API, batched together with other lookups made at around the same time.
+
+        Args:
+            query_request: GraphQL query to make to the API.
+                This can be done with `Query.{field_name}( … ).fields( … )`, ex: `Query.media(id=1).fields(MediaFields.title() … )`.
+
+        Returns:
+            result: Result of the query, as a dictionary. This is the same as what `AnilistClient.anilist_request()` would return,
+                except that an entity that does not exist is returned as `None` instead of raising an error.
+        """
+        if self.client.entity_cache is not None:
+            cached_result = self.client.entity_cache.read(
+                [query_request], self.client._get_cache_scope()
+            )
+
+            if cached_result is not None:
+                return cached_result
+
+        future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self._pending.append(PendingLoad(query_request, future))
+
+        if self._dispatch_task is None:
+            self._dispatch_task = asyncio.create_task(self._dispatch_after_window())
+
+        return await future
+
+    async def _dispatch_after_window(self) -> None:
+        """Wait for more lookups to come in, then send all of the pending ones."""
+        await asyncio.sleep(self.batch_window_seconds)
+
+        pending = self._pending
+        self._pending = []
+        self._dispatch_task = None
+
+        try:
+            await self._dispatch(pending)
+        except Exception as e:
+            for load in pending:
+                set_future_exception(load.future, e)
+
+    async def _dispatch(self, pending: List[PendingLoad]) -> None:
+        """Group lookups into as few requests as possible and send them.
+
+        Args:
+            pending: Lookups to send.
+        """
+        id_in_groups: Dict[Tuple[str, str], List[PendingLoad]] = {}
+        other_loads: List[PendingLoad] = []
+
+        for load in pending:
+            if self._can_load_by_id_in(load.query_request):
+                key = (
+                    load.query_request._field_name,
+                    get_selection_key(load.query_request),
+                )
+                id_in_groups.setdefault(key, []).append(load)
+            else:
+                other_loads.append(load)
+
+        batches: List[Any] = []
+
+        for loads in id_in_groups.values():
+            for start in range(0, len(loads), self.max_batch_size):
+                batches.append(
+                    self._load_by_id_in(loads[start : start + self.max_batch_size])
+                )
+
+        for start in range(0, len(other_loads), self.max_batch_size):
+            batches.append(
+                self._load_by_aliases(other_loads[start : start + self.max_batch_size])
+            )
+
+        logger.debug(f"Loading {len(pending)} lookup(s) in {len(batches)} request(s).")
+
+        await asyncio.gather(*batches)
+
+    def _can_load_by_id_in(self, query_request: GraphQLField) -> bool:
+        """Check if a lookup can be merged into an `id_in` page query.
+
+        Args:
+            query_request: GraphQL query of the lookup.
+
+        Returns:
+            can_load: `True` if the lookup only has an `id` argument and its entity can be searched with `id_in`.
+        """
+        return (
+            query_request._field_name in ID_IN_PAGE_FIELDS
+            and query_request._alias is None
+            and set(query_request._variables.keys()) == {"id"}
+        )
+
+    async def _load_by_id_in(self, loads: List[PendingLoad]) -> None:
+        """Send lookups of the same entity type and fields as one `id_in` page query.
+
+        Args:
+            loads: Lookups to send. They must all have the same field name and selections.
+        """
+        template = loads[0].query_request
+        ids = list(
+            dict.fromkeys(
+                load.query_request._variables["id"]["value"] for load in loads
+            )
+        )
+
+        page_field = ID_IN_PAGE_FIELDS[template._field_name](id_in=ids)
+        page_field._subfields = list(template._subfields)
+        page_field._inline_fragments = dict(template._inline_fragments)
+
+        # The ID is needed to match the results to the lookups.
+        requested_id = any(
+            subfield._field_name == "id" and subfield._alias is None
+            for subfield in template._subfields
+        )
+        if not requested_id:
+            page_field._subfields.append(GraphQLField("id"))
+
+        try:
+            data = await self.client.anilist_request(
+                Query.page(per_page=len(ids)).fields(page_field),
+                operation_name="anilist_loader_query",
+            )
+        except Exception as e:
+            for load in loads:
+                set_future_exception(load.future, e)
+            return
+
+        entities: Dict[int, Dict[str, Any]] = {}
+        for entity in data["Page"][page_field._field_name]:
+            # The response can be shared (ex: with the caches), so the added ID is left out of a copy instead of removed from it.
+            entities[entity["id"]] = (
+                entity
+                if requested_id
+                else {key: value for key, value in entity.items() if key != "id"}
+            )
+
+        for load in loads:
+            entity = entities.get(load.query_request._variables["id"]["value"])
+            set_future_result(load.future, {template._field_name: entity})
+
+    async def _load_by_aliases(self, loads: List[PendingLoad]) -> None:
+        """Send lookups as a single aliased document.
+
+        Args:
+            loads: Lookups to send.
+        """
+        try:
+            results = await self.client.batch_anilist_request(
+                [load.query_request for load in loads],
+                operation_name="anilist_loader_query",
+                return_exceptions=True,
+            )
+        except Exception as e:
+            for load in loads:
+                set_future_exception(load.future, e)
+            return
+
+        for load, result in zip(loads, results):
+            # Match the "id_in" lookups, which return "None" for missing entities instead of failing.
+            if isinstance(
+                result, GraphQLClientGraphQLMultiError
+            ) and is_not_found_error(result):
+                set_future_result(load.future, result.data)
+            elif isinstance(result, Exception):
+                set_future_exception(load.future, result)
+            else:
+                set_future_result(load.future, result)
+
+
+def get_selection_key(query_request: GraphQLField) -> str:
+    """Get a key that is the same for any two queries with the same selections, no matter what their arguments are.
+
+    Args:
+        query_request: GraphQL query to get the key for.
+
+    Returns:
+        key: The printed selections of the query and the values of their arguments.
+    """
+    template = copy(query_request)
+    template._variables = {}
+
+    printed_field = print_ast(template.to_ast(0))
+    variable_values = {
+        name: variable["value"]
+        for name, variable in template.get_formatted_variables().items()
+    }
+
+    return printed_field + json.dumps(variable_values, default=to_jsonable_python)
+
+
+def is_not_found_error(error: GraphQLClientGraphQLMultiError) -> bool:
+    """Check if an error from a batched request is Anilist's \"Not Found\" error."""
+    return bool(error.errors) and all(
+        (e.original or {}).get("status") == HTTPStatus.NOT_FOUND for e in error.errors
+    )
+
+
+def set_future_result(future: asyncio.Future, result: Any) -> None:
+    """Set the result of a future, unless the caller waiting for it has given up."""
+    if not future.done():
+        future.set_result(result)
+
+
+def set_future_exception(future: asyncio.Future, error: BaseException) -> None:
+    """Set the exception of a future, unless the caller waiting for it has given up."""
+    if not future.done():
+        future.set_exception(error)
@@ -9,6 +9,7 @@ import httpx
 from pydantic import BaseModel
 from pydantic_core import to_jsonable_python
 
+from ..utils.json_utils import create_json_codec, JsonCodec
 from .base_model import UNSET, Upload
 from .exceptions import (
     GraphQLClientGraphQLMultiError,
@@ -69,6 +70,7 @@ class AsyncBaseClient:
         ws_headers: Optional[Dict[str, Any]] = None,
         ws_origin: Optional[str] = None,
         ws_connection_init_payload: Optional[Dict[str, Any]] = None,
+        json_codec: Optional[JsonCodec] = None,
     ) -> None:
         self.url = url
         self.headers = headers
@@ -80,6 +82,7 @@ class AsyncBaseClient:
         self.ws_headers = ws_headers or {}
         self.ws_origin = Origin(ws_origin) if ws_origin else None
         self.ws_connection_init_payload = ws_connection_init_payload
+        self.json_codec = json_codec or create_json_codec()
 
     async def __aenter__(self: Self) -> Self:
         return self
@@ -125,10 +128,29 @@ class AsyncBaseClient:
             )
 
         try:
-            response_json = response.json()
+            response_json = self.json_codec.decode(response.content)
         except ValueError as exc:
             raise GraphQLClientInvalidResponseError(response=response) from exc
 
+        return self._get_data_from_json(response, response_json)
+
+    async def get_data_async(self, response: httpx.Response) -> Dict[str, Any]:
+        """Same as `get_data()`, except that large responses are decoded outside of the event loop (see `JsonCodec.decode_async()`)."""
+        if not response.is_success:
+            raise GraphQLClientHttpError(
+                status_code=response.status_code, response=response
+            )
+
+        try:
+            response_json = await self.json_codec.decode_async(response.content)
+        except ValueError as exc:
+            raise GraphQLClientInvalidResponseError(response=response) from exc
+
+        return self._get_data_from_json(response, response_json)
+
+    def _get_data_from_json(
+        self, response: httpx.Response, response_json: Any
+    ) -> Dict[str, Any]:
         if (not isinstance(response_json, dict)) or (
             "data" not in response_json and "errors" not in response_json
         ):
@@ -293,13 +315,12 @@ class AsyncBaseClient:
 
         return await self.http_client.post(
             url=self.url,
-            content=json.dumps(
+            content=self.json_codec.encode(
                 {
                     "query": query,
                     "operationName": operation_name,
                     "variables": variables,
-                },
-                default=to_jsonable_python,
+                }
             ),
             **merged_kwargs,
         )
@@ -0,0 +1,383 @@
+from collections import OrderedDict
+from string import ascii_letters
+from typing import Any, Dict, Hashable, List, Set, Tuple
+
+from graphql import OperationType, print_ast
+
+from nifty_anilist.client import Client
+from nifty_anilist.client.base_operation import GraphQLField
+from nifty_anilist.logging import anilist_logger as logger
+
+
+MAX_LINE_LENGTH = 80
+"""Arguments of a field are put on their own lines when the field would be longer than this, the same as `graphql.print_ast()`."""
+
+MAX_COMPILED_OPERATIONS = 1024
+"""Max number of compiled operations to keep. The least recently used ones are removed first."""
+
+
+class CompiledOperation:
+    """Printed document of an operation, with the names of its variables in the order their values are found in the fields."""
+
+    query: str
+    variable_names: List[str]
+    bytes_saved: int
+    """Number of bytes saved in each request by printing the operation in compact form, or 0 if it isn't compact."""
+
+    def __init__(
+        self, query: str, variable_names: List[str], bytes_saved: int = 0
+    ) -> None:
+        self.query = query
+        self.variable_names = variable_names
+        self.bytes_saved = bytes_saved
+
+
+_compiled_operations: "OrderedDict[Hashable, CompiledOperation]" = OrderedDict()
+"""Compiled operations shared by all clients, by the signature of their fields."""
+
+
+def get_field_signature(field: GraphQLField, values: List[Any]) -> Hashable:
+    """Get a key that is the same for any two fields with the same structure (names, aliases, argument types and subfields), no matter what their argument values are.
+    The argument values are added to `values`, in the same order as `GraphQLField.get_formatted_variables()`.
+    """
+    values.extend(variable["value"] for variable in field._variables.values())
+
+    return (
+        field._field_name,
+        field._alias,
+        tuple((name, variable["type"]) for name, variable in field._variables.items()),
+        tuple(get_field_signature(subfield, values) for subfield in field._subfields),
+        tuple(
+            (
+                name,
+                tuple(get_field_signature(subfield, values) for subfield in subfields),
+            )
+            for name, subfields in field._inline_fragments.items()
+        ),
+    )
+
+
+def get_short_variable_name(index: int) -> str:
+    """Get the name of a variable in a compact operation: `a` to `Z`, then `aa`, `ab`, etc."""
+    name = ""
+
+    while True:
+        index, remainder = divmod(index, len(ascii_letters))
+        name = ascii_letters[remainder] + name
+
+        if index == 0:
+            return name
+
+        index -= 1
+
+
+def join_compact_selections(selections: List[str]) -> str:
+    """Join the selections of a compact operation, only putting a space between two that would otherwise run into each other."""
+    text = ""
+
+    for selection in selections:
+        if text and text[-1] not in "})" and selection[0] != ".":
+            text += " "
+
+        text += selection
+
+    return text
+
+
+def get_bytes_saved(
+    query: str,
+    variables: Dict[str, Any],
+    compact_query: str,
+    compact_variables: Dict[str, Any],
+) -> int:
+    """Get the number of bytes saved in a request body by the compact form of an operation (see `GraphQLClient.compact_queries`), from its document and the names of its variables."""
+    return (
+        len(query.encode())
+        - len(compact_query.encode())
+        + sum(len(name) for name in variables)
+        - sum(len(name) for name in compact_variables)
+    )
+
+
+class GraphQLClient(Client):
+    """GraphQL client for the Anilist API (see `nifty_anilist.client.Client`) that prints the documents of operations straight from their fields, and only once for each operation structure.
+    The generated client is rebuilt from the schema by ariadne-codegen, so anything added to it lives here instead.
+    """
+
+    compact_queries: bool
+    """If `True`, operations are printed on a single line without extra whitespace, and with short variable names."""
+    bytes_saved: int
+    """Total number of bytes saved by printing operations in compact form, across all the operations built by this client."""
+
+    def __init__(
+        self, *args: Any, compact_queries: bool = False, **kwargs: Any
+    ) -> None:
+        super().__init__(*args, **kwargs)
+        self.compact_queries = compact_queries
+        self.bytes_saved = 0
+
+    async def execute_custom_operation(
+        self, *fields: GraphQLField, operation_type: OperationType, operation_name: str
+    ) -> Dict[str, Any]:
+        query, variables = self.build_custom_operation(
+            *fields, operation_type=operation_type, operation_name=operation_name
+        )
+        response = await self.execute(
+            query,
+            variables=variables,
+            operation_name=operation_name,
+        )
+        return self.get_data(response)
+
+    def build_custom_operation(
+        self, *fields: GraphQLField, operation_type: OperationType, operation_name: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the document and variables of an operation.
+        The printed document only depends on the structure of the fields, so it is only built once for each structure, and later calls only fill in the variable values.
+        """
+        values: List[Any] = []
+        signature = (
+            self.compact_queries,
+            operation_type,
+            operation_name,
+            tuple(get_field_signature(field, values) for field in fields),
+        )
+        compiled_operation = _compiled_operations.get(signature)
+
+        if compiled_operation is None:
+            query, variables = self._print_custom_operation(
+                *fields, operation_type=operation_type, operation_name=operation_name
+            )
+            bytes_saved = 0
+
+            if self.compact_queries:
+                compact_query, compact_variables = self._print_compact_operation(
+                    *fields,
+                    operation_type=operation_type,
+                    operation_name=operation_name,
+                )
+                bytes_saved = get_bytes_saved(
+                    query, variables, compact_query, compact_variables
+                )
+                logger.debug(
+                    f"Compact printing saves {bytes_saved} bytes per request for operation {operation_name} ({len(query.encode())} -> {len(compact_query.encode())} bytes for the document)."
+                )
+                query, variables = compact_query, compact_variables
+
+            self.bytes_saved += bytes_saved
+
+            # The same field object used twice only has its variables once, so its values can't be matched to their names.
+            if len(variables) == len(values):
+                _compiled_operations[signature] = CompiledOperation(
+                    query, list(variables), bytes_saved
+                )
+
+                if len(_compiled_operations) > MAX_COMPILED_OPERATIONS:
+                    _compiled_operations.popitem(last=False)
+
+            return query, variables
+
+        _compiled_operations.move_to_end(signature)
+        self.bytes_saved += compiled_operation.bytes_saved
+        return compiled_operation.query, dict(
+            zip(compiled_operation.variable_names, values)
+        )
+
+    def _print_custom_operation(
+        self, *fields: GraphQLField, operation_type: OperationType, operation_name: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Write the document of an operation straight from its fields into a list of lines.
+        This gives the same document and variables as `_compile_custom_operation()`, without building an AST that is only used to print it.
+        """
+        lines: List[str] = []
+        variable_types: Dict[str, str] = {}
+        variable_values: Dict[str, Any] = {}
+
+        for idx, field in enumerate(fields):
+            self._print_field(
+                field, idx, set(), 1, lines, variable_types, variable_values
+            )
+
+        variable_definitions = ", ".join(
+            f"${name}: {type_}" for name, type_ in variable_types.items()
+        )
+        prefix = " ".join(
+            part
+            for part in (
+                operation_type.value,
+                operation_name
+                + (f"({variable_definitions})" if variable_definitions else ""),
+            )
+            if part
+        )
+        selection_set = "\n".join(["{", *lines, "}"]) if lines else ""
+
+        # Anonymous queries without variables use the short form, like `print_ast()`.
+        return (
+            "" if prefix == "query" else prefix + " "
+        ) + selection_set, variable_values
+
+    def _print_field(
+        self,
+        field: GraphQLField,
+        idx: int,
+        used_names: Set[str],
+        depth: int,
+        lines: List[str],
+        variable_types: Dict[str, str],
+        variable_values: Dict[str, Any],
+    ) -> None:
+        """Write a field and its selections as lines of the document, and collect its variables.
+        Variables are named the same way as `GraphQLField.to_ast()` names them.
+        """
+        indent = "  " * depth
+        arguments: List[str] = []
+
+        for name, variable in field._variables.items():
+            unique_name = field._format_variable_name(idx, name, used_names)
+            arguments.append(f"{name}: ${unique_name}")
+            variable_types[unique_name] = variable["type"]
+            variable_values[unique_name] = variable["value"]
+
+        line = field._build_field_name()
+
+        if arguments:
+            arguments_line = f"{line}({', '.join(arguments)})"
+
+            if len(arguments_line) > MAX_LINE_LENGTH:
+                lines.append(f"{indent}{line}(")
+                lines.extend(f"{indent}  {argument}" for argument in arguments)
+                line = ")"
+            else:
+                line = arguments_line
+
+        if not field._subfields and not field._inline_fragments:
+            lines.append(indent + line)
+            return
+
+        lines.append(f"{indent}{line} {{")
+
+        for subfield in field._subfields:
+            self._print_field(
+                subfield,
+                idx,
+                used_names,
+                depth + 1,
+                lines,
+                variable_types,
+                variable_values,
+            )
+
+        for name, subfields in field._inline_fragments.items():
+            if not subfields:
+                lines.append(f"{indent}  ... on {name}")
+                continue
+
+            lines.append(f"{indent}  ... on {name} {{")
+
+            for subfield in subfields:
+                self._print_field(
+                    subfield,
+                    idx,
+                    used_names,
+                    depth + 2,
+                    lines,
+                    variable_types,
+                    variable_values,
+                )
+
+            lines.append(f"{indent}  }}")
+
+        lines.append(indent + "}")
+
+    def _print_compact_operation(
+        self, *fields: GraphQLField, operation_type: OperationType, operation_name: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Write the document of an operation on a single line, with only the separators that are needed and short variable names (`$a`, `$b`, etc).
+        Aliases are kept as-is, so the result has the same shape as with the normal document.
+        """
+        variable_types: Dict[str, str] = {}
+        variable_values: Dict[str, Any] = {}
+        selection_set = join_compact_selections(
+            [
+                self._print_compact_field(field, variable_types, variable_values)
+                for field in fields
+            ]
+        )
+        # Types end with a name, `!` or `]`, so the next `$` can follow right after them.
+        variable_definitions = "".join(
+            f"${name}:{type_}" for name, type_ in variable_types.items()
+        )
+
+        if operation_type == OperationType.QUERY and not (
+            operation_name or variable_definitions
+        ):
+            return f"{{{selection_set}}}", variable_values
+
+        return (
+            f"{operation_type.value} {operation_name}"
+            + (f"({variable_definitions})" if variable_definitions else "")
+            + f"{{{selection_set}}}",
+            variable_values,
+        )
+
+    def _print_compact_field(
+        self,
+        field: GraphQLField,
+        variable_types: Dict[str, str],
+        variable_values: Dict[str, Any],
+    ) -> str:
+        """Write a field and its selections in compact form, and collect its variables."""
+        text = (
+            f"{field._alias}:{field._field_name}" if field._alias else field._field_name
+        )
+        arguments: List[str] = []
+
+        for name, variable in field._variables.items():
+            short_name = get_short_variable_name(len(variable_values))
+            arguments.append(f"{name}:${short_name}")
+            variable_types[short_name] = variable["type"]
+            variable_values[short_name] = variable["value"]
+
+        if arguments:
+            text += f"({','.join(arguments)})"
+
+        selections = [
+            self._print_compact_field(subfield, variable_types, variable_values)
+            for subfield in field._subfields
+        ]
+
+        for name, subfields in field._inline_fragments.items():
+            fragment = f"...on {name}"
+
+            if subfields:
+                fragment_selections = join_compact_selections(
+                    [
+                        self._print_compact_field(
+                            subfield, variable_types, variable_values
+                        )
+                        for subfield in subfields
+                    ]
+                )
+                fragment += f"{{{fragment_selections}}}"
+
+            selections.append(fragment)
+
+        if selections:
+            text += f"{{{join_compact_selections(selections)}}}"
+
+        return text
+
+    def _compile_custom_operation(
+        self, *fields: GraphQLField, operation_type: OperationType, operation_name: str
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Build the AST of an operation and print it, the same way as the generated client. See `_print_custom_operation()` for a faster way to get the same result."""
+        selections = self._build_selection_set(fields)
+        combined_variables = self._combine_variables(fields)
+        variable_definitions = self._build_variable_definitions(
+            combined_variables["types"]
+        )
+        operation_ast = self._build_operation_ast(
+            selections, operation_type, operation_name, variable_definitions
+        )
+        return print_ast(operation_ast), combined_variables["values"]
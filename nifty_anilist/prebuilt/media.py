@@ -25,6 +25,7 @@ from nifty_anilist.client.custom_fields import (
 )
 from nifty_anilist.client.custom_queries import MediaFields, Query
 from nifty_anilist.prebuilt import Timestamp
+from nifty_anilist.prepared_query import placeholder, PreparedQuery
 from nifty_anilist.utils.model_utils import validate_fuzzy_date_int
 
 
@@ -237,59 +238,43 @@ class MediaListEntry(BaseModel):
     volumes: Optional[int]
 
 
-async def get_media_list(
-    client: AnilistClient,
-    list_filters: MediaListFilters = MediaListFilters(),
-) -> List[MediaListEntry]:
-    """Get a list of media with high-level details.
-    This function will not return more granular results for each media like character/staff lists, airing schedules, etc.
-
-    Args:
-        client: Anilist client to use when making the request.
-        user_id: Anilist ID of the user. Must be provided if user_name is not.
-        user_name: Anilist user name of the user. Must be provided if user_id is not.
-        list_filters: List of filters to use.
-
-    Returns:
-        media_list: List of media from a user's list.
-    """
-
-    query = Query.media(
-        average_score_greater=list_filters.average_score_greater,
-        average_score_lesser=list_filters.average_score_lesser,
-        chapters_greater=list_filters.chapters_greater,
-        chapters_lesser=list_filters.chapters_lesser,
-        country_of_origin=list_filters.country_of_origin,
-        duration_greater=list_filters.duration_greater,
-        duration_lesser=list_filters.duration_lesser,
-        end_date_greater=list_filters.end_date_greater,
-        end_date_lesser=list_filters.end_date_lesser,
-        episodes_greater=list_filters.episodes_greater,
-        episodes_lesser=list_filters.episodes_lesser,
-        format_in=list_filters.format_in,
-        genre_in=list_filters.genre_in,
-        id_in=list_filters.id_in,
-        id_mal_in=list_filters.id_mal_in,
-        is_adult=list_filters.is_adult,
-        is_licensed=list_filters.is_licensed,
-        licensed_by_in=list_filters.licensed_by_in,
-        minimum_tag_rank=list_filters.minimum_tag_rank,
-        on_list=list_filters.on_list,
-        popularity_greater=list_filters.popularity_greater,
-        popularity_lesser=list_filters.popularity_lesser,
-        search=list_filters.search,
-        season=list_filters.season,
-        season_year=list_filters.season_year,
-        sort=list_filters.sort,
-        source_in=list_filters.source_in,
-        start_date_greater=list_filters.start_date_greater,
-        start_date_lesser=list_filters.start_date_lesser,
-        status_in=list_filters.status_in,
-        tag_in=list_filters.tag_in,
-        tag_category_in=list_filters.tag_category_in,
-        type=list_filters.type,
-        volumes_greater=list_filters.volumes_greater,
-        volumes_lesser=list_filters.volumes_lesser,
+MEDIA_LIST_QUERY = PreparedQuery(
+    Query.media(
+        average_score_greater=placeholder("average_score_greater"),
+        average_score_lesser=placeholder("average_score_lesser"),
+        chapters_greater=placeholder("chapters_greater"),
+        chapters_lesser=placeholder("chapters_lesser"),
+        country_of_origin=placeholder("country_of_origin"),
+        duration_greater=placeholder("duration_greater"),
+        duration_lesser=placeholder("duration_lesser"),
+        end_date_greater=placeholder("end_date_greater"),
+        end_date_lesser=placeholder("end_date_lesser"),
+        episodes_greater=placeholder("episodes_greater"),
+        episodes_lesser=placeholder("episodes_lesser"),
+        format_in=placeholder("format_in"),
+        genre_in=placeholder("genre_in"),
+        id_in=placeholder("id_in"),
+        id_mal_in=placeholder("id_mal_in"),
+        is_adult=placeholder("is_adult"),
+        is_licensed=placeholder("is_licensed"),
+        licensed_by_in=placeholder("licensed_by_in"),
+        minimum_tag_rank=placeholder("minimum_tag_rank"),
+        on_list=placeholder("on_list"),
+        popularity_greater=placeholder("popularity_greater"),
+        popularity_lesser=placeholder("popularity_lesser"),
+        search=placeholder("search"),
+        season=placeholder("season"),
+        season_year=placeholder("season_year"),
+        sort=placeholder("sort"),
+        source_in=placeholder("source_in"),
+        start_date_greater=placeholder("start_date_greater"),
+        start_date_lesser=placeholder("start_date_lesser"),
+        status_in=placeholder("status_in"),
+        tag_in=placeholder("tag_in"),
+        tag_category_in=placeholder("tag_category_in"),
+        type=placeholder("type"),
+        volumes_greater=placeholder("volumes_greater"),
+        volumes_lesser=placeholder("volumes_lesser"),
     ).fields(
         MediaFields.average_score,
         MediaFields.banner_image,
@@ -351,10 +336,33 @@ async def get_media_list(
         MediaFields.type,
         MediaFields.updated_at,
         MediaFields.volumes,
-    )
+    ),
+    operation_name="get_media_list",
+)
+"""Query used by `get_media_list()`, which is only built once."""
+
+
+async def get_media_list(
+    client: AnilistClient,
+    list_filters: MediaListFilters = MediaListFilters(),
+) -> List[MediaListEntry]:
+    """Get a list of media with high-level details.
+    This function will not return more granular results for each media like character/staff lists, airing schedules, etc.
+
+    Args:
+        client: Anilist client to use when making the request.
+        user_id: Anilist ID of the user. Must be provided if user_name is not.
+        user_name: Anilist user name of the user. Must be provided if user_id is not.
+        list_filters: List of filters to use.
+
+    Returns:
+        media_list: List of media from a user's list.
+    """
 
     response = await client.paginated_anilist_request(
-        query, max_items=list_filters.max_media_count
+        MEDIA_LIST_QUERY,
+        max_items=list_filters.max_media_count,
+        variables=list_filters.model_dump(exclude={"max_media_count"}),
     )
     media_list: List[MediaListEntry] = []
 
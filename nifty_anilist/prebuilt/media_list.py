@@ -21,6 +21,7 @@ from nifty_anilist.client.custom_fields import (
 )
 from nifty_anilist.client.custom_queries import Query
 from nifty_anilist.prebuilt import MediaTag, MediaTitle, Timestamp
+from nifty_anilist.prepared_query import placeholder, PreparedQuery
 from nifty_anilist.utils.auth_utils import UserId
 from nifty_anilist.utils.model_utils import validate_fuzzy_date_int
 
@@ -117,39 +118,17 @@ class UserMediaListEntry(BaseModel):
     updatedAt: Optional[int]
 
 
-async def get_user_media_list(
-    client: AnilistClient,
-    user_id: Optional[UserId] = None,
-    user_name: Optional[str] = None,
-    list_filters: UserMediaListFilters = UserMediaListFilters(),
-) -> List[UserMediaListEntry]:
-    """Get an Anilist user's media list.
-
-    Args:
-        client: Anilist client to use when making the request.
-        user_id: Anilist ID of the user. Must be provided if user_name is not.
-        user_name: Anilist user name of the user. Must be provided if user_id is not.
-        list_filters: List of filters to use.
-
-    Returns:
-        media_list: List of media from a user's list.
-    """
-
-    if (user_id is None and user_name is None) or (user_id and user_name):
-        raise ValueError(
-            'Please provide one of either "user_id" or "user_name" (not both).'
-        )
-
-    query = Query.media_list(
-        completed_at_greater=list_filters.completed_at_greater,
-        completed_at_lesser=list_filters.completed_at_lesser,
-        sort=list_filters.sort,
-        started_at_greater=list_filters.started_at_greater,
-        started_at_lesser=list_filters.started_at_lesser,
-        status_in=list_filters.status_in,
-        type=list_filters.type,
-        user_id=int(user_id) if user_id else None,
-        user_name=user_name,
+USER_MEDIA_LIST_QUERY = PreparedQuery(
+    Query.media_list(
+        completed_at_greater=placeholder("completed_at_greater"),
+        completed_at_lesser=placeholder("completed_at_lesser"),
+        sort=placeholder("sort"),
+        started_at_greater=placeholder("started_at_greater"),
+        started_at_lesser=placeholder("started_at_lesser"),
+        status_in=placeholder("status_in"),
+        type=placeholder("type"),
+        user_id=placeholder("user_id"),
+        user_name=placeholder("user_name"),
     ).fields(
         MediaListFields.advanced_scores,
         MediaListFields.completed_at().fields(
@@ -210,15 +189,49 @@ async def get_user_media_list(
         MediaListFields.progress,
         MediaListFields.progress_volumes,
         MediaListFields.repeat,
-        MediaListFields.score(format=list_filters.score_format),
+        MediaListFields.score(format=placeholder("score_format")),
         MediaListFields.started_at().fields(
             FuzzyDateFields.year, FuzzyDateFields.month, FuzzyDateFields.day
         ),
         MediaListFields.status,
         MediaListFields.updated_at,
-    )
+    ),
+    operation_name="get_user_media_list",
+)
+"""Query used by `get_user_media_list()`, which is only built once."""
 
-    response = await client.paginated_anilist_request(query)
+
+async def get_user_media_list(
+    client: AnilistClient,
+    user_id: Optional[UserId] = None,
+    user_name: Optional[str] = None,
+    list_filters: UserMediaListFilters = UserMediaListFilters(),
+) -> List[UserMediaListEntry]:
+    """Get an Anilist user's media list.
+
+    Args:
+        client: Anilist client to use when making the request.
+        user_id: Anilist ID of the user. Must be provided if user_name is not.
+        user_name: Anilist user name of the user. Must be provided if user_id is not.
+        list_filters: List of filters to use.
+
+    Returns:
+        media_list: List of media from a user's list.
+    """
+
+    if (user_id is None and user_name is None) or (user_id and user_name):
+        raise ValueError(
+            'Please provide one of either "user_id" or "user_name" (not both).'
+        )
+
+    response = await client.paginated_anilist_request(
+        USER_MEDIA_LIST_QUERY,
+        variables={
+            **list_filters.model_dump(),
+            "user_id": int(user_id) if user_id else None,
+            "user_name": user_name,
+        },
+    )
     media_list: List[UserMediaListEntry] = []
 
     for item in response:
@@ -0,0 +1,170 @@
+from typing import Any, cast, Dict, Mapping, Optional, Tuple, TYPE_CHECKING
+
+from graphql import OperationType
+
+from nifty_anilist.client.custom_fields import PageFields, PageInfoFields
+from nifty_anilist.client.custom_queries import GraphQLField, Query
+from nifty_anilist.graphql_client import GraphQLClient
+
+if TYPE_CHECKING:
+    from nifty_anilist.anilist_client import PaginatedQueryRequest
+
+
+PAGE_PLACEHOLDER = "page"
+"""Name of the placeholder for the page number, in the page queries of a prepared query (see `PreparedQuery.get_page_query()`)."""
+
+PER_PAGE_PLACEHOLDER = "per_page"
+"""Name of the placeholder for the number of items per page, in the page queries of a prepared query."""
+
+
+class Placeholder:
+    """Stands in for the value of an argument when building the fields of a prepared query, ex: `Query.media(id=placeholder("id"))`.
+    The value is given each time the query is sent (see `PreparedQuery`). Create them with `placeholder()`, which type checkers accept for any argument.
+    """
+
+    name: str
+    """Name of the value to use for the argument, in the variables given when sending the query."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+
+    def __repr__(self) -> str:
+        return f"Placeholder({self.name!r})"
+
+
+def placeholder(name: str) -> Any:
+    """Create a placeholder for the value of an argument of a prepared query, ex: `Query.media(id=placeholder("id"))`.
+    It is typed as `Any` so that it can be given to the typed arguments of the generated fields (ex: an `Optional[int]`).
+
+    Args:
+        name: Name of the value to use for the argument, in the variables given when sending the query.
+
+    Returns:
+        placeholder: Placeholder for the argument.
+    """
+    return Placeholder(name)
+
+
+class PreparedQuery:
+    """Query that is built and printed once from template fields, and can then be sent many times with different values for its placeholders.
+    Sending it doesn't create any fields or build/print the GraphQL document again, only the variables change.
+
+    Example:
+    ```py
+    media_query = PreparedQuery(Query.media(id=placeholder("id")).fields(MediaFields.id, MediaFields.title().fields(MediaTitleFields.romaji())))
+
+    for media_id in media_ids:
+        result = await client.prepared_anilist_request(media_query, {"id": media_id})
+    ```
+    """
+
+    fields: Tuple[GraphQLField, ...]
+    """Template fields of the query. These should not be changed after the query is prepared."""
+    operation_name: str
+    """Name of the GraphQL operation."""
+
+    def __init__(
+        self, *fields: GraphQLField, operation_name: str = "prepared_anilist_query"
+    ) -> None:
+        """Prepare a query.
+
+        Args:
+            fields: Fields of the query, ex: `Query.media(id=placeholder("id")).fields( … )`.
+                Any argument can be a placeholder (see `placeholder()`), and a query with a single list field (ex: `PageFields.media( … ).fields( … )`) can also be used for paginated requests.
+            operation_name: Name of the GraphQL operation.
+        """
+        self.fields = fields
+        self.operation_name = operation_name
+        self._query: Optional[str] = None
+        self._constant_variables: Dict[str, Any] = {}
+        self._placeholder_variables: Dict[str, str] = {}
+        self._page_queries: Dict[bool, PreparedQuery] = {}
+
+    def build(
+        self, client: GraphQLClient, values: Optional[Mapping[str, Any]] = None
+    ) -> Tuple[str, Dict[str, Any]]:
+        """Get the GraphQL document and variables to send for some placeholder values.
+        The document is only built the first time.
+
+        Args:
+            client: GraphQL client to build the document with.
+            values: Value of each placeholder. Placeholders that are missing (or `None`) are left out of the variables, which is the same as not giving that argument.
+
+        Returns:
+            query: GraphQL document of the query.
+            variables: Variables to send with the document.
+        """
+        query = self._query if self._query is not None else self._compile(client)
+        values = values or {}
+        unknown_names = values.keys() - set(self._placeholder_variables.values())
+
+        if unknown_names:
+            raise ValueError(
+                f"Unknown placeholders for prepared query {self.operation_name}: {', '.join(sorted(unknown_names))}."
+            )
+
+        variables = dict(self._constant_variables)
+
+        for variable_name, placeholder_name in self._placeholder_variables.items():
+            value = values.get(placeholder_name)
+
+            if value is not None:
+                variables[variable_name] = value
+
+        return query, variables
+
+    def get_page_query(self, include_totals: bool = False) -> "PreparedQuery":
+        """Get the query for a single page of this query's list field, with the `page` and `per_page` placeholders (see `AnilistClient.paginated_anilist_request()`).
+
+        Args:
+            include_totals: Whether to also request the total item count and last page number.
+
+        Returns:
+            page_query: Prepared query for a page, which is only built once.
+        """
+        if len(self.fields) != 1:
+            raise ValueError(
+                "Only a prepared query with a single list field can be used for a paginated request."
+            )
+
+        page_query = self._page_queries.get(include_totals)
+
+        if page_query is None:
+            page_info_fields = [PageInfoFields.has_next_page]
+
+            if include_totals:
+                page_info_fields.extend(
+                    [PageInfoFields.total, PageInfoFields.last_page]
+                )
+
+            page_query = PreparedQuery(
+                Query.page(
+                    page=placeholder(PAGE_PLACEHOLDER),
+                    per_page=placeholder(PER_PAGE_PLACEHOLDER),
+                ).fields(
+                    PageFields.page_info().fields(*page_info_fields),
+                    # The single field has to be one of the list fields of "Page" for paginated requests.
+                    cast("PaginatedQueryRequest", self.fields[0]),
+                ),
+                operation_name=self.operation_name,
+            )
+            self._page_queries[include_totals] = page_query
+
+        return page_query
+
+    def _compile(self, client: GraphQLClient) -> str:
+        """Build and print the GraphQL document, and find which of its variables come from placeholders."""
+        query, variables = client.build_custom_operation(
+            *self.fields,
+            operation_type=OperationType.QUERY,
+            operation_name=self.operation_name,
+        )
+
+        for variable_name, value in variables.items():
+            if isinstance(value, Placeholder):
+                self._placeholder_variables[variable_name] = value.name
+            else:
+                self._constant_variables[variable_name] = value
+
+        self._query = query
+        return query
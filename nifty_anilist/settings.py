@@ -1,9 +1,20 @@
+import os
 from enum import StrEnum
 from typing import Optional
 
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 
+def get_cache_dir() -> str:
+    """Get the folder where files shared by all processes are kept by default (ex: `~/.cache/nifty_anilist`)."""
+    base_dir = (
+        os.environ.get("XDG_CACHE_HOME")
+        or os.environ.get("LOCALAPPDATA")
+        or os.path.join(os.path.expanduser("~"), ".cache")
+    )
+    return os.path.join(base_dir, "nifty_anilist")
+
+
 class TokenSavingMethod(StrEnum):
     """Enum for types of token-saving methods."""
 
@@ -11,6 +22,34 @@ class TokenSavingMethod(StrEnum):
     IN_MEMORY = "IN_MEMORY"
 
 
+class RateLimiterBackendType(StrEnum):
+    """Enum for where the rate limiter keeps track of requests."""
+
+    MEMORY = "MEMORY"
+    SQLITE = "SQLITE"
+
+
+class CachePolicy(StrEnum):
+    """Enum for how cached results are used when they are past their TTL."""
+
+    CACHE_FIRST = "CACHE_FIRST"
+    """Only use results that haven't expired. Expired results are requested again."""
+    STALE_WHILE_REVALIDATE = "STALE_WHILE_REVALIDATE"
+    """Return results that expired less than `response_cache_stale_grace_seconds` ago right away, and refresh them in the background."""
+    OFFLINE_FALLBACK = "OFFLINE_FALLBACK"
+    """Only return results that expired less than `response_cache_stale_grace_seconds` ago if the request would have to wait for the rate limiter (they are then refreshed in the background) or Anilist can't be reached."""
+
+
+class JsonCodecType(StrEnum):
+    """Enum for the JSON libraries that can be used to encode requests and decode responses."""
+
+    AUTO = "AUTO"
+    """Use the fastest library that is installed: orjson, then msgspec, then Python's built-in `json` module."""
+    ORJSON = "ORJSON"
+    MSGSPEC = "MSGSPEC"
+    STDLIB = "STDLIB"
+
+
 class WebBrowser(StrEnum):
     """Enum for supported browsers."""
 
@@ -40,16 +79,100 @@ class AnilistSettings(BaseSettings):
     request_timeout_seconds: int = 10
     """Number of seconds to wait for a single API request to Anilist to complete."""
 
+    http_connect_timeout_seconds: float = 5
+    """Number of seconds to wait for a new connection to Anilist to be opened."""
+
+    http_pool_timeout_seconds: float = 10
+    """Number of seconds a request can wait for a free connection when all the connections of the pool are in use."""
+
+    http_share_connection_pool: bool = True
+    """If `True`, all Anilist clients in the process share the same connection pool (one per event loop), so new clients reuse already open connections instead of making new ones."""
+
+    http_max_connections: int = 100
+    """Max number of connections to Anilist open at the same time, per connection pool."""
+
+    http_max_keepalive_connections: int = 20
+    """Max number of idle connections to keep open for later requests, per connection pool."""
+
+    http_keepalive_expiry_seconds: float = 30
+    """Number of seconds to keep an idle connection open for."""
+
+    http2_enabled: bool = False
+    """If `True`, requests are made over HTTP/2 when Anilist supports it, so that concurrent requests share a single connection instead of opening one each.
+    Requires the `http2` extra (`pip install nifty_anilist[http2]`)."""
+
     rate_limit_max_retries: Optional[int] = None
     """Number of times to retry failed requests to the Anilist API after a rate limit error. Set to `None` for infinite retries."""
 
     rate_limit_retry_initial_delay: Optional[int] = None
     """Amount to wait before retrying a request after a rate limit error. Set to `None` to use the value from headers instead."""
 
+    rate_limit_release_jitter_seconds: float = 2
+    """After being rate limited, all requests are paused. When the pause is over, each waiting request will wait a random amount of time up to this many seconds so that they don't all get sent at once."""
+
     max_requests_per_minute: Optional[int] = None
     """Max number of requests to make per minute. This can help avoid rate limiting before it happens.
     Set to `None` to not have an explicit limit and instead rely on the headers from Anilist."""
 
+    rate_limiter_backend: RateLimiterBackendType = RateLimiterBackendType.MEMORY
+    """Where the rate limiter keeps track of requests. Possible values: \"MEMORY\", \"SQLITE\".
+    With \"MEMORY\", each process has its own limit. With \"SQLITE\", all processes using the same `rate_limiter_sqlite_path` share the same limit."""
+
+    rate_limiter_sqlite_path: str = os.path.join(get_cache_dir(), "rate_limit.sqlite3")
+    """Path to the SQLite database file used by the rate limiter when `rate_limiter_backend` is \"SQLITE\".
+    By default it is in the user's cache folder, so that processes started from different working directories still share the same limit."""
+
+    rate_limit_use_headers: bool = True
+    """If `True`, the rate limit headers returned by Anilist (`X-RateLimit-Limit`, `X-RateLimit-Remaining`, etc.) will be used to wait before making requests, so that we avoid being rate limited.
+    This can be used with or without `max_requests_per_minute`. If both are available, the lower limit is used."""
+
+    deduplicate_in_flight_requests: bool = True
+    """If `True`, identical requests made at the same time by the same client (with the same priority) will only be sent once and will all share the result.
+    Each request still gives up on waiting for the shared result at its own `deadline_seconds`."""
+
+    json_codec: JsonCodecType = JsonCodecType.AUTO
+    """JSON library used to encode requests and decode responses. Possible values: \"AUTO\", \"ORJSON\", \"MSGSPEC\", \"STDLIB\".
+    orjson and msgspec are a lot faster for large responses, and can be installed with the `orjson` or `msgspec` extra."""
+
+    json_decode_thread_threshold_bytes: Optional[int] = None
+    """Responses at least this big (in bytes) are decoded in a worker thread instead of on the event loop, so that other requests and tasks aren't stalled while they are decoded.
+    The JSON libraries hold the GIL while decoding, so this only gives the event loop a chance to run now and then. Set to `None` to always decode responses on the event loop."""
+
+    json_decode_process_threshold_bytes: Optional[int] = None
+    """Responses at least this big (in bytes) are decoded in a separate process instead, so the event loop stays free while they are decoded.
+    The decoded result still has to be unpickled on the event loop, which takes about as long as decoding it with orjson, so this only helps for very large responses. Set to `None` to never use a separate process."""
+
+    compact_queries: bool = False
+    """If `True`, GraphQL documents are sent on a single line without extra whitespace, and with short variable names (ex: `$a` instead of `$perPage_0`), which makes request bodies smaller.
+    The number of bytes saved is logged when each operation is first built, and counted in the client's `bytes_saved`."""
+
+    # --- Response Cache ---
+    response_cache_enabled: bool = False
+    """If `True`, the results of queries will be cached and reused for identical queries instead of making a new request. Mutations are never cached."""
+
+    response_cache_ttl_seconds: float = 3600
+    """Number of seconds to keep a cached result for, unless another TTL is given for the query."""
+
+    response_cache_max_bytes: int = 64 * 1024 * 1024
+    """Maximum total size of the cached results kept in memory, in bytes. When the cache is full, the least recently used results are removed."""
+
+    response_cache_policy: CachePolicy = CachePolicy.CACHE_FIRST
+    """How cached results that are past their TTL are used, unless another policy is given for the query. Possible values: \"CACHE_FIRST\", \"STALE_WHILE_REVALIDATE\", \"OFFLINE_FALLBACK\"."""
+
+    response_cache_stale_grace_seconds: float = 300
+    """Number of seconds after their TTL that cached results are kept for, so they can still be used by the \"STALE_WHILE_REVALIDATE\" and \"OFFLINE_FALLBACK\" cache policies."""
+
+    entity_cache_enabled: bool = False
+    """If `True`, the results of queries will also be stored in a normalized cache where each entity (ex: a media) is only stored once, no matter how many results it is in.
+    Queries whose fields are all in the cache are answered without a request, even if that exact query was never made. Cached fields are kept for `response_cache_ttl_seconds`."""
+
+    entity_cache_max_records: int = 100_000
+    """Maximum number of entities (and query results) kept in the entity cache. When the cache is full, the least recently used ones are removed."""
+
+    response_cache_sqlite_path: Optional[str] = None
+    """If set, cached results are also stored (compressed) in a SQLite database at this path, so they survive restarts and are shared by all processes using the same file.
+    Results are still kept in memory too, so they only need to be read from the database once per process."""
+
     # --- Auth ---
     client_id: str
     """Client ID from Anilist client.
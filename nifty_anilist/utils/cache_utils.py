@@ -0,0 +1,627 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
+from time import monotonic, time
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+    TypeVar,
+)
+
+from nifty_anilist.settings import anilist_settings
+
+T = TypeVar("T")
+
+
+class CacheStats:
+    """Counters for how well a response cache is doing."""
+
+    hits: int
+    """Number of lookups that were answered from the cache."""
+    misses: int
+    """Number of lookups that were not in the cache (or had expired)."""
+    stale_hits: int
+    """Number of hits that were answered with a result past its TTL (these are also counted in `hits`)."""
+    evictions: int
+    """Number of entries that were removed to make room for new ones."""
+
+    def __init__(self) -> None:
+        self.hits = 0
+        self.misses = 0
+        self.stale_hits = 0
+        self.evictions = 0
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of lookups that were answered from the cache."""
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+
+class ResponseCache(ABC):
+    """Cache for the results of Anilist queries, so that repeated queries don't need to be sent again.
+    Results are stored as JSON, so every lookup returns a new copy that can be changed freely.
+    """
+
+    default_ttl_seconds: float
+    """Number of seconds to keep a result for, if no other TTL is given when storing it."""
+    stale_grace_seconds: float
+    """Number of seconds after their TTL that results are still kept for, so they can be used when a stale result is allowed."""
+    stats: CacheStats
+    """Hit/miss counters of the cache."""
+    blocking: bool = False
+    """Whether the storage can block for a while (ex: waiting for another process to unlock a database file).
+    The `*_async()` methods then use it in a worker thread, so that the event loop isn't blocked."""
+
+    def __init__(
+        self, default_ttl_seconds: float, stale_grace_seconds: float = 0
+    ) -> None:
+        self.default_ttl_seconds = default_ttl_seconds
+        self.stale_grace_seconds = stale_grace_seconds
+        self.stats = CacheStats()
+
+    def get(self, key: str) -> Optional[Any]:
+        """Get a result from the cache.
+
+        Args:
+            key: Key of the result (see `get_operation_key()`).
+
+        Returns:
+            result: The cached result, or `None` if it is not in the cache or has expired.
+        """
+        entry = self.get_with_ttl(key)
+        return None if entry is None else entry[0]
+
+    def get_with_ttl(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[Any, float]]:
+        """Get a result from the cache, along with the number of seconds until it expires.
+
+        Args:
+            key: Key of the result (see `get_operation_key()`).
+            allow_stale: If `True`, results that expired less than `stale_grace_seconds` ago are returned too.
+
+        Returns:
+            entry: The cached result and the number of seconds until it expires (negative if it has already expired), or `None` if it is not in the cache.
+        """
+        return self._read_entry(self._get(key, allow_stale))
+
+    async def get_with_ttl_async(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[Any, float]]:
+        """Same as `get_with_ttl()`, but without blocking the event loop if the storage can block (see `blocking`)."""
+        return self._read_entry(await self._get_async(key, allow_stale))
+
+    def set(
+        self,
+        key: str,
+        result: Any,
+        ttl_seconds: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> None:
+        """Store a result in the cache.
+
+        Args:
+            key: Key of the result (see `get_operation_key()`).
+            result: Result to store. Must be serializable to JSON.
+            ttl_seconds: Number of seconds to keep the result for. Leave as `None` to use the default TTL.
+            tags: Labels for what the result contains (ex: `Media:1`), so that it can be removed when one of them changes (see `invalidate_tags()`).
+        """
+        ttl_seconds = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        if ttl_seconds <= 0:
+            return
+
+        self._set(key, json.dumps(result).encode(), ttl_seconds, tags)
+
+    async def set_async(
+        self,
+        key: str,
+        result: Any,
+        ttl_seconds: Optional[float] = None,
+        tags: Iterable[str] = (),
+    ) -> None:
+        """Same as `set()`, but without blocking the event loop if the storage can block (see `blocking`)."""
+        ttl_seconds = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        if ttl_seconds <= 0:
+            return
+
+        await self._set_async(key, json.dumps(result).encode(), ttl_seconds, tags)
+
+    async def invalidate_tags_async(self, tags: Iterable[str]) -> List[str]:
+        """Same as `invalidate_tags()`, but without blocking the event loop if the storage can block (see `blocking`)."""
+        return await self._call_storage(self.invalidate_tags, tags)
+
+    def _read_entry(
+        self, entry: Optional[Tuple[bytes, float]]
+    ) -> Optional[Tuple[Any, float]]:
+        """Count a lookup in the stats, and decode the result that was found (if any)."""
+        if entry is None:
+            self.stats.misses += 1
+            return None
+
+        self.stats.hits += 1
+
+        if entry[1] <= 0:
+            self.stats.stale_hits += 1
+
+        return json.loads(entry[0]), entry[1]
+
+    async def _get_async(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        """Same as `_get()`, but in a worker thread if the storage can block."""
+        return await self._call_storage(self._get, key, allow_stale)
+
+    async def _set_async(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        """Same as `_set()`, but in a worker thread if the storage can block."""
+        await self._call_storage(self._set, key, value, ttl_seconds, tags)
+
+    async def _call_storage(self, function: Callable[..., T], *args: Any) -> T:
+        """Call a method that uses the storage, in a worker thread if it can block (see `blocking`).
+
+        Args:
+            function: Method to call.
+            args: Arguments to call it with.
+
+        Returns:
+            result: What the method returned.
+        """
+        if self.blocking:
+            return await asyncio.to_thread(function, *args)
+
+        return function(*args)
+
+    @abstractmethod
+    def _get(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        """Get the serialized result stored under a key and the number of seconds until it expires, if it has not expired (or is still in its grace period, if `allow_stale` is `True`)."""
+
+    @abstractmethod
+    def _set(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        """Store a serialized result under a key."""
+
+    @abstractmethod
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        """Remove all the results that have any of some tags.
+
+        Args:
+            tags: Tags of the results to remove, ex: `Media:1`.
+
+        Returns:
+            keys: Keys of the results that were removed.
+        """
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Remove a result from the cache, if it is there.
+
+        Args:
+            key: Key of the result.
+        """
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove all results from the cache."""
+
+
+class CacheEntry:
+    """A result stored in the memory cache."""
+
+    value: bytes
+    expires_at: float
+    """Time (from `time.monotonic()`) at which the entry expires."""
+    tags: Set[str]
+
+    def __init__(self, value: bytes, expires_at: float, tags: Set[str]) -> None:
+        self.value = value
+        self.expires_at = expires_at
+        self.tags = tags
+
+
+class MemoryResponseCache(ResponseCache):
+    """Keeps the results in memory, and removes the least recently used ones when the cache gets too big."""
+
+    max_bytes: int
+    """Maximum total size of the stored results, in bytes."""
+
+    def __init__(
+        self,
+        max_bytes: int = 64 * 1024 * 1024,
+        default_ttl_seconds: float = 3600,
+        stale_grace_seconds: float = 0,
+    ) -> None:
+        super().__init__(default_ttl_seconds, stale_grace_seconds)
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[str, CacheEntry] = OrderedDict()
+        self._keys_by_tag: Dict[str, Set[str]] = {}
+        self._size_bytes = 0
+
+    @property
+    def size_bytes(self) -> int:
+        """Total size of the stored results, in bytes."""
+        return self._size_bytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _get(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        entry = self._entries.get(key)
+
+        if entry is None:
+            return None
+
+        ttl_left = entry.expires_at - monotonic()
+
+        if ttl_left <= -self.stale_grace_seconds:
+            self.delete(key)
+            return None
+
+        if ttl_left <= 0 and not allow_stale:
+            return None
+
+        self._entries.move_to_end(key)
+        return entry.value, ttl_left
+
+    def _set(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        self.delete(key)
+
+        # Don't let a single huge result push everything else out.
+        if len(value) > self.max_bytes:
+            return
+
+        entry = CacheEntry(value, monotonic() + ttl_seconds, set(tags))
+        self._entries[key] = entry
+        self._size_bytes += len(value)
+
+        for tag in entry.tags:
+            self._keys_by_tag.setdefault(tag, set()).add(key)
+
+        while self._size_bytes > self.max_bytes:
+            evicted_key = next(iter(self._entries))
+            self.delete(evicted_key)
+            self.stats.evictions += 1
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        keys = {key for tag in tags for key in self._keys_by_tag.get(tag, ())}
+
+        for key in keys:
+            self.delete(key)
+
+        return list(keys)
+
+    def delete(self, key: str) -> None:
+        entry = self._entries.pop(key, None)
+
+        if entry is None:
+            return
+
+        self._size_bytes -= len(entry.value)
+
+        for tag in entry.tags:
+            keys = self._keys_by_tag[tag]
+            keys.discard(key)
+
+            if not keys:
+                del self._keys_by_tag[tag]
+
+    def clear(self) -> None:
+        self._entries.clear()
+        self._keys_by_tag.clear()
+        self._size_bytes = 0
+
+
+class SQLiteResponseCache(ResponseCache):
+    """Keeps the results in a local SQLite database, compressed, so that they survive restarts.
+    The database is in WAL mode, so every process using the same database file can read from it at the same time (ex: the workers of a web server).
+    Expired results are removed every once in a while when new results are stored.
+    """
+
+    blocking = True
+
+    path: str
+    """Path to the SQLite database file."""
+    sweep_interval_seconds: float
+    """Minimum number of seconds between two sweeps of the expired results."""
+
+    def __init__(
+        self,
+        path: str,
+        default_ttl_seconds: float = 3600,
+        sweep_interval_seconds: float = 300,
+        stale_grace_seconds: float = 0,
+    ) -> None:
+        super().__init__(default_ttl_seconds, stale_grace_seconds)
+        self.path = path
+        self.sweep_interval_seconds = sweep_interval_seconds
+        self._last_sweep = time()
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        # The connection is used from worker threads, but only by one at a time.
+        self._lock = threading.Lock()
+
+    def _get(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        now = time()
+
+        with self._lock:
+            row = (
+                self._get_connection()
+                .execute(
+                    "SELECT value, expires_at FROM responses WHERE key = ? AND expires_at > ?",
+                    (key, now - self.stale_grace_seconds if allow_stale else now),
+                )
+                .fetchone()
+            )
+
+        if row is None:
+            return None
+
+        return zlib.decompress(row[0]), row[1] - now
+
+    def _set(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        now = time()
+
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO responses (key, value, expires_at) VALUES (?, ?, ?)",
+                (key, zlib.compress(value), now + ttl_seconds),
+            )
+            connection.execute("DELETE FROM response_tags WHERE key = ?", (key,))
+            connection.executemany(
+                "INSERT INTO response_tags (tag, key) VALUES (?, ?)",
+                [(tag, key) for tag in set(tags)],
+            )
+
+        if now - self._last_sweep >= self.sweep_interval_seconds:
+            self.remove_expired()
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        tags = list(set(tags))
+
+        if not tags:
+            return []
+
+        placeholders = ", ".join("?" for _ in tags)
+
+        with self._transaction() as connection:
+            keys = [
+                row[0]
+                for row in connection.execute(
+                    f"SELECT DISTINCT key FROM response_tags WHERE tag IN ({placeholders})",
+                    tags,
+                )
+            ]
+            connection.executemany(
+                "DELETE FROM responses WHERE key = ?", [(key,) for key in keys]
+            )
+            connection.executemany(
+                "DELETE FROM response_tags WHERE key = ?", [(key,) for key in keys]
+            )
+
+        return keys
+
+    def delete(self, key: str) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+            connection.execute("DELETE FROM response_tags WHERE key = ?", (key,))
+
+    def clear(self) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM responses")
+            connection.execute("DELETE FROM response_tags")
+
+    def remove_expired(self) -> int:
+        """Remove all the results that expired (and are past their grace period) from the database.
+
+        Returns:
+            count: Number of results that were removed.
+        """
+        self._last_sweep = time()
+
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                "DELETE FROM responses WHERE expires_at <= ?",
+                (self._last_sweep - self.stale_grace_seconds,),
+            )
+            connection.execute(
+                "DELETE FROM response_tags WHERE key NOT IN (SELECT key FROM responses)"
+            )
+
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        with self._lock:
+            return (
+                self._get_connection()
+                .execute(
+                    "SELECT COUNT(*) FROM responses WHERE expires_at > ?", (time(),)
+                )
+                .fetchone()[0]
+            )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a transaction that changes more than one table, which is committed (or rolled back on errors) at the end.
+        The transaction locks the database for writing right away, so other processes wait for it to finish (a read that later needs to write would fail right away instead).
+        """
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("BEGIN IMMEDIATE")
+
+            with connection:
+                yield connection
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the connection to the database, creating it (and the tables) if needed.
+        SQLite connections can't be shared with forked processes, so each process gets its own.
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            # Each statement is its own transaction, so readers never wait on a long write.
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS responses_expires_at ON responses (expires_at)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS response_tags (tag TEXT NOT NULL, key TEXT NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS response_tags_tag ON response_tags (tag)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS response_tags_key ON response_tags (key)"
+            )
+
+            self._connection = connection
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+
+class TieredResponseCache(ResponseCache):
+    """Checks a fast cache first (ex: in memory), then a slower one (ex: on disk).
+    Results are stored in both, and results found in the slower cache are copied to the fast one for next time.
+    """
+
+    fast_cache: ResponseCache
+    slow_cache: ResponseCache
+
+    def __init__(self, fast_cache: ResponseCache, slow_cache: ResponseCache) -> None:
+        super().__init__(slow_cache.default_ttl_seconds, slow_cache.stale_grace_seconds)
+        self.fast_cache = fast_cache
+        self.slow_cache = slow_cache
+        self.blocking = fast_cache.blocking or slow_cache.blocking
+
+    def _get(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        entry = self.fast_cache._get(key, allow_stale)
+
+        if entry is None:
+            entry = self.slow_cache._get(key, allow_stale)
+
+            if entry is not None:
+                self.fast_cache._set(key, *entry)
+
+        return entry
+
+    def _set(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        tags = set(tags)
+        self.fast_cache._set(key, value, ttl_seconds, tags)
+        self.slow_cache._set(key, value, ttl_seconds, tags)
+
+    # Each tier is only used in a worker thread if it can block itself, so the fast one stays on the event loop.
+
+    async def _get_async(
+        self, key: str, allow_stale: bool = False
+    ) -> Optional[Tuple[bytes, float]]:
+        entry = await self.fast_cache._get_async(key, allow_stale)
+
+        if entry is None:
+            entry = await self.slow_cache._get_async(key, allow_stale)
+
+            if entry is not None:
+                await self.fast_cache._set_async(key, *entry)
+
+        return entry
+
+    async def _set_async(
+        self, key: str, value: bytes, ttl_seconds: float, tags: Iterable[str] = ()
+    ) -> None:
+        tags = set(tags)
+        await self.fast_cache._set_async(key, value, ttl_seconds, tags)
+        await self.slow_cache._set_async(key, value, ttl_seconds, tags)
+
+    async def invalidate_tags_async(self, tags: Iterable[str]) -> List[str]:
+        tags = set(tags)
+        keys = set(await self.fast_cache.invalidate_tags_async(tags))
+        keys.update(await self.slow_cache.invalidate_tags_async(tags))
+
+        # Results copied from the slow cache don't have their tags in the fast one.
+        for key in keys:
+            self.fast_cache.delete(key)
+
+        return list(keys)
+
+    def invalidate_tags(self, tags: Iterable[str]) -> List[str]:
+        tags = set(tags)
+        keys = set(self.fast_cache.invalidate_tags(tags))
+        keys.update(self.slow_cache.invalidate_tags(tags))
+
+        # Results copied from the slow cache don't have their tags in the fast one.
+        for key in keys:
+            self.fast_cache.delete(key)
+
+        return list(keys)
+
+    def delete(self, key: str) -> None:
+        self.fast_cache.delete(key)
+        self.slow_cache.delete(key)
+
+    def clear(self) -> None:
+        self.fast_cache.clear()
+        self.slow_cache.clear()
+
+
+def create_response_cache() -> Optional[ResponseCache]:
+    """Create the response cache that was chosen in the settings, or `None` if it is turned off."""
+    if not anilist_settings.response_cache_enabled:
+        return None
+
+    cache: ResponseCache = MemoryResponseCache(
+        max_bytes=anilist_settings.response_cache_max_bytes,
+        default_ttl_seconds=anilist_settings.response_cache_ttl_seconds,
+        stale_grace_seconds=anilist_settings.response_cache_stale_grace_seconds,
+    )
+
+    if anilist_settings.response_cache_sqlite_path:
+        cache = TieredResponseCache(
+            cache,
+            SQLiteResponseCache(
+                anilist_settings.response_cache_sqlite_path,
+                default_ttl_seconds=anilist_settings.response_cache_ttl_seconds,
+                stale_grace_seconds=anilist_settings.response_cache_stale_grace_seconds,
+            ),
+        )
+
+    return cache
+
+
+RESPONSE_CACHE = create_response_cache()
+"""Global response cache shared by all clients, if it is turned on in the settings."""
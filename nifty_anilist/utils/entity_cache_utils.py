@@ -0,0 +1,763 @@
+import json
+from collections import OrderedDict
+from copy import copy, deepcopy
+from hashlib import sha256
+from time import monotonic
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set
+
+from pydantic_core import to_jsonable_python
+
+from nifty_anilist.client.custom_typing_fields import GraphQLField
+from nifty_anilist.settings import anilist_settings
+from nifty_anilist.utils.cache_utils import CacheStats
+
+
+ROOT_QUERY = "ROOT_QUERY"
+"""Prefix of the records that hold the results of root query fields (ex: `Media(id: 1)`)."""
+
+REFERENCE_KEY = "__ref"
+"""Key of the dictionaries that point to an entity record instead of holding the entity's fields."""
+
+TYPENAME_KEY = "__typename"
+"""Key holding the type of the objects that are stored inside of a record (ex: `MediaTitle`), so that they can be found when invalidating a type."""
+
+RECORD_KEY_SEPARATOR = "/"
+"""Separator between the scope hash and the reference of an entity in the key of its record (ex: `3f2a…/Media:1`)."""
+
+SINGLE_ENTITY_ROOT_FIELDS = {
+    "ActivityReply",
+    "AiringSchedule",
+    "Character",
+    "Media",
+    "MediaList",
+    "Recommendation",
+    "Review",
+    "Staff",
+    "Studio",
+    "Thread",
+    "User",
+}
+"""Root query fields that return a single entity, so that a lookup by ID can be answered from a record cached by any other query.
+Others (ex: `ThreadComment`) return a list, even when looked up by ID."""
+
+VIEWER_FIELDS = {
+    "Viewer",
+    "isBlocked",
+    "isFavourite",
+    "isFavouriteBlocked",
+    "isFollower",
+    "isFollowing",
+    "isLiked",
+    "isSubscribed",
+    "mediaListEntry",
+    "userRating",
+}
+"""Fields whose value depends on who is making the request. They are removed after mutations that might change them."""
+
+
+class Missing:
+    """Marker for a field that is not in the cache."""
+
+
+MISSING = Missing()
+
+
+class EntityRecord:
+    """The cached fields of an entity (or of a root query field)."""
+
+    fields: Dict[str, Any]
+    """Normalized values of the fields, by storage key (see `get_storage_key()`)."""
+    expires_at: float
+    """Time (from `time.monotonic()`) at which the oldest field of the record expires."""
+    typenames: Set[str]
+    """Types of the objects held by the fields (see `get_typenames()`), so that the record can be found when invalidating a type."""
+
+    def __init__(self, fields: Dict[str, Any], expires_at: float) -> None:
+        self.fields = fields
+        self.expires_at = expires_at
+        self.typenames = set()
+
+
+class EntityCache:
+    """Normalized cache that stores each entity (anything with a type and an `id`, ex: `Media:1`) only once, no matter how many results it is in.
+    Results are split into entity records when they are stored, and fields from different queries for the same entity are merged together.
+    Query results are rebuilt from the records, so a query can be answered without a request if all of its fields are already cached.
+
+    The type of an entity comes from the class of its field in the query (ex: `MediaFields` for `Media`), and only objects whose `id` was requested are stored as entities.
+    Queries with inline fragments (unions) are not cached, since the type of their results can't be known.
+
+    Records are kept separately for each scope (who made the request, ex: their auth header), since Anilist can return different fields (ex: private list entries or notes) to each user.
+    Nothing that was fetched for one user is ever used to answer another user's query, and results fetched without auth are only shared with other requests without auth.
+    """
+
+    default_ttl_seconds: float
+    """Number of seconds to keep cached fields for, if no other TTL is given when storing them."""
+    max_records: int
+    """Maximum number of records to keep. When the cache is full, the least recently used records are removed."""
+    stats: CacheStats
+    """Hit/miss counters of the cache."""
+
+    def __init__(
+        self, max_records: int = 100_000, default_ttl_seconds: float = 3600
+    ) -> None:
+        self.max_records = max_records
+        self.default_ttl_seconds = default_ttl_seconds
+        self.stats = CacheStats()
+        self._records: OrderedDict[str, EntityRecord] = OrderedDict()
+        # Indexes of the record keys, so that invalidating an entity or a type doesn't need to go through every record.
+        self._keys_by_ref: Dict[str, Set[str]] = {}
+        self._keys_by_typename: Dict[str, Set[str]] = {}
+
+    def __len__(self) -> int:
+        return len(self._records)
+
+    def read(
+        self, query_requests: Sequence[GraphQLField], scope: str = ""
+    ) -> Optional[Dict[str, Any]]:
+        """Rebuild the result of a query from the cache.
+
+        Args:
+            query_requests: Root fields of the query.
+            scope: Who is making the request (ex: their auth header). Only the records fetched for the same scope are used.
+
+        Returns:
+            result: Result of the query, the same as Anilist would return it, or `None` if any of the requested fields are not cached.
+        """
+        if not is_cacheable(query_requests):
+            return None
+
+        scope_hash = get_scope_hash(scope)
+        result: Dict[str, Any] = {}
+
+        for query_request in query_requests:
+            value = self._read_root_field(query_request, scope_hash)
+
+            if value is MISSING:
+                self.stats.misses += 1
+                return None
+
+            result[get_result_key(query_request)] = value
+
+        self.stats.hits += 1
+        return result
+
+    def write(
+        self,
+        query_requests: Sequence[GraphQLField],
+        data: Dict[str, Any],
+        ttl_seconds: Optional[float] = None,
+        scope: str = "",
+        store_root_fields: bool = True,
+    ) -> None:
+        """Store the result of a query in the cache.
+
+        Args:
+            query_requests: Root fields of the query.
+            data: Result of the query.
+            ttl_seconds: Number of seconds to keep the fields for. Leave as `None` to use the default TTL.
+            scope: Who made the request (ex: their auth header). The result is only stored for that scope.
+            store_root_fields: If `False`, only the entities in the result are stored, not the result of the root fields themselves (ex: for mutations).
+        """
+        ttl_seconds = self.default_ttl_seconds if ttl_seconds is None else ttl_seconds
+
+        if ttl_seconds <= 0 or not is_cacheable(query_requests):
+            return
+
+        expires_at = monotonic() + ttl_seconds
+        scope_hash = get_scope_hash(scope)
+
+        for query_request in query_requests:
+            result_key = get_result_key(query_request)
+
+            if result_key not in data:
+                continue
+
+            value = self._normalize(
+                query_request, data[result_key], expires_at, scope_hash
+            )
+
+            if store_root_fields:
+                storage_key = get_storage_key(query_request)
+                self._write_record(
+                    f"{ROOT_QUERY}.{storage_key}",
+                    {storage_key: value},
+                    expires_at,
+                    scope_hash,
+                )
+
+    def get_entity(self, ref: str, scope: str = "") -> Optional[Dict[str, Any]]:
+        """Get the normalized fields of a cached entity.
+
+        Args:
+            ref: Type and ID of the entity, ex: `Media:1`.
+            scope: Who the entity was fetched for (ex: their auth header).
+
+        Returns:
+            fields: Fields of the entity by storage key, or `None` if it is not cached.
+        """
+        record = self._get_record(ref, get_scope_hash(scope))
+        return record.fields if record else None
+
+    def evict(self, ref: str) -> None:
+        """Remove an entity from the cache, for every user. Results that include it will no longer be answered from the cache.
+
+        Args:
+            ref: Type and ID of the entity, ex: `Media:1`.
+        """
+        for key in self._get_record_keys(ref):
+            self._remove_record(key)
+
+    def evict_fields(self, ref: str, field_names: Iterable[str]) -> None:
+        """Remove some fields of an entity from the cache, for every user and no matter what their arguments are.
+
+        Args:
+            ref: Type and ID of the entity, ex: `Media:1`.
+            field_names: Names of the fields to remove, ex: `isFavourite`.
+        """
+        field_names = set(field_names)
+
+        for key in self._get_record_keys(ref):
+            record = self._records[key]
+            record.fields = {
+                storage_key: value
+                for storage_key, value in record.fields.items()
+                if get_field_name(storage_key) not in field_names
+            }
+            self._update_typenames(key, record)
+
+    def evict_type(self, typenames: Iterable[str]) -> None:
+        """Remove every cached field that holds an object of some types (ex: all the lists of `MediaList` entries).
+        The entities of those types are kept, only the fields that contain them are removed.
+
+        Args:
+            typenames: Names of the types, ex: `MediaList`.
+        """
+        typenames = set(typenames)
+        keys = {
+            key
+            for typename in typenames
+            for key in self._keys_by_typename.get(typename, ())
+        }
+
+        for key in keys:
+            record = self._records[key]
+            record.fields = {
+                storage_key: value
+                for storage_key, value in record.fields.items()
+                if not contains_type(value, typenames)
+            }
+
+            if get_record_ref(key).startswith(ROOT_QUERY) and not record.fields:
+                self._remove_record(key)
+            else:
+                self._update_typenames(key, record)
+
+    def clear(self) -> None:
+        """Remove everything from the cache."""
+        self._records.clear()
+        self._keys_by_ref.clear()
+        self._keys_by_typename.clear()
+
+    def remove_expired(self) -> int:
+        """Remove all the expired records.
+
+        Returns:
+            count: Number of records that were removed.
+        """
+        now = monotonic()
+        expired = [
+            key for key, record in self._records.items() if record.expires_at <= now
+        ]
+
+        for key in expired:
+            self._remove_record(key)
+
+        return len(expired)
+
+    def get_missing_fields(
+        self, query_requests: Sequence[GraphQLField], scope: str = ""
+    ) -> Optional[List[GraphQLField]]:
+        """Get a smaller version of a query that only requests the fields that are not in the cache.
+        Once its result is stored with `write()`, the result of the full query can be rebuilt with `read()`.
+
+        Args:
+            query_requests: Root fields of the query.
+            scope: Who is making the request (ex: their auth header). Only the records fetched for the same scope are used.
+
+        Returns:
+            missing_requests: Copies of the root fields that still need to be requested, with the cached (sub)fields removed.
+                `None` if none of the fields are cached, in which case the full query needs to be requested.
+        """
+        if not is_cacheable(query_requests):
+            return None
+
+        scope_hash = get_scope_hash(scope)
+        missing_requests: List[GraphQLField] = []
+        pruned_any = False
+
+        for query_request in query_requests:
+            missing_request = self._get_missing_subfields(
+                query_request,
+                self._get_root_value(query_request, scope_hash),
+                scope_hash,
+            )
+
+            if missing_request is not query_request:
+                pruned_any = True
+
+            if missing_request is not None:
+                missing_requests.append(missing_request)
+
+        return missing_requests if pruned_any else None
+
+    def _get_root_value(self, query_request: GraphQLField, scope_hash: str) -> Any:
+        """Get the normalized value of a root field, or `MISSING` if it is not cached."""
+        storage_key = get_storage_key(query_request)
+        record = self._get_record(f"{ROOT_QUERY}.{storage_key}", scope_hash)
+
+        if record is not None:
+            return record.fields[storage_key]
+
+        # A lookup by ID (ex: `Media(id: 1)`) can also be answered from an entity that was cached by any other query.
+        typename = get_typename(query_request)
+
+        if (
+            typename is not None
+            and query_request._field_name in SINGLE_ENTITY_ROOT_FIELDS
+            and set(query_request._variables.keys()) == {"id"}
+        ):
+            return {
+                REFERENCE_KEY: f"{typename}:{query_request._variables['id']['value']}"
+            }
+
+        return MISSING
+
+    def _read_root_field(self, query_request: GraphQLField, scope_hash: str) -> Any:
+        """Read the cached result of a root field, or `MISSING` if it is not cached."""
+        value = self._get_root_value(query_request, scope_hash)
+
+        if value is MISSING:
+            return MISSING
+
+        return self._read_value(query_request, value, scope_hash)
+
+    def _get_missing_subfields(
+        self, field: GraphQLField, value: Any, scope_hash: str
+    ) -> Optional[GraphQLField]:
+        """Get the part of a field that is not in the cache.
+
+        Args:
+            field: Field to check.
+            value: Normalized value of the field in the cache, or `MISSING`.
+            scope_hash: Hash of who is making the request.
+
+        Returns:
+            missing_field: `None` if the whole field is cached, the field itself if none of it is cached,
+                or a copy of the field with only the subfields that are not cached.
+        """
+        if value is MISSING:
+            return field
+
+        if value is None:
+            return None
+
+        # Items of a list can have different fields cached, so lists are only either fully cached or requested again.
+        if isinstance(value, list):
+            items = [self._read_value(field, item, scope_hash) for item in value]
+            return field if any(item is MISSING for item in items) else None
+
+        if not field._subfields:
+            return None
+
+        fields: Dict[str, Any] = value
+
+        if REFERENCE_KEY in value:
+            record = self._get_record(value[REFERENCE_KEY], scope_hash)
+
+            if record is None:
+                return field
+
+            fields = record.fields
+
+        missing_subfields: List[GraphQLField] = []
+
+        for subfield in field._subfields:
+            missing_subfield = self._get_missing_subfields(
+                subfield,
+                fields.get(get_storage_key(subfield), MISSING),
+                scope_hash,
+            )
+
+            if missing_subfield is not None:
+                missing_subfields.append(missing_subfield)
+
+        if not missing_subfields:
+            return None
+
+        if len(missing_subfields) == len(field._subfields) and all(
+            missing is subfield
+            for missing, subfield in zip(missing_subfields, field._subfields)
+        ):
+            return field
+
+        # The ID is needed to merge the missing fields into the cached entity.
+        if REFERENCE_KEY in value and not any(
+            subfield._field_name == "id" and subfield._alias is None
+            for subfield in missing_subfields
+        ):
+            missing_subfields.insert(0, GraphQLField("id"))
+
+        missing_field = copy(field)
+        missing_field._subfields = missing_subfields
+
+        return missing_field
+
+    def _read_value(self, field: GraphQLField, value: Any, scope_hash: str) -> Any:
+        """Rebuild the value of a field from its normalized value, or `MISSING` if part of it is not cached."""
+        if value is None:
+            return None
+
+        if isinstance(value, list):
+            items = [self._read_value(field, item, scope_hash) for item in value]
+            return MISSING if any(item is MISSING for item in items) else items
+
+        # Scalars (including JSON scalars) are returned as they were stored.
+        if not field._subfields:
+            return deepcopy(value)
+
+        fields: Dict[str, Any] = value
+
+        if REFERENCE_KEY in value:
+            record = self._get_record(value[REFERENCE_KEY], scope_hash)
+
+            if record is None:
+                return MISSING
+
+            fields = record.fields
+
+        result: Dict[str, Any] = {}
+
+        for subfield in field._subfields:
+            storage_key = get_storage_key(subfield)
+
+            if storage_key not in fields:
+                return MISSING
+
+            subvalue = self._read_value(subfield, fields[storage_key], scope_hash)
+
+            if subvalue is MISSING:
+                return MISSING
+
+            result[get_result_key(subfield)] = subvalue
+
+        return result
+
+    def _normalize(
+        self, field: GraphQLField, value: Any, expires_at: float, scope_hash: str
+    ) -> Any:
+        """Split a value from a result into entity records, and get what to store in its place."""
+        if value is None:
+            return None
+
+        if isinstance(value, list):
+            return [
+                self._normalize(field, item, expires_at, scope_hash) for item in value
+            ]
+
+        # Copy scalars (including JSON scalars) so that changing the result doesn't change the cache.
+        if not field._subfields or not isinstance(value, dict):
+            return deepcopy(value)
+
+        fields: Dict[str, Any] = {}
+
+        for subfield in field._subfields:
+            result_key = get_result_key(subfield)
+
+            if result_key in value:
+                fields[get_storage_key(subfield)] = self._normalize(
+                    subfield, value[result_key], expires_at, scope_hash
+                )
+
+        ref = get_entity_ref(field, value)
+
+        if ref is None:
+            typename = get_typename(field)
+
+            if typename is not None:
+                fields[TYPENAME_KEY] = typename
+
+            return fields
+
+        self._write_record(ref, fields, expires_at, scope_hash)
+
+        return {REFERENCE_KEY: ref}
+
+    def _write_record(
+        self, ref: str, fields: Dict[str, Any], expires_at: float, scope_hash: str
+    ) -> None:
+        """Store fields in a record of a scope, merging them with the fields that are already cached."""
+        key = get_record_key(ref, scope_hash)
+        record = self._get_record(ref, scope_hash)
+
+        if record is None:
+            record = EntityRecord(fields, expires_at)
+            self._records[key] = record
+            self._keys_by_ref.setdefault(ref, set()).add(key)
+        else:
+            record.fields = merge_values(record.fields, fields)
+            # The record is only as fresh as its oldest field.
+            record.expires_at = min(record.expires_at, expires_at)
+
+        self._update_typenames(key, record)
+        self._records.move_to_end(key)
+
+        while len(self._records) > self.max_records:
+            self._remove_record(next(iter(self._records)))
+            self.stats.evictions += 1
+
+    def _get_record(self, ref: str, scope_hash: str) -> Optional[EntityRecord]:
+        """Get the record of a scope if it is cached and has not expired."""
+        key = get_record_key(ref, scope_hash)
+        record = self._records.get(key)
+
+        if record is None:
+            return None
+
+        if record.expires_at <= monotonic():
+            self._remove_record(key)
+            return None
+
+        self._records.move_to_end(key)
+        return record
+
+    def _get_record_keys(self, ref: str) -> List[str]:
+        """Get the keys of the records of an entity in every scope."""
+        return list(self._keys_by_ref.get(ref, ()))
+
+    def _update_typenames(self, key: str, record: EntityRecord) -> None:
+        """Update the types held by a record after its fields changed, and the index of the records by type."""
+        typenames = get_typenames(record.fields)
+
+        for typename in record.typenames - typenames:
+            remove_from_index(self._keys_by_typename, typename, key)
+
+        for typename in typenames - record.typenames:
+            self._keys_by_typename.setdefault(typename, set()).add(key)
+
+        record.typenames = typenames
+
+    def _remove_record(self, key: str) -> None:
+        """Remove a record and its entries in the indexes."""
+        record = self._records.pop(key)
+        remove_from_index(self._keys_by_ref, get_record_ref(key), key)
+
+        for typename in record.typenames:
+            remove_from_index(self._keys_by_typename, typename, key)
+
+
+def is_cacheable(query_requests: Sequence[GraphQLField]) -> bool:
+    """Check if a query can be stored in the entity cache (it has no inline fragments)."""
+    return all(
+        not query_request._inline_fragments and is_cacheable(query_request._subfields)
+        for query_request in query_requests
+    )
+
+
+def get_result_key(field: GraphQLField) -> str:
+    """Get the key of a field in the result, which is its alias if it has one."""
+    return field._alias or field._field_name
+
+
+def get_storage_key(field: GraphQLField) -> str:
+    """Get the key a field is stored under in a record, which depends on its name and arguments but not its alias.
+
+    Args:
+        field: Field to get the key for.
+
+    Returns:
+        storage_key: Key of the field, ex: `description({"asHtml": true})`.
+    """
+    storage_key = field._field_name
+
+    if field._variables:
+        arguments = {
+            name: variable["value"] for name, variable in field._variables.items()
+        }
+        storage_key += (
+            f"({json.dumps(arguments, sort_keys=True, default=to_jsonable_python)})"
+        )
+
+    return storage_key
+
+
+def get_field_name(storage_key: str) -> str:
+    """Get the name of a field from its storage key, ex: `description` for `description({"asHtml": true})`."""
+    return storage_key.split("(", 1)[0]
+
+
+def get_record_key(ref: str, scope_hash: str) -> str:
+    """Get the key of the record of an entity (or root query field) in a scope, ex: `3f2a…/Media:1`.
+
+    Args:
+        ref: Type and ID of the entity (ex: `Media:1`), or the key of a root query field.
+        scope_hash: Hash of who the record was fetched for (see `get_scope_hash()`).
+
+    Returns:
+        key: Key of the record.
+    """
+    return f"{scope_hash}{RECORD_KEY_SEPARATOR}{ref}"
+
+
+def get_record_ref(key: str) -> str:
+    """Get the reference of the entity (or the root query field) of a record from its key, ex: `Media:1` for `3f2a…/Media:1`."""
+    return key.split(RECORD_KEY_SEPARATOR, 1)[1]
+
+
+def contains_type(value: Any, typenames: Set[str]) -> bool:
+    """Check if a normalized value holds (or points to) an object of some types. Entity references are not followed."""
+    if isinstance(value, list):
+        return any(contains_type(item, typenames) for item in value)
+
+    if not isinstance(value, dict):
+        return False
+
+    if REFERENCE_KEY in value:
+        return value[REFERENCE_KEY].split(":", 1)[0] in typenames
+
+    if value.get(TYPENAME_KEY) in typenames:
+        return True
+
+    return any(contains_type(item, typenames) for item in value.values())
+
+
+def remove_from_index(index: Dict[str, Set[str]], name: str, key: str) -> None:
+    """Remove a record key from an index of the records (ex: by type), and the name from the index if no records are left for it."""
+    keys = index[name]
+    keys.discard(key)
+
+    if not keys:
+        del index[name]
+
+
+def get_typenames(value: Any) -> Set[str]:
+    """Get the types of the objects that a normalized value holds (or points to). Entity references are not followed."""
+    if isinstance(value, list):
+        return {typename for item in value for typename in get_typenames(item)}
+
+    if not isinstance(value, dict):
+        return set()
+
+    if REFERENCE_KEY in value:
+        return {value[REFERENCE_KEY].split(":", 1)[0]}
+
+    typenames = {value[TYPENAME_KEY]} if TYPENAME_KEY in value else set()
+
+    for item in value.values():
+        typenames.update(get_typenames(item))
+
+    return typenames
+
+
+def get_result_tags(
+    query_requests: Sequence[GraphQLField], data: Dict[str, Any]
+) -> Set[str]:
+    """Get the entities (ex: `Media:1`) and types (ex: `Media`) of all the objects in a query result, so that the result can be invalidated when one of them changes.
+
+    Args:
+        query_requests: Root fields of the query.
+        data: Result of the query.
+
+    Returns:
+        tags: References of the entities and names of the types in the result.
+    """
+    tags: Set[str] = set()
+
+    def add_tags(field: GraphQLField, value: Any) -> None:
+        if isinstance(value, list):
+            for item in value:
+                add_tags(field, item)
+            return
+
+        if not field._subfields or not isinstance(value, dict):
+            return
+
+        typename = get_typename(field)
+        ref = get_entity_ref(field, value)
+
+        if typename is not None:
+            tags.add(typename)
+
+        if ref is not None:
+            tags.add(ref)
+
+        for subfield in field._subfields:
+            add_tags(subfield, value.get(get_result_key(subfield)))
+
+    for query_request in query_requests:
+        add_tags(query_request, data.get(get_result_key(query_request)))
+
+    return tags
+
+
+def get_typename(field: GraphQLField) -> Optional[str]:
+    """Get the GraphQL type of a field from its class, ex: `Media` for `MediaFields`."""
+    class_name = type(field).__name__
+
+    if class_name.endswith("Fields"):
+        return class_name.removesuffix("Fields")
+
+    return None
+
+
+def get_entity_ref(field: GraphQLField, value: Dict[str, Any]) -> Optional[str]:
+    """Get the reference of the entity in a result (ex: `Media:1`), or `None` if it can't be identified."""
+    typename = get_typename(field)
+    requested_id = any(
+        subfield._field_name == "id" and subfield._alias is None
+        for subfield in field._subfields
+    )
+
+    if typename is None or not requested_id or value.get("id") is None:
+        return None
+
+    return f"{typename}:{value['id']}"
+
+
+def get_scope_hash(scope: str) -> str:
+    """Get a short hash of who is making a request, so that their credentials are not kept in the cache keys."""
+    return sha256(scope.encode()).hexdigest()[:16] if scope else ""
+
+
+def merge_values(old_value: Any, new_value: Any) -> Any:
+    """Merge two normalized values, with the new one taking priority.
+    Objects (that are not entity references) are merged field by field, anything else is replaced.
+    """
+    if (
+        isinstance(old_value, dict)
+        and isinstance(new_value, dict)
+        and REFERENCE_KEY not in old_value
+        and REFERENCE_KEY not in new_value
+    ):
+        merged = dict(old_value)
+
+        for key, value in new_value.items():
+            merged[key] = merge_values(old_value.get(key), value)
+
+        return merged
+
+    return new_value
+
+
+def create_entity_cache() -> Optional[EntityCache]:
+    """Create the entity cache if it is turned on in the settings, otherwise `None`."""
+    if not anilist_settings.entity_cache_enabled:
+        return None
+
+    return EntityCache(
+        max_records=anilist_settings.entity_cache_max_records,
+        default_ttl_seconds=anilist_settings.response_cache_ttl_seconds,
+    )
+
+
+ENTITY_CACHE = create_entity_cache()
+"""Global entity cache shared by all clients, if it is turned on in the settings."""
@@ -0,0 +1,100 @@
+import asyncio
+from typing import Callable, Optional
+from weakref import WeakKeyDictionary
+
+import httpx
+
+from nifty_anilist.settings import anilist_settings
+from nifty_anilist.utils.json_utils import close_decode_process_pool
+
+
+def create_pooled_transport() -> httpx.AsyncHTTPTransport:
+    """Create a transport with a connection pool, using the HTTP settings (see `ANILIST_HTTP_MAX_CONNECTIONS`, etc)."""
+    if anilist_settings.http2_enabled:
+        # httpx only needs "h2" once a connection is made, so check for it right away instead.
+        try:
+            import h2  # noqa: F401
+        except ImportError as e:
+            raise ImportError(
+                "HTTP/2 requires the 'h2' package. Install it with `pip install nifty_anilist[http2]`, or turn off `ANILIST_HTTP2_ENABLED`."
+            ) from e
+
+    return httpx.AsyncHTTPTransport(
+        limits=httpx.Limits(
+            max_connections=anilist_settings.http_max_connections,
+            max_keepalive_connections=anilist_settings.http_max_keepalive_connections,
+            keepalive_expiry=anilist_settings.http_keepalive_expiry_seconds,
+        ),
+        http2=anilist_settings.http2_enabled,
+    )
+
+
+def get_request_timeout() -> httpx.Timeout:
+    """Get the timeouts for requests to Anilist, from the settings."""
+    return httpx.Timeout(
+        anilist_settings.request_timeout_seconds,
+        connect=anilist_settings.http_connect_timeout_seconds,
+        pool=anilist_settings.http_pool_timeout_seconds,
+    )
+
+
+class SharedTransport(httpx.AsyncBaseTransport):
+    """Transport that sends the requests of many HTTP clients through the same connection pool, so that they reuse each other's open connections.
+    Connections can't be used across event loops, so there is one pool for each event loop.
+    Closing a client that uses this transport doesn't close the pool (see `close()`).
+    """
+
+    def __init__(
+        self,
+        create_transport: Callable[
+            [], httpx.AsyncBaseTransport
+        ] = create_pooled_transport,
+    ) -> None:
+        """Create a shared transport.
+
+        Args:
+            create_transport: Creates the transport (with its connection pool) for each event loop.
+        """
+        self._create_transport = create_transport
+        self._transports: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, httpx.AsyncBaseTransport
+        ] = WeakKeyDictionary()
+
+    def get_transport(self) -> httpx.AsyncBaseTransport:
+        """Get the transport for the running event loop, creating it if needed."""
+        loop = asyncio.get_running_loop()
+        transport = self._transports.get(loop)
+
+        if transport is None:
+            transport = self._create_transport()
+            self._transports[loop] = transport
+
+        return transport
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        return await self.get_transport().handle_async_request(request)
+
+    async def aclose(self) -> None:
+        # Other clients might still be using the pool.
+        pass
+
+    async def close(self) -> None:
+        """Close the connection pool of the running event loop. A new one is created if more requests are made."""
+        transport: Optional[httpx.AsyncBaseTransport] = self._transports.pop(
+            asyncio.get_running_loop(), None
+        )
+
+        if transport is not None:
+            await transport.aclose()
+
+
+SHARED_TRANSPORT = SharedTransport()
+"""Transport shared by all Anilist clients (unless `ANILIST_HTTP_SHARE_CONNECTION_POOL` is turned off)."""
+
+
+async def close_connection_pool() -> None:
+    """Close the connections shared by all Anilist clients in the running event loop (ex: when shutting down a service).
+    This also stops the processes used to decode very large responses (see `ANILIST_JSON_DECODE_PROCESS_THRESHOLD_BYTES`).
+    """
+    await SHARED_TRANSPORT.close()
+    await asyncio.to_thread(close_decode_process_pool)
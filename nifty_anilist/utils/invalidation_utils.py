@@ -0,0 +1,184 @@
+from typing import Any, Dict, Optional, Sequence, Set, Tuple
+
+from nifty_anilist.client.custom_typing_fields import GraphQLField
+from nifty_anilist.logging import anilist_logger as logger
+from nifty_anilist.utils.cache_utils import ResponseCache
+from nifty_anilist.utils.entity_cache_utils import (
+    EntityCache,
+    get_result_key,
+    get_result_tags,
+    VIEWER_FIELDS,
+)
+
+
+DELETED_ENTITY_TYPES: Dict[str, Tuple[str, ...]] = {
+    "DeleteMediaListEntry": ("MediaList",),
+    "DeleteActivity": ("TextActivity", "ListActivity", "MessageActivity"),
+    "DeleteActivityReply": ("ActivityReply",),
+    "DeleteReview": ("Review",),
+    "DeleteThread": ("Thread",),
+    "DeleteThreadComment": ("ThreadComment",),
+}
+"""Types of the entity removed by each delete mutation. The ID of the entity is the `id` argument of the mutation."""
+
+LIKEABLE_ENTITY_TYPES: Dict[str, Tuple[str, ...]] = {
+    "THREAD": ("Thread",),
+    "THREAD_COMMENT": ("ThreadComment",),
+    "ACTIVITY": ("TextActivity", "ListActivity", "MessageActivity"),
+    "ACTIVITY_REPLY": ("ActivityReply",),
+}
+"""Types of the entity liked by `ToggleLike`/`ToggleLikeV2`, for each value of their `type` argument."""
+
+ARGUMENT_ENTITY_TYPES: Dict[str, str] = {
+    "mediaId": "Media",
+    "animeId": "Media",
+    "mangaId": "Media",
+    "characterId": "Character",
+    "staffId": "Staff",
+    "studioId": "Studio",
+    "userId": "User",
+}
+"""Mutation arguments that point to another entity, whose fields that depend on the viewer (ex: `mediaListEntry`, `isFavourite`) might have changed."""
+
+CHANGED_TYPES: Dict[str, Tuple[str, ...]] = {
+    "DeleteMediaListEntry": ("MediaList",),
+    "DeleteCustomList": ("MediaList", "MediaListGroup"),
+    "ToggleFavourite": ("Favourites",),
+    "UpdateFavouriteOrder": ("Favourites",),
+}
+"""Types whose lists might change after each mutation (ex: a user's list of favourites)."""
+
+LIST_MEMBERSHIP_ARGUMENTS = {"status", "hiddenFromStatusLists", "customLists"}
+"""Arguments of the media list mutations that can move an entry to another list."""
+
+
+class CacheInvalidation:
+    """What needs to be removed from the caches after a mutation."""
+
+    refs: Set[str]
+    """Entities that were changed or deleted (ex: `MediaList:1`). They need to be removed from the entity cache, along with the cached results that include them."""
+    viewer_field_refs: Set[str]
+    """Entities whose fields that depend on the viewer (ex: `isFavourite`) might have changed."""
+    typenames: Set[str]
+    """Types whose lists might have changed (ex: `MediaList` when an entry is added). Cached fields that hold them need to be removed."""
+
+    def __init__(self) -> None:
+        self.refs = set()
+        self.viewer_field_refs = set()
+        self.typenames = set()
+
+    @property
+    def tags(self) -> Set[str]:
+        """Tags of the cached results that need to be removed (see `ResponseCache.invalidate_tags()`)."""
+        return self.refs | self.viewer_field_refs | self.typenames
+
+
+def get_mutation_invalidation(
+    mutation_requests: Sequence[GraphQLField], data: Dict[str, Any]
+) -> CacheInvalidation:
+    """Find out what a mutation changed, from its return type, its arguments and its result.
+
+    Args:
+        mutation_requests: Root fields of the mutation.
+        data: Result of the mutation.
+
+    Returns:
+        invalidation: Entities and types that need to be removed from the caches.
+    """
+    invalidation = CacheInvalidation()
+
+    for mutation_request in mutation_requests:
+        field_name = mutation_request._field_name
+        arguments = {
+            name: variable["value"]
+            for name, variable in mutation_request._variables.items()
+        }
+
+        # Entities returned by the mutation were changed by it (ex: the saved media list entry).
+        invalidation.refs.update(
+            tag
+            for tag in get_result_tags(
+                [mutation_request],
+                {
+                    get_result_key(mutation_request): data.get(
+                        get_result_key(mutation_request)
+                    )
+                },
+            )
+            if ":" in tag
+        )
+
+        entity_id = arguments.get("id")
+
+        if field_name in DELETED_ENTITY_TYPES and entity_id is not None:
+            invalidation.refs.update(
+                f"{typename}:{entity_id}"
+                for typename in DELETED_ENTITY_TYPES[field_name]
+            )
+
+        if field_name in ("ToggleLike", "ToggleLikeV2") and entity_id is not None:
+            # The type is a "LikeableType" enum, or its name if the variables came from elsewhere.
+            like_type = str(
+                getattr(arguments.get("type"), "value", arguments.get("type"))
+            )
+            invalidation.refs.update(
+                f"{typename}:{entity_id}"
+                for typename in LIKEABLE_ENTITY_TYPES.get(like_type, ())
+            )
+
+        for argument_name, typename in ARGUMENT_ENTITY_TYPES.items():
+            if arguments.get(argument_name) is not None:
+                invalidation.viewer_field_refs.add(
+                    f"{typename}:{arguments[argument_name]}"
+                )
+
+        invalidation.typenames.update(CHANGED_TYPES.get(field_name, ()))
+
+        # A new entry, or one that changed status, is added to (or moved between) lists.
+        if field_name in ("SaveMediaListEntry", "UpdateMediaListEntries") and (
+            entity_id is None
+            and "ids" not in arguments
+            or LIST_MEMBERSHIP_ARGUMENTS & arguments.keys()
+        ):
+            invalidation.typenames.update(("MediaList", "MediaListGroup"))
+
+    return invalidation
+
+
+async def update_caches_after_mutation(
+    mutation_requests: Sequence[GraphQLField],
+    data: Dict[str, Any],
+    response_cache: Optional[ResponseCache],
+    entity_cache: Optional[EntityCache],
+    scope: str = "",
+) -> None:
+    """Remove what a mutation changed from the caches, and update the changed entities with the fields returned by the mutation.
+
+    Args:
+        mutation_requests: Root fields of the mutation.
+        data: Result of the mutation.
+        response_cache: Response cache to remove the changed results from, if any.
+        entity_cache: Entity cache to update, if any.
+        scope: Who made the mutation (ex: their auth header).
+    """
+    invalidation = get_mutation_invalidation(mutation_requests, data)
+
+    if response_cache is not None:
+        removed_keys = await response_cache.invalidate_tags_async(invalidation.tags)
+        logger.debug(f"Removed {len(removed_keys)} cached result(s) after mutation.")
+
+    if entity_cache is not None:
+        # Other users keep their own copies of the changed entities, which would otherwise stay outdated.
+        for ref in invalidation.refs:
+            entity_cache.evict(ref)
+
+        for ref in invalidation.viewer_field_refs:
+            entity_cache.evict_fields(ref, VIEWER_FIELDS)
+
+        if invalidation.typenames:
+            entity_cache.evict_type(invalidation.typenames)
+
+        # Store the changed entities again for the user who made the mutation, so they don't need to be requested again.
+        entity_cache.write(
+            mutation_requests, data, scope=scope, store_root_fields=False
+        )
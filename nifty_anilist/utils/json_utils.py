@@ -0,0 +1,228 @@
+import asyncio
+import json
+import multiprocessing
+from abc import ABC, abstractmethod
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Optional, Tuple, Union
+
+from pydantic_core import to_jsonable_python
+
+from nifty_anilist.settings import JsonCodecType
+
+try:
+    import orjson
+except ImportError:
+    orjson = None  # type: ignore[assignment]
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None  # type: ignore[assignment]
+
+
+_decode_process_pool: Optional[ProcessPoolExecutor] = None
+"""Processes that decode very large responses, created the first time one is needed."""
+
+
+def get_decode_process_pool() -> ProcessPoolExecutor:
+    """Get the process pool that decodes very large responses."""
+    global _decode_process_pool
+
+    if _decode_process_pool is None:
+        # Forking a process that has an event loop and open connections running in other threads can deadlock, so the workers are started from a clean process instead.
+        start_method = (
+            "forkserver"
+            if "forkserver" in multiprocessing.get_all_start_methods()
+            else "spawn"
+        )
+        _decode_process_pool = ProcessPoolExecutor(
+            mp_context=multiprocessing.get_context(start_method)
+        )
+
+    return _decode_process_pool
+
+
+def close_decode_process_pool() -> None:
+    """Stop the processes that decode very large responses, if they were started. New ones are started if they are needed again."""
+    global _decode_process_pool
+
+    if _decode_process_pool is not None:
+        _decode_process_pool.shutdown()
+        _decode_process_pool = None
+
+
+class JsonCodec(ABC):
+    """Encodes request bodies to JSON and decodes response bodies from it."""
+
+    name: str
+    """Name of the JSON library used by the codec."""
+    thread_threshold_bytes: Optional[int]
+    """Responses at least this big are decoded in a worker thread by `decode_async()`, or `None` to never use a thread."""
+    process_threshold_bytes: Optional[int]
+    """Responses at least this big are decoded in another process by `decode_async()`, or `None` to never use a process."""
+
+    def __init__(
+        self,
+        thread_threshold_bytes: Optional[int] = None,
+        process_threshold_bytes: Optional[int] = None,
+    ) -> None:
+        self.thread_threshold_bytes = thread_threshold_bytes
+        self.process_threshold_bytes = process_threshold_bytes
+
+    @abstractmethod
+    def encode(self, value: Any) -> bytes:
+        """Encode a value to JSON.
+        Enums, pydantic models and anything else supported by `pydantic_core.to_jsonable_python()` can be encoded.
+
+        Args:
+            value: Value to encode.
+
+        Returns:
+            content: UTF-8 encoded JSON.
+        """
+
+    @abstractmethod
+    def decode(self, content: Union[bytes, str]) -> Any:
+        """Decode JSON.
+
+        Args:
+            content: JSON to decode.
+
+        Returns:
+            value: Decoded value.
+
+        Raises:
+            ValueError: If the content isn't valid JSON.
+        """
+
+    async def decode_async(self, content: bytes) -> Any:
+        """Decode JSON without blocking the event loop for too long. Large content is decoded in a worker thread, and very large content in another process.
+        See `decode()` for the arguments.
+        """
+        size = len(content)
+
+        if (
+            self.process_threshold_bytes is not None
+            and size >= self.process_threshold_bytes
+        ):
+            return await asyncio.get_running_loop().run_in_executor(
+                get_decode_process_pool(), self.decode, content
+            )
+
+        if (
+            self.thread_threshold_bytes is not None
+            and size >= self.thread_threshold_bytes
+        ):
+            return await asyncio.to_thread(self.decode, content)
+
+        return self.decode(content)
+
+
+class StdlibJsonCodec(JsonCodec):
+    """JSON codec using Python's built-in `json` module."""
+
+    name = "json"
+
+    def encode(self, value: Any) -> bytes:
+        return json.dumps(value, default=to_jsonable_python).encode()
+
+    def decode(self, content: Union[bytes, str]) -> Any:
+        return json.loads(content)
+
+
+class OrjsonCodec(JsonCodec):
+    """JSON codec using `orjson`. Requires the `orjson` extra."""
+
+    name = "orjson"
+
+    def __init__(
+        self,
+        thread_threshold_bytes: Optional[int] = None,
+        process_threshold_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__(thread_threshold_bytes, process_threshold_bytes)
+
+        if orjson is None:
+            raise ImportError(
+                "The orjson JSON codec requires the 'orjson' package. Install it with `pip install nifty_anilist[orjson]`."
+            )
+
+    def encode(self, value: Any) -> bytes:
+        return orjson.dumps(
+            value, default=to_jsonable_python, option=orjson.OPT_NON_STR_KEYS
+        )
+
+    def decode(self, content: Union[bytes, str]) -> Any:
+        # "orjson.JSONDecodeError" is already a "ValueError".
+        return orjson.loads(content)
+
+
+class MsgspecCodec(JsonCodec):
+    """JSON codec using `msgspec`. Requires the `msgspec` extra."""
+
+    name = "msgspec"
+
+    def __init__(
+        self,
+        thread_threshold_bytes: Optional[int] = None,
+        process_threshold_bytes: Optional[int] = None,
+    ) -> None:
+        super().__init__(thread_threshold_bytes, process_threshold_bytes)
+
+        if msgspec is None:
+            raise ImportError(
+                "The msgspec JSON codec requires the 'msgspec' package. Install it with `pip install nifty_anilist[msgspec]`."
+            )
+
+        self._encoder = msgspec.json.Encoder(enc_hook=to_jsonable_python)
+        self._decoder = msgspec.json.Decoder()
+
+    def __reduce__(self) -> Tuple[type, Tuple[Optional[int], Optional[int]]]:
+        # Sent to another process to decode a response there, without its encoder and decoder.
+        return (
+            MsgspecCodec,
+            (self.thread_threshold_bytes, self.process_threshold_bytes),
+        )
+
+    def encode(self, value: Any) -> bytes:
+        return self._encoder.encode(value)
+
+    def decode(self, content: Union[bytes, str]) -> Any:
+        try:
+            return self._decoder.decode(content)
+        except msgspec.DecodeError as e:
+            raise ValueError(str(e)) from e
+
+
+def create_json_codec(
+    codec_type: JsonCodecType = JsonCodecType.AUTO,
+    thread_threshold_bytes: Optional[int] = None,
+    process_threshold_bytes: Optional[int] = None,
+) -> JsonCodec:
+    """Create a JSON codec.
+
+    Args:
+        codec_type: JSON library to use. With `JsonCodecType.AUTO`, the fastest one that is installed is used (orjson, then msgspec, then the built-in `json` module).
+        thread_threshold_bytes: Size from which responses are decoded in a worker thread, or `None` to never use a thread.
+        process_threshold_bytes: Size from which responses are decoded in another process, or `None` to never use a process.
+
+    Returns:
+        codec: JSON codec using that library.
+    """
+    thresholds = (thread_threshold_bytes, process_threshold_bytes)
+
+    match codec_type:
+        case JsonCodecType.AUTO:
+            if orjson is not None:
+                return OrjsonCodec(*thresholds)
+            if msgspec is not None:
+                return MsgspecCodec(*thresholds)
+            return StdlibJsonCodec(*thresholds)
+        case JsonCodecType.ORJSON:
+            return OrjsonCodec(*thresholds)
+        case JsonCodecType.MSGSPEC:
+            return MsgspecCodec(*thresholds)
+        case JsonCodecType.STDLIB:
+            return StdlibJsonCodec(*thresholds)
+        case _:
+            raise ValueError("Unknown JSON codec.")
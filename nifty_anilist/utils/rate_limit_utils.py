@@ -0,0 +1,262 @@
+import os
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import deque
+from contextlib import contextmanager
+from enum import IntEnum
+from time import monotonic, time
+from typing import Iterator, Optional
+
+from nifty_anilist.settings import anilist_settings, RateLimiterBackendType
+
+
+class RequestPriority(IntEnum):
+    """Enum for the priority of a request when waiting for the rate limiter. Higher priority requests are sent first."""
+
+    LOW = 0
+    """For bulk/background requests (ex: crawling a whole catalog), which only use the capacity left over by other requests."""
+    NORMAL = 1
+    HIGH = 2
+    """For requests that someone is waiting on (ex: user-facing lookups)."""
+
+
+class RateLimiterBackend(ABC):
+    """Storage for the requests recorded by the rate limiter, and for when requests are paused until.
+    Each method must check and update the storage in one step, so that two callers can never take the same slot.
+    """
+
+    period_seconds: float
+    """Length of the sliding window, in seconds."""
+    blocking: bool = False
+    """Whether the methods can block for a while (ex: waiting for another process to unlock the storage).
+    The rate limiter then calls them in a worker thread, so that the event loop isn't blocked."""
+
+    def __init__(self, period_seconds: float = 60) -> None:
+        self.period_seconds = period_seconds
+
+    @abstractmethod
+    def try_record_request(self, max_requests: Optional[int]) -> float:
+        """Record a request if it can be made without going over the limit.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Set to `None` for no limit.
+
+        Returns:
+            delay: `0` if the request was recorded, otherwise the number of seconds until a slot frees up.
+        """
+
+    @abstractmethod
+    def get_delay(self, max_requests: Optional[int]) -> float:
+        """Get the number of seconds to wait before a request can be made, without recording anything.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Set to `None` for no limit.
+
+        Returns:
+            delay: Number of seconds until a slot frees up, or `0` if one is already free.
+        """
+
+    @abstractmethod
+    def get_request_count(self) -> int:
+        """Get the number of requests made in the current window."""
+
+    @abstractmethod
+    def pause(self, seconds: float) -> None:
+        """Stop all requests from being made for some time. If requests are already paused for longer, this does nothing.
+
+        Args:
+            seconds: Number of seconds to pause for.
+        """
+
+    @abstractmethod
+    def get_pause_delay(self) -> float:
+        """Get the number of seconds until requests are no longer paused, or `0` if they are not paused."""
+
+    @abstractmethod
+    def reset(self) -> None:
+        """Forget all the recorded requests and pauses."""
+
+
+class MemoryRateLimiterBackend(RateLimiterBackend):
+    """Keeps the recorded requests in memory. Only limits the requests made by the current process."""
+
+    def __init__(self, period_seconds: float = 60) -> None:
+        super().__init__(period_seconds)
+        self._requests: deque[float] = deque()
+        self._paused_until: float = 0
+
+    def try_record_request(self, max_requests: Optional[int]) -> float:
+        now = monotonic()
+        delay = self._get_delay(max_requests, now)
+
+        if delay <= 0:
+            self._requests.append(now)
+
+        return delay
+
+    def get_delay(self, max_requests: Optional[int]) -> float:
+        return self._get_delay(max_requests, monotonic())
+
+    def get_request_count(self) -> int:
+        self._remove_expired_requests(monotonic())
+        return len(self._requests)
+
+    def pause(self, seconds: float) -> None:
+        self._paused_until = max(self._paused_until, monotonic() + seconds)
+
+    def get_pause_delay(self) -> float:
+        return max(self._paused_until - monotonic(), 0)
+
+    def reset(self) -> None:
+        self._requests.clear()
+        self._paused_until = 0
+
+    def _get_delay(self, max_requests: Optional[int], now: float) -> float:
+        self._remove_expired_requests(now)
+
+        if not max_requests or len(self._requests) < max_requests:
+            return 0
+
+        # The slot frees up when the request that is "max_requests" from the end leaves the window.
+        return self._requests[-max_requests] + self.period_seconds - now
+
+    def _remove_expired_requests(self, now: float) -> None:
+        """Remove requests that are no longer in the window."""
+        while self._requests and now - self._requests[0] >= self.period_seconds:
+            self._requests.popleft()
+
+
+class SQLiteRateLimiterBackend(RateLimiterBackend):
+    """Keeps the recorded requests in a local SQLite database.
+    Every process using the same database file shares the same limit, ex: the workers of a web server on the same machine.
+    """
+
+    blocking = True
+
+    path: str
+    """Path to the SQLite database file."""
+
+    def __init__(self, path: str, period_seconds: float = 60) -> None:
+        super().__init__(period_seconds)
+        self.path = path
+        self._connection: Optional[sqlite3.Connection] = None
+        self._connection_pid: Optional[int] = None
+        # The connection is used from worker threads, but only by one at a time.
+        self._lock = threading.Lock()
+
+    def try_record_request(self, max_requests: Optional[int]) -> float:
+        with self._transaction() as connection:
+            now = time()
+            delay = self._get_delay(connection, max_requests, now)
+
+            if delay <= 0:
+                connection.execute(
+                    "INSERT INTO requests (timestamp) VALUES (?)", (now,)
+                )
+
+            return delay
+
+    def get_delay(self, max_requests: Optional[int]) -> float:
+        with self._transaction() as connection:
+            return self._get_delay(connection, max_requests, time())
+
+    def get_request_count(self) -> int:
+        with self._transaction() as connection:
+            self._remove_expired_requests(connection, time())
+            return connection.execute("SELECT COUNT(*) FROM requests").fetchone()[0]
+
+    def pause(self, seconds: float) -> None:
+        with self._transaction() as connection:
+            connection.execute(
+                "INSERT INTO state (key, value) VALUES ('paused_until', ?) "
+                "ON CONFLICT (key) DO UPDATE SET value = MAX(value, excluded.value)",
+                (time() + seconds,),
+            )
+
+    def get_pause_delay(self) -> float:
+        with self._transaction() as connection:
+            row = connection.execute(
+                "SELECT value FROM state WHERE key = 'paused_until'"
+            ).fetchone()
+
+        return max(row[0] - time(), 0) if row else 0
+
+    def reset(self) -> None:
+        with self._transaction() as connection:
+            connection.execute("DELETE FROM requests")
+            connection.execute("DELETE FROM state")
+
+    def _get_delay(
+        self, connection: sqlite3.Connection, max_requests: Optional[int], now: float
+    ) -> float:
+        self._remove_expired_requests(connection, now)
+
+        if not max_requests:
+            return 0
+
+        # The slot frees up when the request that is "max_requests" from the end leaves the window.
+        row = connection.execute(
+            "SELECT timestamp FROM requests ORDER BY timestamp DESC LIMIT 1 OFFSET ?",
+            (max_requests - 1,),
+        ).fetchone()
+
+        return row[0] + self.period_seconds - now if row else 0
+
+    def _remove_expired_requests(
+        self, connection: sqlite3.Connection, now: float
+    ) -> None:
+        """Remove requests that are no longer in the window."""
+        connection.execute(
+            "DELETE FROM requests WHERE timestamp <= ?", (now - self.period_seconds,)
+        )
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        """Run a transaction on the database, which is committed (or rolled back on errors) at the end.
+        The transaction locks the database for writing right away, so other processes wait for it to finish.
+        """
+        with self._lock:
+            connection = self._get_connection()
+            connection.execute("BEGIN IMMEDIATE")
+
+            with connection:
+                yield connection
+
+    def _get_connection(self) -> sqlite3.Connection:
+        """Get the connection to the database, creating it (and the tables) if needed.
+        SQLite connections can't be shared with forked processes, so each process gets its own.
+        """
+        if self._connection is None or self._connection_pid != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            # "isolation_level=None" lets us start the transactions ourselves, and the connection context manager still commits/rolls back.
+            connection = sqlite3.connect(
+                self.path, timeout=30, isolation_level=None, check_same_thread=False
+            )
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS requests (timestamp REAL NOT NULL)"
+            )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS requests_timestamp ON requests (timestamp)"
+            )
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS state (key TEXT PRIMARY KEY, value REAL NOT NULL)"
+            )
+
+            self._connection = connection
+            self._connection_pid = os.getpid()
+
+        return self._connection
+
+
+def create_rate_limiter_backend() -> RateLimiterBackend:
+    """Create the rate limiter backend that was chosen in the settings."""
+    match anilist_settings.rate_limiter_backend:
+        case RateLimiterBackendType.MEMORY:
+            return MemoryRateLimiterBackend()
+        case RateLimiterBackendType.SQLITE:
+            return SQLiteRateLimiterBackend(anilist_settings.rate_limiter_sqlite_path)
+        case _:
+            raise ValueError("Unknown rate limiter backend.")
@@ -1,28 +1,58 @@
 import asyncio
-from collections import deque
+import json
+import random
+from hashlib import sha256
 from http import HTTPStatus
-from time import time
-from typing import Any, Awaitable, Callable, Coroutine, Dict, Optional, Union
+from itertools import count
+from time import monotonic, time
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Coroutine,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Tuple,
+    TypeVar,
+    Union,
+)
+
+import httpx
+
+from pydantic_core import to_jsonable_python
+
+from nifty_anilist.client.exceptions import (
+    GraphQLClientGraphQLMultiError,
+    GraphQLClientHttpError,
+)
 
-from nifty_anilist.client.exceptions import GraphQLClientHttpError
 from nifty_anilist.logging import anilist_logger as logger
 
 from nifty_anilist.settings import anilist_settings
+from nifty_anilist.utils.rate_limit_utils import (
+    create_rate_limiter_backend,
+    MemoryRateLimiterBackend,
+    RateLimiterBackend,
+    RequestPriority,
+)
 
-
-class RateLimitException(Exception):
-    """Custom error to be thrown when we hit our internal rate limit."""
-
-    pass
+T = TypeVar("T")
 
 
 async def run_request_with_retry(
     api_request_function: Callable[[], Awaitable],
+    priority: RequestPriority = RequestPriority.NORMAL,
+    deadline_seconds: Optional[float] = None,
 ) -> Dict[str, Any]:
     """Function for running an async Anilist API request and retrying if a rate limit error happens.
 
     Args:
         api_request_function: Anilist API request function that returns the API result.
+        priority: Priority of the request when waiting for the rate limiter.
+        deadline_seconds: Max number of seconds to wait for the rate limiter (including retries) before giving up with a `TimeoutError`.
+            Leave as `None` to wait as long as needed.
 
     Returns:
         response: Response from the Anilist API.
@@ -30,51 +60,45 @@ async def run_request_with_retry(
     max_attempts: Optional[int] = anilist_settings.rate_limit_max_retries
     initial_delay: Optional[int] = anilist_settings.rate_limit_retry_initial_delay
     max_requests_per_minute: Optional[int] = anilist_settings.max_requests_per_minute
+    deadline = None if deadline_seconds is None else monotonic() + deadline_seconds
 
     for attempt in attempt_iterator(max_attempts):
         try:
-            # If we are manually tracking requests and reach the max requests per minute, throw "RateLimitException".
-            # The sleep_for_rate_limit() function will know what to do with it.
-            if max_requests_per_minute:
-                # Check how many requests were made in the last minute.
-                request_count = get_request_count_last_minute()
-
-                if request_count >= max_requests_per_minute:
-                    raise RateLimitException()
+            # Wait until there is room for another request in the last minute (if we are tracking requests manually or with the rate limit headers from Anilist).
+            # This also waits if any request was recently rate limited, since that pauses all requests.
+            await RATE_LIMITER.acquire(
+                max_requests_per_minute,
+                release_jitter_seconds=anilist_settings.rate_limit_release_jitter_seconds,
+                priority=priority,
+                deadline=deadline,
+            )
 
             # Run the API request.
-            result = await api_request_function()
-
-            # Track the request count.
-            await record_request()
-
-            return result
-
-        except RateLimitException as e:
-            await sleep_for_rate_limit(initial_delay, attempt, max_attempts, e)
+            return await api_request_function()
 
         except GraphQLClientHttpError as e:
             if e.status_code == HTTPStatus.TOO_MANY_REQUESTS:
-                await sleep_for_rate_limit(initial_delay, attempt, max_attempts, e)
+                await pause_for_rate_limit(initial_delay, attempt, max_attempts, e)
             else:
                 raise
 
     raise RuntimeError("Failed to complete request.")
 
 
-async def sleep_for_rate_limit(
+async def pause_for_rate_limit(
     initial_delay: Optional[int],
     attempt: int,
     max_attempts: Optional[int],
-    error: Union[RateLimitException, GraphQLClientHttpError],
+    error: GraphQLClientHttpError,
 ):
-    """Function to sleep after a rate limit was imposed on our API calls.
+    """Function to pause all requests after the Anilist API rate limited our API calls.
+    Every request waiting on the rate limiter (not just the one that was rate limited) will wait until the pause is over.
 
     Args:
         initial_delay: Initial amount of seconds to wait after getting rate limited.
         attempt: Current attempt number.
         max_attempts: Max number of attempts to make.
-        error: Error that caused this sleep attempt. "RateLimitException" = from internal rate limiter. "GraphQLClientHttpError" = rate limit error from API.
+        error: Rate limit error from the API that caused this pause.
     """
     if attempt == max_attempts:
         raise RuntimeError(
@@ -83,38 +107,84 @@ async def sleep_for_rate_limit(
 
     delay: int
 
-    # Expect "RateLimitException" to be thrown by our own rate limiter.
-    if isinstance(error, RateLimitException):
-        # If the initial delay was provided, use it and increment by 5 seconds every time.
-        if initial_delay:
-            delay = initial_delay if attempt == 1 else (attempt * 2)
-        # Otherwise wait just over 1 minute and increment by 5 seconds every time.
-        else:
-            delay = 61 if attempt == 1 else (attempt * 2)
-
-    # Expect "TransportServerError" to be thrown when we get rate limited by the Anilist API.
+    # If the initial delay was provided, use it and increment by 2 seconds every time.
+    if initial_delay:
+        delay = initial_delay if attempt == 1 else (attempt * 2)
+    # Otherise try to retrieve the recommended delay from response headers.
     else:
-        # If the initial delay was provided, use it and increment by 5 seconds every time.
-        if initial_delay:
-            delay = initial_delay if attempt == 1 else (attempt * 2)
-        # Otherise try to retrieve the recommended delay from response headers.
+        error_headers = error.response.headers
+        retry_after = error_headers.get("Retry-After") if error_headers else None
+        if retry_after:
+            delay = int(retry_after)
         else:
-            if isinstance(error, GraphQLClientHttpError):
-                error_headers = error.response.headers
-                retry_after = error_headers["Retry-After"] if error_headers else None
-                if retry_after:
-                    delay = int(retry_after)
-                else:
-                    raise RuntimeError(
-                        'Could not find "Retry-After" header in rate limit response.'
-                    ) from error
-            else:
-                raise RuntimeError(
-                    "Could not extract base error from GraphQLClientHttpError."
-                ) from error
+            raise RuntimeError(
+                'Could not find "Retry-After" header in rate limit response.'
+            ) from error
 
-    logger.warning(f"Retrying due to rate limit error in {delay}s (attempt {attempt}).")
-    await asyncio.sleep(delay)
+    logger.warning(
+        f"Pausing requests due to rate limit error for {delay}s (attempt {attempt})."
+    )
+    await RATE_LIMITER.pause_async(delay)
+
+
+def get_operation_key(query: str, variables: Dict[str, Any], scope: str = "") -> str:
+    """Get a key that identifies a GraphQL operation, so that identical requests can be recognized.
+
+    Args:
+        query: Printed GraphQL document of the operation.
+        variables: Values of the operation's variables.
+        scope: Anything else that changes the result of the operation, ex: the auth header of the user making it.
+
+    Returns:
+        key: Hash of the document and its variables.
+    """
+    serialized_variables = json.dumps(
+        variables, sort_keys=True, default=to_jsonable_python
+    )
+    return sha256(f"{scope}\n{query}\n{serialized_variables}".encode()).hexdigest()
+
+
+def is_connection_error(error: BaseException) -> bool:
+    """Check if an error means that Anilist couldn't be reached (ex: no network, timeout or server error), rather than the request being wrong.
+
+    Args:
+        error: Error raised while making a request.
+
+    Returns:
+        is_connection_error: `True` if the same request might work later.
+    """
+    if isinstance(error, GraphQLClientHttpError):
+        return error.status_code >= HTTPStatus.INTERNAL_SERVER_ERROR
+
+    return isinstance(error, (httpx.TransportError, TimeoutError))
+
+
+def get_graphql_errors(
+    error: Union[GraphQLClientGraphQLMultiError, GraphQLClientHttpError],
+) -> Optional[GraphQLClientGraphQLMultiError]:
+    """Get the GraphQL errors (and partial data) from a failed Anilist API request.
+    Anilist responds with an error status code (ex: 404 when a media is not found) when a query has errors, so they might need to be read from the HTTP response.
+
+    Args:
+        error: Error raised by the GraphQL client.
+
+    Returns:
+        graphql_errors: The GraphQL errors of the response, or `None` if the response did not have any.
+    """
+    if isinstance(error, GraphQLClientGraphQLMultiError):
+        return error
+
+    try:
+        response_json = error.response.json()
+    except ValueError:
+        return None
+
+    if not isinstance(response_json, dict) or not response_json.get("errors"):
+        return None
+
+    return GraphQLClientGraphQLMultiError.from_errors_dicts(
+        errors_dicts=response_json["errors"], data=response_json.get("data")
+    )
 
 
 def attempt_iterator(max_attempts: Optional[int] = None):
@@ -129,38 +199,336 @@ def attempt_iterator(max_attempts: Optional[int] = None):
         attempt += 1
 
 
-# ------------------------- Local request counter (rate limiter) that is used if a max requests per minute is set in the settings. -----
+# ------------------------- Rate limiter that uses the max requests per minute from the settings and/or the rate limit headers from Anilist. -----
+
+
+class RateLimiter:
+    """Sliding window rate limiter that keeps track of when each recent request was made.
+    Since it knows when the oldest request in the window will expire, it can wait exactly as long as needed for the next free slot.
+    It can also follow the rate limit headers returned by Anilist, so that it knows the real limit and how many requests are left before being rate limited.
+    The recorded requests are kept in a backend, which can be shared between processes (see `RateLimiterBackend`).
+    """
+
+    backend: RateLimiterBackend
+    """Storage for the recorded requests and pauses."""
+
+    def __init__(self, backend: Optional[RateLimiterBackend] = None) -> None:
+        self.backend = backend or MemoryRateLimiterBackend()
+        self._server_limit: Optional[int] = None
+        self._server_remaining: Optional[int] = None
+        self._server_reset_at: Optional[float] = None
+        self._waiters: List[RequestWaiter] = []
+        self._waiter_count = count()
+
+    async def acquire(
+        self,
+        max_requests: Optional[int] = None,
+        release_jitter_seconds: float = 0,
+        priority: RequestPriority = RequestPriority.NORMAL,
+        deadline: Optional[float] = None,
+    ) -> None:
+        """Wait until a request can be made without going over the limit, then record it.
+        Requests waiting at the same time get their slot in order of priority, then deadline, then arrival.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Leave as `None` to only use the limit from Anilist's headers.
+            release_jitter_seconds: If the limiter is paused, each waiting request waits a random amount of time up to this many seconds after the pause is over.
+                This spreads out the requests that were waiting so they don't all get sent at once.
+            priority: Priority of the request. Higher priority requests always get the next free slot before lower priority ones.
+            deadline: Time (from `time.monotonic()`) after which to give up on waiting with a `TimeoutError`. Leave as `None` to wait as long as needed.
+        """
+        waiter = RequestWaiter(priority, deadline, next(self._waiter_count))
+        self._waiters.append(waiter)
 
-REQUEST_COUNTER_LOCK: asyncio.Lock = asyncio.Lock()
-"""Global lock for interacting with the attempt recorder."""
+        try:
+            while True:
+                # Only the first request in line can take a slot, the others wait until it's their turn.
+                if self._get_next_waiter() is not waiter:
+                    waiter.event.clear()
+                    await asyncio.wait_for(waiter.event.wait(), get_time_left(deadline))
+                    continue
 
-REQUEST_COUNTER: deque[float] = deque()
-"""Sliding request counter that holds all the API call attempts made in the last minute."""
+                pause_delay = await self._call_backend(self.get_pause_delay)
+
+                if pause_delay > 0:
+                    check_deadline(deadline, pause_delay)
+                    logger.info(f"Requests are paused. Waiting {pause_delay:.2f}s.")
+                    await asyncio.sleep(pause_delay)
+                    self._set_release_times(monotonic(), release_jitter_seconds)
+                    continue
+
+                # After a pause, each waiting request waits until its own release time so they don't all get sent at once.
+                release_delay = get_time_left(waiter.release_at)
+
+                if release_delay:
+                    await asyncio.sleep(release_delay)
+                    continue
+
+                delay = await self._call_backend(self.try_acquire, max_requests)
+
+                if delay <= 0:
+                    return
+
+                check_deadline(deadline, delay)
+                logger.info(
+                    f"Reached the max requests per minute. Waiting {delay:.2f}s."
+                )
+                await asyncio.sleep(delay)
+        finally:
+            self._waiters.remove(waiter)
+
+            # Let the next request in line try to take a slot.
+            next_waiter = self._get_next_waiter()
+            if next_waiter is not None:
+                next_waiter.event.set()
+
+    def pause(self, seconds: float) -> None:
+        """Stop all requests from being made for some time, ex: after being rate limited.
+        If the limiter is already paused for longer, this does nothing.
+
+        Args:
+            seconds: Number of seconds to pause for.
+        """
+        self.backend.pause(seconds)
+
+    async def pause_async(self, seconds: float) -> None:
+        """Same as `pause()`, but without blocking the event loop if the backend can block (see `RateLimiterBackend.blocking`).
+
+        Args:
+            seconds: Number of seconds to pause for.
+        """
+        await self._call_backend(self.pause, seconds)
+
+    def get_pause_delay(self) -> float:
+        """Get the number of seconds until the limiter is no longer paused, or `0` if it is not paused."""
+        return self.backend.get_pause_delay()
+
+    def try_acquire(self, max_requests: Optional[int] = None) -> float:
+        """Record a request if it can be made without going over the limit.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Leave as `None` to only use the limit from Anilist's headers.
+
+        Returns:
+            delay: `0` if the request was recorded, otherwise the number of seconds until a slot frees up.
+        """
+        delay = self._get_server_delay()
+
+        if delay > 0:
+            return delay
+
+        delay = self.backend.try_record_request(self._get_limit(max_requests))
+
+        if delay <= 0 and self._server_remaining is not None:
+            self._server_remaining -= 1
+
+        return delay
+
+    def get_delay(self, max_requests: Optional[int] = None) -> float:
+        """Get the number of seconds to wait before a request can be made.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Leave as `None` to only use the limit from Anilist's headers.
+
+        Returns:
+            delay: Number of seconds until a slot frees up, or `0` if one is already free.
+        """
+        return max(
+            self._get_server_delay(),
+            self.backend.get_delay(self._get_limit(max_requests)),
+        )
+
+    async def would_wait(self, max_requests: Optional[int] = None) -> bool:
+        """Check if a request made right now would have to wait, either for a free slot or behind other waiting requests.
+
+        Args:
+            max_requests: Max number of requests that can be made in the window. Leave as `None` to only use the limit from Anilist's headers.
+
+        Returns:
+            would_wait: `True` if the request would not be sent right away.
+        """
+        return (
+            bool(self._waiters)
+            or await self._call_backend(self.get_pause_delay) > 0
+            or await self._call_backend(self.get_delay, max_requests) > 0
+        )
+
+    def update_from_headers(self, headers: Mapping[str, str]) -> None:
+        """Update the limit and remaining requests from the rate limit headers of an Anilist response.
 
+        Args:
+            headers: Headers of the response.
+        """
+        limit = parse_int_header(headers, "X-RateLimit-Limit")
+        remaining = parse_int_header(headers, "X-RateLimit-Remaining")
+        reset = parse_int_header(headers, "X-RateLimit-Reset")
 
-async def record_request() -> int:
-    """Record an Anilist API request attemp.
+        if limit is not None:
+            self._server_limit = limit
+
+        if remaining is None:
+            return
+
+        now = monotonic()
+        self._server_remaining = remaining
+
+        # The reset header is a UNIX timestamp, so convert it to monotonic time.
+        # Anilist only sends it once we are rate limited, so otherwise assume the budget is fully reset after one window.
+        if reset is not None:
+            self._server_reset_at = now + max(reset - time(), 0)
+        else:
+            self._server_reset_at = now + self.backend.period_seconds
+
+    def get_request_count(self) -> int:
+        """Get the number of requests made in the current window."""
+        return self.backend.get_request_count()
+
+    def reset(self) -> None:
+        """Forget all the recorded requests, rate limit headers and pauses."""
+        self.backend.reset()
+        self._server_limit = None
+        self._server_remaining = None
+        self._server_reset_at = None
+
+    async def _call_backend(self, function: Callable[..., T], *args: Any) -> T:
+        """Call a method that uses the backend, in a worker thread if the backend can block (see `RateLimiterBackend.blocking`).
+
+        Args:
+            function: Method to call.
+            args: Arguments to call it with.
+
+        Returns:
+            result: What the method returned.
+        """
+        if self.backend.blocking:
+            return await asyncio.to_thread(function, *args)
+
+        return function(*args)
+
+    def _get_limit(self, max_requests: Optional[int]) -> Optional[int]:
+        """Get the lowest limit out of our own and the one from Anilist's headers."""
+        limits = [limit for limit in (max_requests, self._server_limit) if limit]
+        return min(limits) if limits else None
+
+    def _set_release_times(self, paused_until: float, jitter_seconds: float) -> None:
+        """Give each request waiting when a pause is over a random time to be released at, up to `jitter_seconds` after the pause.
+        The earliest times go to the requests first in line, so that they are still released in order.
+
+        Args:
+            paused_until: Time (from `time.monotonic()`) when the pause is over.
+            jitter_seconds: Max number of seconds after the pause to release a request at.
+        """
+        waiters = sorted(self._waiters, key=RequestWaiter.get_sort_key)
+        offsets = sorted(random.uniform(0, jitter_seconds) for _ in waiters)
+
+        for waiter, offset in zip(waiters, offsets):
+            waiter.release_at = paused_until + offset
+
+    def _get_next_waiter(self) -> Optional["RequestWaiter"]:
+        """Get the request that should get the next free slot, if any are waiting."""
+        return min(self._waiters, key=RequestWaiter.get_sort_key, default=None)
+
+    def _get_server_delay(self) -> float:
+        """Get the number of seconds to wait if Anilist told us that we have no requests left."""
+        if self._server_remaining is None or self._server_remaining > 0:
+            return 0
+
+        now = monotonic()
+
+        if self._server_reset_at is not None and now < self._server_reset_at:
+            return self._server_reset_at - now
+
+        # The budget should have been reset by now, so go back to only using the limit.
+        self._server_remaining = None
+        self._server_reset_at = None
+
+        return 0
+
+
+class RequestWaiter:
+    """A request waiting for a slot in the rate limiter."""
+
+    priority: RequestPriority
+    deadline: Optional[float]
+    order: int
+    """Order in which the request started waiting."""
+    event: asyncio.Event
+    """Set when it might be this request's turn to take a slot."""
+    release_at: Optional[float]
+    """Time (from `time.monotonic()`) before which the request can't take a slot, after the rate limiter was paused."""
+
+    def __init__(
+        self, priority: RequestPriority, deadline: Optional[float], order: int
+    ) -> None:
+        self.priority = priority
+        self.deadline = deadline
+        self.order = order
+        self.event = asyncio.Event()
+        self.release_at = None
+
+    def get_sort_key(self) -> Tuple[int, float, int]:
+        """Get the key used to sort the waiting requests. The request with the lowest key goes first."""
+        deadline = self.deadline if self.deadline is not None else float("inf")
+        return (-self.priority, deadline, self.order)
+
+
+def get_time_left(deadline: Optional[float]) -> Optional[float]:
+    """Get the number of seconds left before a deadline, or `None` if there is no deadline."""
+    return None if deadline is None else max(deadline - monotonic(), 0)
+
+
+def check_deadline(deadline: Optional[float], delay: float) -> None:
+    """Raise a `TimeoutError` if waiting for some delay would go past a deadline.
+
+    Args:
+        deadline: Time (from `time.monotonic()`) after which to give up on waiting.
+        delay: Number of seconds that we would need to wait.
+    """
+    time_left = get_time_left(deadline)
+
+    if time_left is not None and delay > time_left:
+        raise TimeoutError(
+            f"Could not get a rate limiter slot before the deadline (needed to wait {delay:.2f}s, had {time_left:.2f}s left)."
+        )
+
+
+def parse_int_header(headers: Mapping[str, str], name: str) -> Optional[int]:
+    """Get the value of a header as an integer.
+
+    Args:
+        headers: Headers of a response.
+        name: Name of the header.
 
     Returns:
-        attempts: Number of attempts in the last minute.
+        value: Value of the header, or `None` if it is missing or not an integer.
     """
-    async with REQUEST_COUNTER_LOCK:
-        now = time()
-        REQUEST_COUNTER.append(now)
+    value = headers.get(name)
+
+    try:
+        return int(value) if value is not None else None
+    except ValueError:
+        return None
+
 
-        # Remove timestamps older than 60 seconds
-        while now - REQUEST_COUNTER[0] > 60:
-            REQUEST_COUNTER.popleft()
+RATE_LIMITER = RateLimiter(create_rate_limiter_backend())
+"""Global rate limiter that holds all the API calls made in the last minute."""
 
-        return get_request_count_last_minute()
+
+async def record_rate_limit_headers(response: httpx.Response) -> None:
+    """Response hook for the HTTP client that passes the rate limit headers of every Anilist response to the rate limiter.
+
+    Args:
+        response: Response from the Anilist API.
+    """
+    if anilist_settings.rate_limit_use_headers:
+        RATE_LIMITER.update_from_headers(response.headers)
 
 
-def get_request_count_last_minute():
+def get_request_count_last_minute() -> int:
     """Get the number of Anilist API requests made in the last minute."""
-    return len(REQUEST_COUNTER)
+    return RATE_LIMITER.get_request_count()
 
 
 async def reset_request_counter():
     """Reset the request counter."""
-    async with REQUEST_COUNTER_LOCK:
-        REQUEST_COUNTER.clear()
+    RATE_LIMITER.reset()
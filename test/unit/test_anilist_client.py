@@ -0,0 +1,853 @@
+import asyncio
+import json
+import re
+from typing import Any, Callable, Dict, List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from nifty_anilist.anilist_client import AnilistClient
+from nifty_anilist.auth import AuthInfo
+from nifty_anilist.client.custom_fields import (
+    DeletedFields,
+    MediaFields,
+    MediaListFields,
+    PageFields,
+)
+from nifty_anilist.client.custom_mutations import Mutation
+from nifty_anilist.client.custom_queries import GraphQLField, Query
+from nifty_anilist.client.exceptions import (
+    GraphQLClientGraphQLMultiError,
+    GraphQLClientHttpError,
+)
+from nifty_anilist.graphql_client import GraphQLClient
+from nifty_anilist.prepared_query import placeholder, PreparedQuery
+from nifty_anilist.settings import CachePolicy
+from nifty_anilist.utils.cache_utils import MemoryResponseCache
+from nifty_anilist.utils.entity_cache_utils import EntityCache
+from nifty_anilist.utils.rate_limit_utils import RequestPriority
+from nifty_anilist.utils.request_utils import RATE_LIMITER
+
+
+TOTAL_PAGES = 7
+ITEMS_PER_PAGE = 3
+
+
+class FakePaginatedApi:
+    """Fake Anilist API that serves pages of media with sequential IDs."""
+
+    def __init__(self, delay: float = 0.0) -> None:
+        self.delay = delay
+        self.requested_pages: List[int] = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def anilist_request(
+        self,
+        query_request: GraphQLField,
+        operation_name: str = "anilist_query",
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        page: int = query_request._variables["page"]["value"]
+        self.requested_pages.append(page)
+
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        # Later pages finish first to make sure results are still returned in page order.
+        await asyncio.sleep(self.delay * (TOTAL_PAGES - page))
+        self.in_flight -= 1
+
+        return {
+            "Page": {
+                "pageInfo": {
+                    "hasNextPage": page < TOTAL_PAGES,
+                    "total": TOTAL_PAGES * ITEMS_PER_PAGE,
+                    "lastPage": TOTAL_PAGES,
+                },
+                "media": [
+                    {"id": (page - 1) * ITEMS_PER_PAGE + i}
+                    for i in range(ITEMS_PER_PAGE)
+                ],
+            }
+        }
+
+
+class TestPaginatedRequests:
+
+    @pytest.fixture
+    def fake_api(self):
+        fake_api = FakePaginatedApi(delay=0.001)
+        with patch.object(AnilistClient, "anilist_request", fake_api.anilist_request):
+            yield fake_api
+
+    @pytest.mark.asyncio
+    async def test_sequential_pagination(self, fake_api: FakePaginatedApi):
+        """Pages are requested one at a time by default."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.paginated_anilist_request(
+                PageFields.media().fields(MediaFields.id), per_page=ITEMS_PER_PAGE
+            )
+
+        assert [item["id"] for item in results] == list(
+            range(TOTAL_PAGES * ITEMS_PER_PAGE)
+        )
+        assert fake_api.requested_pages == list(range(1, TOTAL_PAGES + 1))
+        assert fake_api.max_in_flight == 1
+
+    @pytest.mark.asyncio
+    async def test_concurrent_pagination(self, fake_api: FakePaginatedApi):
+        """Pages after the first are requested in parallel but returned in page order."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.paginated_anilist_request(
+                PageFields.media().fields(MediaFields.id),
+                per_page=ITEMS_PER_PAGE,
+                concurrency=4,
+            )
+
+        assert [item["id"] for item in results] == list(
+            range(TOTAL_PAGES * ITEMS_PER_PAGE)
+        )
+        assert sorted(fake_api.requested_pages) == list(range(1, TOTAL_PAGES + 1))
+        assert fake_api.max_in_flight == 4
+
+    @pytest.mark.asyncio
+    async def test_concurrent_pagination_limits(self, fake_api: FakePaginatedApi):
+        """Concurrent pagination still respects the max page and max items."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.paginated_anilist_request(
+                PageFields.media().fields(MediaFields.id),
+                per_page=ITEMS_PER_PAGE,
+                max_page=5,
+                concurrency=3,
+            )
+            assert len(results) == 5 * ITEMS_PER_PAGE
+            assert max(fake_api.requested_pages) == 5
+
+            fake_api.requested_pages.clear()
+            results = await client.paginated_anilist_request(
+                PageFields.media().fields(MediaFields.id),
+                per_page=ITEMS_PER_PAGE,
+                max_items=7,
+                concurrency=3,
+            )
+            assert [item["id"] for item in results] == list(range(7))
+            assert sorted(fake_api.requested_pages) == [1, 2, 3]
+
+    @pytest.mark.asyncio
+    async def test_streaming_pagination(self, fake_api: FakePaginatedApi):
+        """Streamed results arrive in order, either item by item or page by page."""
+        async with AnilistClient(use_auth=False) as client:
+            items = [
+                item
+                async for item in client.stream_paginated_anilist_request(
+                    PageFields.media().fields(MediaFields.id),
+                    per_page=ITEMS_PER_PAGE,
+                    max_items=10,
+                )
+            ]
+            assert [item["id"] for item in items] == list(range(10))
+
+            pages = [
+                page
+                async for page in client.stream_paginated_anilist_request(
+                    PageFields.media().fields(MediaFields.id),
+                    per_page=ITEMS_PER_PAGE,
+                    yield_pages=True,
+                )
+            ]
+            assert len(pages) == TOTAL_PAGES
+            assert all(len(page) == ITEMS_PER_PAGE for page in pages)
+
+    @pytest.mark.asyncio
+    async def test_streaming_pagination_backpressure(self, fake_api: FakePaginatedApi):
+        """Pages are only requested up to the buffer size ahead of the consumer."""
+        async with AnilistClient(use_auth=False) as client:
+            stream = client.stream_paginated_anilist_request(
+                PageFields.media().fields(MediaFields.id),
+                per_page=ITEMS_PER_PAGE,
+                yield_pages=True,
+                buffer_size=2,
+            )
+
+            async for page in stream:
+                await asyncio.sleep(0.05)
+                break
+
+            await stream.aclose()
+            await asyncio.sleep(0.05)
+
+        # One page consumed, two buffered, and at most one more in flight.
+        assert len(fake_api.requested_pages) <= 4
+
+
+MISSING_MEDIA_ID = 404
+
+
+def media_api_handler(request: httpx.Request) -> httpx.Response:
+    """Fake Anilist API that answers (possibly aliased) `Media(id: …)` lookups, the same way Anilist does."""
+    body = json.loads(request.content)
+    data: Dict[str, Any] = {}
+    errors: List[Dict[str, Any]] = []
+
+    id_in = re.search(r"media\(id_in: \$(\w+)\)", body["query"])
+    if id_in:
+        media_ids = body["variables"][id_in.group(1)]
+        media = [
+            {"id": media_id} for media_id in media_ids if media_id != MISSING_MEDIA_ID
+        ]
+        return httpx.Response(200, json={"data": {"Page": {"media": media}}})
+
+    for alias, variable in re.findall(
+        r"(?:(\w+): )?Media\(id: \$(\w+)\)", body["query"]
+    ):
+        alias = alias or "Media"
+        media_id = body["variables"][variable]
+
+        if media_id == MISSING_MEDIA_ID:
+            data[alias] = None
+            errors.append({"message": "Not Found.", "status": 404, "path": [alias]})
+        else:
+            data[alias] = {"id": media_id}
+
+    if errors:
+        return httpx.Response(404, json={"errors": errors, "data": data})
+
+    return httpx.Response(200, json={"data": data})
+
+
+class FakeAnilist:
+    """Fake Anilist API that the patched clients send their requests to."""
+
+    def __init__(self) -> None:
+        self.handler: Callable[[httpx.Request], Any] = media_api_handler
+        """Function that answers each request. Can be changed by tests that need other responses."""
+        self.requests: List[httpx.Request] = []
+
+    def handle_request(self, request: httpx.Request) -> Any:
+        self.requests.append(request)
+        return self.handler(request)
+
+
+@pytest.fixture
+def fake_anilist():
+    """Patch the client to send its requests to a fake Anilist API."""
+    fake_anilist = FakeAnilist()
+
+    with patch.object(
+        AnilistClient,
+        "_create_client",
+        lambda self, *args: GraphQLClient(
+            url="https://graphql.anilist.co",
+            http_client=httpx.AsyncClient(
+                transport=httpx.MockTransport(fake_anilist.handle_request)
+            ),
+        ),
+    ):
+        yield fake_anilist
+
+
+@pytest.fixture
+def requests_made(fake_anilist: FakeAnilist) -> List[httpx.Request]:
+    """Keep track of the HTTP requests made to the fake Anilist API."""
+    return fake_anilist.requests
+
+
+class TestBatchRequests:
+
+    @pytest.mark.asyncio
+    async def test_batch_request(self, requests_made: List[httpx.Request]):
+        """Batched queries are sent together and split back up in order."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.batch_anilist_request(
+                [
+                    Query.media(id=media_id).fields(MediaFields.id)
+                    for media_id in range(1, 31)
+                ],
+                batch_size=20,
+            )
+
+        assert results == [{"Media": {"id": media_id}} for media_id in range(1, 31)]
+        assert len(requests_made) == 2
+
+    @pytest.mark.asyncio
+    async def test_batch_request_errors(self, requests_made: List[httpx.Request]):
+        """A failed query only fails the whole batch if exceptions are not returned."""
+        queries = [
+            Query.media(id=media_id).fields(MediaFields.id)
+            for media_id in [1, MISSING_MEDIA_ID, 3]
+        ]
+
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.batch_anilist_request(
+                queries, return_exceptions=True
+            )
+
+            assert results[0] == {"Media": {"id": 1}}
+            assert isinstance(results[1], GraphQLClientGraphQLMultiError)
+            assert results[1].data == {"Media": None}
+            assert results[2] == {"Media": {"id": 3}}
+
+            with pytest.raises(GraphQLClientHttpError):
+                await client.batch_anilist_request(queries)
+
+
+class TestLoader:
+
+    @pytest.mark.asyncio
+    async def test_loader_coalesces_lookups(self, requests_made: List[httpx.Request]):
+        """Lookups made at the same time are merged into as few requests as possible."""
+        media_ids = [1, 2, 3, MISSING_MEDIA_ID, 2]
+
+        async with AnilistClient(use_auth=False) as client:
+            results = await asyncio.gather(
+                *(
+                    client.loader.load(Query.media(id=media_id).fields(MediaFields.id))
+                    for media_id in media_ids
+                ),
+                client.loader.load(
+                    Query.media(id=5).alias("aliased").fields(MediaFields.id)
+                ),
+            )
+
+        assert results == [
+            {"Media": {"id": 1}},
+            {"Media": {"id": 2}},
+            {"Media": {"id": 3}},
+            {"Media": None},
+            {"Media": {"id": 2}},
+            {"aliased": {"id": 5}},
+        ]
+        # One "id_in" page query and one aliased document.
+        assert len(requests_made) == 2
+
+
+class TestInFlightDeduplication:
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_are_sent_once(
+        self, requests_made: List[httpx.Request]
+    ):
+        """Identical requests made at the same time share a single HTTP request."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await asyncio.gather(
+                *(
+                    client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+                    for _ in range(5)
+                ),
+                client.anilist_request(Query.media(id=2).fields(MediaFields.id)),
+            )
+
+            assert results[:5] == [{"Media": {"id": 1}}] * 5
+            assert results[5] == {"Media": {"id": 2}}
+            assert len(requests_made) == 2
+
+            # Once the request is done, the same request is sent again.
+            await client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+            assert len(requests_made) == 3
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_get_their_own_result(
+        self, requests_made: List[httpx.Request]
+    ):
+        """Changing the result of a shared request doesn't change it for the other callers."""
+        async with AnilistClient(use_auth=False) as client:
+
+            async def request_and_change():
+                result = await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id)
+                )
+                result["Media"].pop("id")
+                return result
+
+            changed, unchanged = await asyncio.gather(
+                request_and_change(),
+                client.anilist_request(Query.media(id=1).fields(MediaFields.id)),
+            )
+
+        assert changed == {"Media": {}}
+        assert unchanged == {"Media": {"id": 1}}
+        assert len(requests_made) == 1
+
+    @pytest.mark.asyncio
+    async def test_identical_requests_share_errors(
+        self, requests_made: List[httpx.Request]
+    ):
+        """All callers waiting on a shared request get its error."""
+        async with AnilistClient(use_auth=False) as client:
+            results = await asyncio.gather(
+                *(
+                    client.anilist_request(
+                        Query.media(id=MISSING_MEDIA_ID).fields(MediaFields.id)
+                    )
+                    for _ in range(3)
+                ),
+                return_exceptions=True,
+            )
+
+        assert all(isinstance(result, GraphQLClientHttpError) for result in results)
+        assert len(requests_made) == 1
+
+    @pytest.mark.asyncio
+    async def test_shared_requests_keep_priority_and_deadline(
+        self, fake_anilist: FakeAnilist
+    ):
+        """A request never waits on an identical request of another priority, and still gives up at its own deadline."""
+        respond = asyncio.Event()
+
+        async def slow_handler(request: httpx.Request) -> httpx.Response:
+            await respond.wait()
+            return media_api_handler(request)
+
+        fake_anilist.handler = slow_handler
+
+        async with AnilistClient(use_auth=False) as client:
+            requests = [
+                asyncio.ensure_future(
+                    client.anilist_request(
+                        Query.media(id=1).fields(MediaFields.id), priority=priority
+                    )
+                )
+                for priority in [RequestPriority.LOW, RequestPriority.HIGH]
+            ]
+            await asyncio.sleep(0.01)
+            assert len(fake_anilist.requests) == 2
+
+            with pytest.raises(TimeoutError):
+                await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id),
+                    priority=RequestPriority.LOW,
+                    deadline_seconds=0.01,
+                )
+
+            # Giving up doesn't cancel the shared request.
+            respond.set()
+            assert await asyncio.gather(*requests) == [{"Media": {"id": 1}}] * 2
+            assert len(fake_anilist.requests) == 2
+
+
+class TestPerRequestAuth:
+
+    @pytest.mark.asyncio
+    async def test_one_client_for_many_users(self, requests_made: List[httpx.Request]):
+        """Requests made for different users with the same client are sent with their own auth header, and never share results."""
+        users = [AuthInfo(1, "first-token"), AuthInfo(2, "second-token")]
+        cache = MemoryResponseCache()
+
+        async with AnilistClient(use_auth=False, cache=cache) as client:
+            await asyncio.gather(
+                *(
+                    client.anilist_request(
+                        Query.media(id=1).fields(MediaFields.id), user=user
+                    )
+                    for user in users * 2
+                )
+            )
+            # Only identical requests from the same user are shared.
+            assert len(requests_made) == 2
+
+            for user in users:
+                await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id), user=user
+                )
+
+            # Each user's result is cached separately.
+            assert len(requests_made) == 2
+            await client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+            assert len(requests_made) == 3
+
+            await client.batch_anilist_request(
+                [Query.media(id=2).fields(MediaFields.id)], user=users[0]
+            )
+
+        assert [request.headers.get("Authorization") for request in requests_made] == [
+            "Bearer first-token",
+            "Bearer second-token",
+            None,
+            "Bearer first-token",
+        ]
+
+    @pytest.mark.asyncio
+    async def test_entity_cache_for_many_users(
+        self, requests_made: List[httpx.Request]
+    ):
+        """Entities fetched for one user are only used to answer that user's queries, not other users' or queries without auth."""
+        users = [AuthInfo(1, "first-token"), AuthInfo(2, "second-token")]
+
+        async with AnilistClient(use_auth=False, entity_cache=EntityCache()) as client:
+            await client.batch_anilist_request(
+                [
+                    Query.media(id=media_id).fields(MediaFields.id)
+                    for media_id in [1, 2]
+                ],
+                user=users[0],
+            )
+            assert len(requests_made) == 1
+
+            assert await client.anilist_request(
+                Query.media(id=2).fields(MediaFields.id), user=users[0]
+            ) == {"Media": {"id": 2}}
+            assert len(requests_made) == 1
+
+            await client.anilist_request(
+                Query.media(id=2).fields(MediaFields.id), user=users[1]
+            )
+            await client.anilist_request(Query.media(id=2).fields(MediaFields.id))
+            assert len(requests_made) == 3
+
+        assert [request.headers.get("Authorization") for request in requests_made] == [
+            "Bearer first-token",
+            "Bearer second-token",
+            None,
+        ]
+
+
+class TestResponseCache:
+
+    @pytest.mark.asyncio
+    async def test_repeated_queries_use_cache(self, requests_made: List[httpx.Request]):
+        """A repeated query is answered from the cache, unless the cache is skipped for it."""
+        cache = MemoryResponseCache()
+
+        async with AnilistClient(use_auth=False, cache=cache) as client:
+            for _ in range(3):
+                result = await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id)
+                )
+                assert result == {"Media": {"id": 1}}
+
+            assert len(requests_made) == 1
+            assert cache.stats.hits == 2
+            assert cache.stats.misses == 1
+
+            # Changing the cached copy doesn't change the cache.
+            result["Media"]["id"] = 2
+            await client.anilist_request(Query.media(id=2).fields(MediaFields.id))
+            assert await client.anilist_request(
+                Query.media(id=1).fields(MediaFields.id)
+            ) == {"Media": {"id": 1}}
+            assert len(requests_made) == 2
+
+            await client.anilist_request(
+                Query.media(id=1).fields(MediaFields.id), cache_ttl_seconds=0
+            )
+            assert len(requests_made) == 3
+
+    @pytest.mark.asyncio
+    async def test_stale_while_revalidate(self, requests_made: List[httpx.Request]):
+        """A result past its TTL but within the grace window is returned right away and refreshed in the background."""
+        now = 1000.0
+        cache = MemoryResponseCache(default_ttl_seconds=60, stale_grace_seconds=300)
+
+        with patch("nifty_anilist.utils.cache_utils.monotonic", lambda: now):
+            async with AnilistClient(use_auth=False, cache=cache) as client:
+                await client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+                now += 100
+
+                result = await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id),
+                    cache_policy=CachePolicy.STALE_WHILE_REVALIDATE,
+                )
+                assert result == {"Media": {"id": 1}}
+                assert len(requests_made) == 1
+                assert cache.stats.stale_hits == 1
+
+                await asyncio.gather(*client._background_refreshes.values())
+                assert len(requests_made) == 2
+
+                # The refreshed result is fresh again, even without allowing stale results.
+                await client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+                assert len(requests_made) == 2
+
+                # Past the grace window, the result is requested again before returning.
+                now += 1000
+                await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id),
+                    cache_policy=CachePolicy.STALE_WHILE_REVALIDATE,
+                )
+                assert len(requests_made) == 3
+                assert not client._background_refreshes
+
+    @pytest.mark.asyncio
+    async def test_foreground_requests_do_not_wait_on_refreshes(
+        self, fake_anilist: FakeAnilist
+    ):
+        """A request made while the same result is refreshed in the background is sent on its own, instead of waiting on the low priority refresh."""
+        now = 1000.0
+        cache = MemoryResponseCache(default_ttl_seconds=60, stale_grace_seconds=300)
+        finish_refresh = asyncio.Event()
+
+        async def handler(request: httpx.Request) -> httpx.Response:
+            # The second request is the background refresh.
+            if len(fake_anilist.requests) == 2:
+                await finish_refresh.wait()
+            return media_api_handler(request)
+
+        fake_anilist.handler = handler
+
+        with patch("nifty_anilist.utils.cache_utils.monotonic", lambda: now):
+            async with AnilistClient(use_auth=False, cache=cache) as client:
+                await client.anilist_request(Query.media(id=1).fields(MediaFields.id))
+                now += 100
+
+                await client.anilist_request(
+                    Query.media(id=1).fields(MediaFields.id),
+                    cache_policy=CachePolicy.STALE_WHILE_REVALIDATE,
+                )
+                await asyncio.sleep(0.01)
+                assert len(client._background_refreshes) == 1
+
+                assert await asyncio.wait_for(
+                    client.anilist_request(
+                        Query.media(id=1).fields(MediaFields.id),
+                        priority=RequestPriority.LOW,
+                    ),
+                    timeout=1,
+                ) == {"Media": {"id": 1}}
+                assert len(fake_anilist.requests) == 3
+
+                finish_refresh.set()
+                await asyncio.gather(*client._background_refreshes.values())
+
+    @pytest.mark.asyncio
+    async def test_offline_fallback(self, fake_anilist: FakeAnilist):
+        """An expired result is only used when the request would wait for the rate limiter or Anilist can't be reached."""
+        now = 1000.0
+        cache = MemoryResponseCache(default_ttl_seconds=60, stale_grace_seconds=300)
+        query = Query.media(id=1).fields(MediaFields.id)
+
+        with patch("nifty_anilist.utils.cache_utils.monotonic", lambda: now):
+            async with AnilistClient(use_auth=False, cache=cache) as client:
+                await client.anilist_request(query)
+                now += 100
+
+                # Anilist can be reached and there is no wait, so the result is requested again.
+                await client.anilist_request(
+                    query, cache_policy=CachePolicy.OFFLINE_FALLBACK
+                )
+                assert len(fake_anilist.requests) == 2
+
+                now += 100
+                RATE_LIMITER.pause(30)
+
+                try:
+                    assert await asyncio.wait_for(
+                        client.anilist_request(
+                            query, cache_policy=CachePolicy.OFFLINE_FALLBACK
+                        ),
+                        timeout=1,
+                    ) == {"Media": {"id": 1}}
+                    assert len(fake_anilist.requests) == 2
+                    assert len(client._background_refreshes) == 1
+                finally:
+                    RATE_LIMITER.reset()
+
+            def unreachable(request: httpx.Request) -> httpx.Response:
+                raise httpx.ConnectError("No network.", request=request)
+
+            fake_anilist.handler = unreachable
+
+            async with AnilistClient(use_auth=False, cache=cache) as client:
+                assert await client.anilist_request(
+                    query, cache_policy=CachePolicy.OFFLINE_FALLBACK
+                ) == {"Media": {"id": 1}}
+
+                with pytest.raises(httpx.ConnectError):
+                    await client.anilist_request(query)
+
+    @pytest.mark.asyncio
+    async def test_entity_cache(self, requests_made: List[httpx.Request]):
+        """Lookups of entities that were already fetched by another query are answered from the entity cache."""
+        async with AnilistClient(use_auth=False, entity_cache=EntityCache()) as client:
+            await client.batch_anilist_request(
+                [Query.media(id=media_id).fields(MediaFields.id) for media_id in [1, 2]]
+            )
+            assert len(requests_made) == 1
+
+            assert await client.anilist_request(
+                Query.media(id=2).fields(MediaFields.id)
+            ) == {"Media": {"id": 2}}
+            assert await client.loader.load(
+                Query.media(id=1).alias("first").fields(MediaFields.id)
+            ) == {"first": {"id": 1}}
+            assert len(requests_made) == 1
+
+    @pytest.mark.asyncio
+    async def test_entity_cache_only_requests_missing_fields(
+        self, fake_anilist: FakeAnilist
+    ):
+        """A query that is partly in the entity cache only requests the missing fields."""
+        queries: List[str] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            queries.append(json.loads(request.content)["query"])
+            return httpx.Response(
+                200, json={"data": {"Media": {"id": 1, "episodes": 12}}}
+            )
+
+        entity_cache = EntityCache()
+        entity_cache.write(
+            [Query.media(id=1).fields(MediaFields.id, MediaFields.season_year)],
+            {"Media": {"id": 1, "seasonYear": 2024}},
+        )
+
+        fake_anilist.handler = handler
+
+        async with AnilistClient(use_auth=False, entity_cache=entity_cache) as client:
+            result = await client.anilist_request(
+                Query.media(id=1).fields(MediaFields.season_year, MediaFields.episodes)
+            )
+
+        assert result == {"Media": {"seasonYear": 2024, "episodes": 12}}
+        assert len(queries) == 1
+        assert "episodes" in queries[0] and "seasonYear" not in queries[0]
+
+
+class TestMutations:
+
+    @pytest.mark.asyncio
+    async def test_mutations_update_caches(self, fake_anilist: FakeAnilist):
+        """Saving an entry updates it in the entity cache and removes the cached results that include it, and deleting it removes it from both."""
+        requests_made: List[str] = []
+        progress = 1
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            nonlocal progress
+            query = json.loads(request.content)["query"]
+            requests_made.append(query)
+
+            if "SaveMediaListEntry" in query:
+                progress += 1
+                data = {"SaveMediaListEntry": {"id": 7, "progress": progress}}
+            elif "DeleteMediaListEntry" in query:
+                data = {"DeleteMediaListEntry": {"deleted": True}}
+            else:
+                data = {"MediaList": {"id": 7, "progress": progress}}
+
+            return httpx.Response(200, json={"data": data})
+
+        def get_entry():
+            return Query.media_list(id=7).fields(
+                MediaListFields.id, MediaListFields.progress
+            )
+
+        cache = MemoryResponseCache()
+        entity_cache = EntityCache()
+
+        fake_anilist.handler = handler
+
+        async with AnilistClient(
+            use_auth=False, cache=cache, entity_cache=entity_cache
+        ) as client:
+            assert await client.anilist_request(get_entry()) == {
+                "MediaList": {"id": 7, "progress": 1}
+            }
+            assert len(cache) == 1
+
+            # Toggling the same mutation twice sends it twice, even at the same time.
+            await asyncio.gather(
+                *[
+                    client.anilist_mutation(
+                        Mutation.save_media_list_entry(id=7, progress=2).fields(
+                            MediaListFields.id, MediaListFields.progress
+                        )
+                    )
+                    for _ in range(2)
+                ]
+            )
+            assert len(requests_made) == 3
+            assert len(cache) == 0
+
+            # The entry was updated in place, so it doesn't need to be requested again.
+            assert await client.anilist_request(get_entry()) == {
+                "MediaList": {"id": 7, "progress": 3}
+            }
+            assert len(requests_made) == 3
+
+            await client.anilist_mutation(
+                Mutation.delete_media_list_entry(id=7).fields(DeletedFields.deleted)
+            )
+            assert entity_cache.get_entity("MediaList:7") is None
+
+            await client.anilist_request(get_entry())
+            assert len(requests_made) == 5
+
+
+class TestPreparedQueries:
+
+    @pytest.mark.asyncio
+    async def test_prepared_request(self, requests_made: List[httpx.Request]):
+        """A prepared query is sent with the values of its placeholders, and the same document every time."""
+        media_query = PreparedQuery(
+            Query.media(id=placeholder("id")).fields(MediaFields.id)
+        )
+
+        async with AnilistClient(use_auth=False) as client:
+            for media_id in [1, 2]:
+                assert await client.prepared_anilist_request(
+                    media_query, {"id": media_id}
+                ) == {"Media": {"id": media_id}}
+
+            with pytest.raises(ValueError):
+                await client.prepared_anilist_request(media_query, {"ids": 1})
+
+        bodies = [json.loads(request.content) for request in requests_made]
+        assert bodies[0]["query"] == bodies[1]["query"]
+        assert [body["variables"] for body in bodies] == [{"id_0": 1}, {"id_0": 2}]
+
+    @pytest.mark.asyncio
+    async def test_prepared_paginated_request(self, fake_anilist: FakeAnilist):
+        """A prepared list field can be used for paginated requests, and missing placeholders are left out of the query."""
+        bodies: List[Dict[str, Any]] = []
+
+        def handler(request: httpx.Request) -> httpx.Response:
+            body = json.loads(request.content)
+            bodies.append(body)
+            page = body["variables"]["page_0"]
+
+            return httpx.Response(
+                200,
+                json={
+                    "data": {
+                        "Page": {
+                            "pageInfo": {
+                                "hasNextPage": page < TOTAL_PAGES,
+                                "total": TOTAL_PAGES * ITEMS_PER_PAGE,
+                                "lastPage": TOTAL_PAGES,
+                            },
+                            "media": [
+                                {"id": (page - 1) * ITEMS_PER_PAGE + i}
+                                for i in range(ITEMS_PER_PAGE)
+                            ],
+                        }
+                    }
+                },
+            )
+
+        media_query = PreparedQuery(
+            PageFields.media(
+                search=placeholder("search"), season_year=placeholder("season_year")
+            ).fields(MediaFields.id)
+        )
+
+        fake_anilist.handler = handler
+
+        async with AnilistClient(use_auth=False) as client:
+            results = await client.paginated_anilist_request(
+                media_query,
+                per_page=ITEMS_PER_PAGE,
+                concurrency=3,
+                variables={"search": "Frieren", "season_year": None},
+            )
+
+        assert [item["id"] for item in results] == list(
+            range(TOTAL_PAGES * ITEMS_PER_PAGE)
+        )
+        assert len(bodies) == TOTAL_PAGES
+        assert bodies[0]["variables"] == {
+            "page_0": 1,
+            "perPage_0": ITEMS_PER_PAGE,
+            "search_0": "Frieren",
+        }
+        # Only the first page asks for the totals, so the other pages share one document.
+        assert len({body["query"] for body in bodies}) == 2
@@ -0,0 +1,174 @@
+import re
+
+from graphql import OperationType, parse, print_ast
+
+from nifty_anilist.client.custom_fields import (
+    ListActivityFields,
+    MediaFields,
+    MediaListFields,
+    MediaTitleFields,
+    PageFields,
+    TextActivityFields,
+)
+from nifty_anilist.client.custom_mutations import Mutation
+from nifty_anilist.client.custom_queries import Query
+from nifty_anilist.client.enums import MediaType, ScoreFormat
+from nifty_anilist.graphql_client import _compiled_operations, GraphQLClient
+from nifty_anilist.prebuilt.media import MEDIA_LIST_QUERY
+
+
+def get_media_list_query(user_id: int, score_format: ScoreFormat):
+    return Query.media_list(user_id=user_id).fields(
+        MediaListFields.id,
+        MediaListFields.score(format=score_format),
+        MediaListFields.media().fields(
+            MediaFields.id,
+            MediaFields.title().fields(MediaTitleFields.romaji()),
+        ),
+    )
+
+
+class TestCompiledOperations:
+
+    def test_same_structure_is_compiled_once(self):
+        """Operations with the same fields but different argument values reuse the printed document, and get the same result as building it from scratch."""
+        client = GraphQLClient(url="https://graphql.anilist.co")
+        _compiled_operations.clear()
+
+        for user_id, score_format in [
+            (1, ScoreFormat.POINT_10),
+            (2, ScoreFormat.POINT_100),
+            (3, ScoreFormat.POINT_5),
+        ]:
+            query_request = get_media_list_query(user_id, score_format)
+            expected = client._compile_custom_operation(
+                query_request,
+                operation_type=OperationType.QUERY,
+                operation_name="media_list",
+            )
+            assert (
+                client.build_custom_operation(
+                    get_media_list_query(user_id, score_format),
+                    operation_type=OperationType.QUERY,
+                    operation_name="media_list",
+                )
+                == expected
+            )
+            assert expected[1] == {"userId_0": user_id, "format_0": score_format}
+
+        assert len(_compiled_operations) == 1
+
+        # A different structure (here, an alias) gets its own document.
+        query, _ = client.build_custom_operation(
+            get_media_list_query(1, ScoreFormat.POINT_10).alias("list"),
+            operation_type=OperationType.QUERY,
+            operation_name="media_list",
+        )
+        assert "list: MediaList" in query
+        assert len(_compiled_operations) == 2
+
+
+def get_test_operations():
+    """Operations that cover everything the printers need to handle."""
+    return [
+        (OperationType.QUERY, [get_media_list_query(1, ScoreFormat.POINT_10)]),
+        # Long argument lists are split over several lines.
+        (OperationType.QUERY, list(MEDIA_LIST_QUERY.get_page_query().fields)),
+        # Aliases, several root fields and arguments with the same name.
+        (
+            OperationType.QUERY,
+            [
+                Query.media(id=1).alias("first").fields(MediaFields.id),
+                Query.media(id=2, type=MediaType.ANIME).fields(
+                    MediaFields.id,
+                    MediaFields.description(as_html=False),
+                    MediaFields.title().fields(MediaTitleFields.romaji(stylised=True)),
+                ),
+            ],
+        ),
+        # Inline fragments.
+        (
+            OperationType.QUERY,
+            [
+                Query.page(page=1).fields(
+                    PageFields.activities(user_id=1)
+                    .on(
+                        "TextActivity",
+                        TextActivityFields.id,
+                        TextActivityFields.text(),
+                    )
+                    .on("ListActivity", ListActivityFields.id)
+                )
+            ],
+        ),
+        # No variables.
+        (OperationType.QUERY, [Query.viewer().fields()]),
+        (
+            OperationType.MUTATION,
+            [
+                Mutation.save_media_list_entry(media_id=1, progress=5).fields(
+                    MediaListFields.id
+                )
+            ],
+        ),
+    ]
+
+
+class TestOperationPrinter:
+
+    def test_same_output_as_print_ast(self):
+        """Writing the document straight from the fields gives the same document and variables as building the AST and printing it."""
+        client = GraphQLClient(url="https://graphql.anilist.co")
+
+        for operation_type, fields in get_test_operations():
+            assert client._print_custom_operation(
+                *fields, operation_type=operation_type, operation_name="operation"
+            ) == client._compile_custom_operation(
+                *fields, operation_type=operation_type, operation_name="operation"
+            )
+
+    def test_compact_operation(self):
+        """The compact document is the same operation as the normal one, with short variable names and no extra whitespace."""
+        client = GraphQLClient(url="https://graphql.anilist.co")
+
+        for operation_type, fields in get_test_operations():
+            query, variables = client._print_custom_operation(
+                *fields, operation_type=operation_type, operation_name="operation"
+            )
+            compact_query, compact_variables = client._print_compact_operation(
+                *fields, operation_type=operation_type, operation_name="operation"
+            )
+
+            assert "\n" not in compact_query
+            assert list(compact_variables.values()) == list(variables.values())
+
+            # With the original variable names, it prints the same as the normal document.
+            variable_names = dict(zip(compact_variables, variables))
+            renamed_query = re.sub(
+                r"\$(\w+)", lambda match: "$" + variable_names[match[1]], compact_query
+            )
+            assert print_ast(parse(renamed_query)) == query
+
+    def test_compact_queries_report_bytes_saved(self):
+        """A client with compact queries counts the bytes it saved in every operation it builds, including compiled ones."""
+        client = GraphQLClient(url="https://graphql.anilist.co", compact_queries=True)
+        fields = MEDIA_LIST_QUERY.get_page_query().fields
+        query, variables = client._print_custom_operation(
+            *fields, operation_type=OperationType.QUERY, operation_name="operation"
+        )
+
+        for _ in range(2):
+            compact_query, compact_variables = client.build_custom_operation(
+                *fields, operation_type=OperationType.QUERY, operation_name="operation"
+            )
+
+        assert compact_query.startswith("query operation($a:Int$b:Int")
+        assert len(compact_variables) == len(variables)
+        bytes_saved = (
+            len(query)
+            - len(compact_query)
+            + len("".join(variables))
+            - len("".join(compact_variables))
+        )
+        assert bytes_saved > len(query) / 3
+        assert client.bytes_saved == 2 * bytes_saved
@@ -0,0 +1,184 @@
+import asyncio
+import sqlite3
+import zlib
+
+import pytest
+
+from nifty_anilist.utils.cache_utils import (
+    MemoryResponseCache,
+    SQLiteResponseCache,
+    TieredResponseCache,
+)
+from test.util.fake_clock import FakeClock
+
+
+@pytest.fixture
+def fake_clock():
+    fake_clock = FakeClock()
+    with fake_clock.patch("nifty_anilist.utils.cache_utils"):
+        yield fake_clock
+
+
+class TestMemoryResponseCache:
+
+    def test_ttl(self, fake_clock: FakeClock):
+        """Results expire after their own TTL, or the default one."""
+        cache = MemoryResponseCache(default_ttl_seconds=60)
+        cache.set("default", {"a": 1})
+        cache.set("short", {"b": 2}, ttl_seconds=10)
+        cache.set("skipped", {"c": 3}, ttl_seconds=0)
+
+        assert cache.get("default") == {"a": 1}
+        assert cache.get("short") == {"b": 2}
+        assert cache.get("skipped") is None
+
+        fake_clock.now += 30
+        assert cache.get("default") == {"a": 1}
+        assert cache.get("short") is None
+
+        fake_clock.now += 30
+        assert cache.get("default") is None
+        assert len(cache) == 0
+        assert (cache.stats.hits, cache.stats.misses) == (3, 3)
+
+    def test_lru_eviction(self, fake_clock: FakeClock):
+        """When the cache is over its size, the least recently used results are removed first."""
+        entry_size = len(b'{"value": 0}')
+        cache = MemoryResponseCache(max_bytes=3 * entry_size)
+
+        for value in range(3):
+            cache.set(str(value), {"value": value})
+
+        # Using "0" makes "1" the least recently used.
+        cache.get("0")
+        cache.set("3", {"value": 3})
+
+        assert cache.get("1") is None
+        assert [cache.get(key) for key in ["0", "2", "3"]] == [
+            {"value": 0},
+            {"value": 2},
+            {"value": 3},
+        ]
+        assert cache.size_bytes == 3 * entry_size
+        assert cache.stats.evictions == 1
+
+        # A result bigger than the whole cache is not stored.
+        cache.set("huge", {"value": "x" * 100})
+        assert cache.get("huge") is None
+        assert len(cache) == 3
+
+
+class TestSQLiteResponseCache:
+
+    def test_persists_compressed(self, fake_clock: FakeClock, tmp_path):
+        """Results are stored compressed and are still there for a new cache using the same file, like after a restart."""
+        path = str(tmp_path / "cache.sqlite3")
+        result = {"Media": {"description": "A long description. " * 100}}
+
+        SQLiteResponseCache(path).set("media", result, ttl_seconds=60)
+
+        cache = SQLiteResponseCache(path)
+        assert cache.get("media") == result
+
+        stored = sqlite3.connect(path).execute("SELECT value FROM responses").fetchone()
+        assert len(stored[0]) < len(str(result))
+        assert zlib.decompress(stored[0]).startswith(b'{"Media"')
+
+        fake_clock.now += 60
+        assert cache.get("media") is None
+
+    def test_sweeps_expired(self, fake_clock: FakeClock, tmp_path):
+        """Expired results are removed from the database every sweep interval."""
+        cache = SQLiteResponseCache(
+            str(tmp_path / "cache.sqlite3"), sweep_interval_seconds=100
+        )
+        cache.set("short", {"a": 1}, ttl_seconds=10)
+        cache.set("long", {"b": 2}, ttl_seconds=1000)
+
+        fake_clock.now += 50
+        cache.set("other", {"c": 3})
+        assert cache.remove_expired() == 1
+
+        cache.set("short", {"a": 1}, ttl_seconds=10)
+        fake_clock.now += 100
+        cache.set("other", {"c": 3})
+        assert cache.remove_expired() == 0
+        assert len(cache) == 2
+
+    def test_stale_grace(self, fake_clock: FakeClock, tmp_path):
+        """Expired results are kept for the grace window, but only returned when stale results are allowed."""
+        cache = SQLiteResponseCache(
+            str(tmp_path / "cache.sqlite3"), stale_grace_seconds=100
+        )
+        cache.set("media", {"a": 1}, ttl_seconds=10)
+
+        fake_clock.now += 50
+        assert cache.get("media") is None
+        assert cache.get_with_ttl("media", allow_stale=True) == ({"a": 1}, -40)
+        assert cache.remove_expired() == 0
+
+        fake_clock.now += 100
+        assert cache.get_with_ttl("media", allow_stale=True) is None
+        assert cache.remove_expired() == 1
+        assert cache.stats.stale_hits == 1
+
+    @pytest.mark.asyncio
+    async def test_does_not_block_event_loop(self, tmp_path):
+        """Waiting for another process to unlock the database doesn't block the event loop, and missing folders are created."""
+        path = str(tmp_path / "missing" / "cache.sqlite3")
+        cache = TieredResponseCache(MemoryResponseCache(), SQLiteResponseCache(path))
+        await cache.set_async("media", {"a": 1}, tags=["Media:1"])
+        await cache.set_async("other", {"b": 2})
+
+        other_process = sqlite3.connect(path, isolation_level=None)
+        other_process.execute("BEGIN IMMEDIATE")
+
+        invalidate = asyncio.ensure_future(cache.invalidate_tags_async(["Media:1"]))
+        await asyncio.sleep(0.05)
+        assert not invalidate.done()
+
+        # Results in the memory tier are still returned right away.
+        assert await cache.get_with_ttl_async("other") is not None
+
+        other_process.execute("COMMIT")
+        assert await asyncio.wait_for(invalidate, timeout=5) == ["media"]
+        assert await cache.get_with_ttl_async("media") is None
+
+    def test_tiered(self, fake_clock: FakeClock, tmp_path):
+        """Results found on disk are copied to memory with the TTL they had left."""
+        path = str(tmp_path / "cache.sqlite3")
+        SQLiteResponseCache(path).set("media", {"a": 1}, ttl_seconds=60)
+
+        memory_cache = MemoryResponseCache()
+        cache = TieredResponseCache(memory_cache, SQLiteResponseCache(path))
+        fake_clock.now += 30
+
+        assert memory_cache.get("media") is None
+        assert cache.get("media") == {"a": 1}
+        assert memory_cache.get("media") == {"a": 1}
+
+        fake_clock.now += 30
+        assert memory_cache.get("media") is None
+        assert cache.get("media") is None
+
+    def test_invalidate_tags(self, fake_clock: FakeClock, tmp_path):
+        """Results are removed from both tiers by the tags they were stored with."""
+        path = str(tmp_path / "cache.sqlite3")
+        memory_cache = MemoryResponseCache()
+        sqlite_cache = SQLiteResponseCache(path)
+        cache = TieredResponseCache(memory_cache, sqlite_cache)
+
+        cache.set("list", {"a": 1}, tags=["MediaList:1", "MediaList:2"])
+        cache.set("entry", {"b": 2}, tags=["MediaList:2"])
+        cache.set("media", {"c": 3}, tags=["Media:1"])
+
+        assert sorted(cache.invalidate_tags(["MediaList:2"])) == ["entry", "list"]
+        assert cache.get("list") is None
+        assert sqlite_cache.get("entry") is None
+        assert cache.get("media") == {"c": 3}
+
+        # Tags of removed results are cleaned up too.
+        assert cache.invalidate_tags(["MediaList:1"]) == []
+        assert sqlite3.connect(path).execute(
+            "SELECT COUNT(*) FROM response_tags"
+        ).fetchone() == (1,)
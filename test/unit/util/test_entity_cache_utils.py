@@ -0,0 +1,254 @@
+from graphql import print_ast
+
+from nifty_anilist.client.custom_fields import (
+    MediaFields,
+    MediaListFields,
+    MediaTitleFields,
+    PageFields,
+    ThreadCommentFields,
+    UserFields,
+)
+from nifty_anilist.client.custom_queries import Query
+from nifty_anilist.utils.entity_cache_utils import EntityCache
+
+
+def get_media_list_query(user_id: int):
+    return Query.page().fields(
+        PageFields.media_list(user_id=user_id).fields(
+            MediaListFields.id,
+            MediaListFields.score(),
+            MediaListFields.media().fields(
+                MediaFields.id,
+                MediaFields.title().fields(MediaTitleFields.romaji()),
+            ),
+        )
+    )
+
+
+def get_media_list_result(user_id: int, media_ids: range):
+    return {
+        "Page": {
+            "mediaList": [
+                {
+                    "id": user_id * 1000 + media_id,
+                    "score": 80,
+                    "media": {"id": media_id, "title": {"romaji": f"Media {media_id}"}},
+                }
+                for media_id in media_ids
+            ]
+        }
+    }
+
+
+class TestEntityCache:
+
+    def test_entities_are_stored_once(self):
+        """The same media in the lists of several users is only stored once, and each query result is rebuilt from the entities."""
+        cache = EntityCache()
+
+        for user_id in [1, 2, 3]:
+            cache.write(
+                [get_media_list_query(user_id)],
+                get_media_list_result(user_id, range(10)),
+            )
+
+        # 30 list entries, 10 media and the page (which holds the lists of all 3 users).
+        assert len(cache) == 41
+        assert cache.get_entity("Media:5") == {
+            "id": 5,
+            "title": {"romaji": "Media 5", "__typename": "MediaTitle"},
+        }
+
+        for user_id in [1, 2, 3]:
+            assert cache.read([get_media_list_query(user_id)]) == (
+                get_media_list_result(user_id, range(10))
+            )
+
+        assert cache.read([get_media_list_query(4)]) is None
+
+    def test_partial_fields_are_merged(self):
+        """Fields of the same entity from different queries are merged, and a lookup by ID can be answered once all of its fields are there."""
+        cache = EntityCache()
+        cache.write([get_media_list_query(1)], get_media_list_result(1, range(1, 2)))
+
+        detail_query = Query.media(id=1).fields(
+            MediaFields.id,
+            MediaFields.episodes,
+            MediaFields.title().fields(
+                MediaTitleFields.romaji(), MediaTitleFields.english()
+            ),
+        )
+        assert cache.read([detail_query]) is None
+
+        cache.write(
+            [Query.media(id=1).fields(MediaFields.id, MediaFields.episodes)],
+            {"Media": {"id": 1, "episodes": 12}},
+        )
+        cache.write(
+            [
+                Query.media(id=1).fields(
+                    MediaFields.id,
+                    MediaFields.title().fields(MediaTitleFields.english()),
+                )
+            ],
+            {"Media": {"id": 1, "title": {"english": "English 1"}}},
+        )
+
+        assert cache.read([detail_query.alias("detail")]) == {
+            "detail": {
+                "id": 1,
+                "episodes": 12,
+                "title": {"romaji": "Media 1", "english": "English 1"},
+            }
+        }
+
+    def test_records_are_per_user(self):
+        """Nothing fetched for one user is used to answer another user's query, or a query without auth."""
+        cache = EntityCache()
+        list_query = Query.page().fields(
+            PageFields.media_list(user_id=5).fields(
+                MediaListFields.id, MediaListFields.notes, MediaListFields.private
+            )
+        )
+        user_query = Query.user(id=5).fields(
+            UserFields.id, UserFields.unread_notification_count
+        )
+
+        cache.write(
+            [list_query],
+            {"Page": {"mediaList": [{"id": 7, "notes": "Secret", "private": True}]}},
+            scope="Bearer USER_A",
+        )
+        cache.write(
+            [user_query],
+            {"User": {"id": 5, "unreadNotificationCount": 3}},
+            scope="Bearer USER_A",
+        )
+
+        assert cache.read([list_query], scope="Bearer USER_A") == {
+            "Page": {"mediaList": [{"id": 7, "notes": "Secret", "private": True}]}
+        }
+        assert cache.read([user_query], scope="Bearer USER_A") == {
+            "User": {"id": 5, "unreadNotificationCount": 3}
+        }
+
+        for scope in ["Bearer USER_B", ""]:
+            assert cache.read([list_query], scope=scope) is None
+            assert cache.read([user_query], scope=scope) is None
+            assert cache.get_missing_fields([user_query], scope=scope) is None
+            assert cache.get_entity("MediaList:7", scope=scope) is None
+
+        # Evicting an entity removes it for every user.
+        cache.write([user_query], {"User": {"id": 5, "unreadNotificationCount": 0}})
+        cache.evict("User:5")
+        assert cache.get_entity("User:5") is None
+        assert cache.get_entity("User:5", scope="Bearer USER_A") is None
+
+    def test_ttl(self):
+        """Nothing is stored with a TTL of 0."""
+        cache = EntityCache()
+        cache.write(
+            [Query.media(id=1).fields(MediaFields.id)],
+            {"Media": {"id": 1}},
+            ttl_seconds=0,
+        )
+        assert len(cache) == 0
+
+    def test_missing_fields(self):
+        """Only the fields that are not cached are left in the query, along with the IDs needed to merge them."""
+        cache = EntityCache()
+        cache.write([get_media_list_query(1)], get_media_list_result(1, range(1, 2)))
+
+        detail_query = Query.media(id=1).fields(
+            MediaFields.episodes,
+            MediaFields.title().fields(
+                MediaTitleFields.romaji(), MediaTitleFields.english()
+            ),
+        )
+        missing_requests = cache.get_missing_fields([detail_query])
+
+        assert missing_requests is not None
+        assert [print_ast(field.to_ast(0)) for field in missing_requests] == [
+            "Media(id: $id_0) {\n  id\n  episodes\n  title {\n    english\n  }\n}"
+        ]
+        # The original query is not changed.
+        assert len(detail_query._subfields) == 2
+
+        cache.write(
+            missing_requests,
+            {"Media": {"id": 1, "episodes": 12, "title": {"english": "English 1"}}},
+        )
+        assert cache.get_missing_fields([detail_query]) == []
+        assert cache.read([detail_query]) == {
+            "Media": {
+                "episodes": 12,
+                "title": {"romaji": "Media 1", "english": "English 1"},
+            }
+        }
+
+        # Nothing can be left out of a query that has nothing cached.
+        assert cache.get_missing_fields([get_media_list_query(2)]) is None
+
+    def test_evict(self):
+        """Entities and fields holding a type are removed for every user, and the indexes used to find them stay in step with the records."""
+        cache = EntityCache(max_records=30)
+
+        for scope in ["user 1", "user 2"]:
+            cache.write(
+                [get_media_list_query(1)],
+                get_media_list_result(1, range(5)),
+                scope=scope,
+            )
+
+        cache.evict("Media:1")
+        assert cache.get_entity("Media:1", scope="user 1") is None
+        assert cache.get_entity("Media:2", scope="user 2") is not None
+
+        # The lists only hold "MediaList" entries, so the page results are removed, but not the entries themselves.
+        cache.evict_type(["MediaList"])
+        assert cache.read([get_media_list_query(1)], scope="user 1") is None
+        assert cache.get_entity("MediaList:1002", scope="user 2") is not None
+
+        # Fill the cache so that the least recently used records are removed too.
+        for user_id in range(2, 5):
+            cache.write(
+                [get_media_list_query(user_id)],
+                get_media_list_result(user_id, range(5)),
+            )
+
+        assert len(cache) == 30
+        assert sum(len(keys) for keys in cache._keys_by_ref.values()) == 30
+        assert {
+            key for keys in cache._keys_by_typename.values() for key in keys
+        } <= set(cache._records)
+
+        cache.clear()
+        assert cache._keys_by_ref == {}
+        assert cache._keys_by_typename == {}
+
+    def test_list_root_by_id(self):
+        """A root field that returns a list is never answered with a single cached entity, even when it is looked up by ID."""
+        cache = EntityCache()
+        cache.write(
+            [
+                Query.page().fields(
+                    PageFields.thread_comments(thread_id=1).fields(
+                        ThreadCommentFields.id, ThreadCommentFields.comment()
+                    )
+                )
+            ],
+            {"Page": {"threadComments": [{"id": 5, "comment": "Comment 5"}]}},
+        )
+
+        comment_query = Query.thread_comment(id=5).fields(
+            ThreadCommentFields.id, ThreadCommentFields.comment()
+        )
+        assert cache.read([comment_query]) is None
+        assert cache.get_missing_fields([comment_query]) is None
+
+        cache.write(
+            [comment_query], {"ThreadComment": [{"id": 5, "comment": "Comment 5"}]}
+        )
+        assert cache.read([comment_query]) == {
+            "ThreadComment": [{"id": 5, "comment": "Comment 5"}]
+        }
@@ -0,0 +1,73 @@
+import asyncio
+from typing import List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from nifty_anilist.utils.http_utils import create_pooled_transport, SharedTransport
+
+
+class CountingTransport(httpx.MockTransport):
+    """Fake transport that keeps track of whether it was closed."""
+
+    def __init__(self) -> None:
+        super().__init__(lambda request: httpx.Response(200, json={"data": {}}))
+        self.closed = False
+
+    async def aclose(self) -> None:
+        self.closed = True
+
+
+class TestSharedTransport:
+
+    @pytest.mark.asyncio
+    async def test_clients_share_transport(self):
+        """All clients use the same pool, which stays open when one of them is closed."""
+        transports: List[CountingTransport] = []
+
+        def create_transport() -> CountingTransport:
+            transports.append(CountingTransport())
+            return transports[-1]
+
+        shared_transport = SharedTransport(create_transport)
+
+        for _ in range(3):
+            async with httpx.AsyncClient(transport=shared_transport) as http_client:
+                response = await http_client.post("https://graphql.anilist.co")
+                assert response.status_code == 200
+
+        assert len(transports) == 1
+        assert not transports[0].closed
+
+        await shared_transport.close()
+        assert transports[0].closed
+
+        # A new pool is made for the next requests.
+        async with httpx.AsyncClient(transport=shared_transport) as http_client:
+            await http_client.post("https://graphql.anilist.co")
+
+        assert len(transports) == 2
+
+    def test_one_pool_per_event_loop(self):
+        """Connections can't move between event loops, so each loop gets its own pool."""
+        shared_transport = SharedTransport(CountingTransport)
+
+        async def get_transport():
+            return shared_transport.get_transport()
+
+        first_transport = asyncio.run(get_transport())
+        second_transport = asyncio.run(get_transport())
+
+        assert first_transport is not second_transport
+
+    def test_http2_needs_extra(self):
+        """Turning on HTTP/2 without the `h2` package gives an error that says how to install it."""
+        with (
+            patch(
+                "nifty_anilist.utils.http_utils.anilist_settings.http2_enabled", True
+            ),
+            patch.dict("sys.modules", {"h2": None}),
+        ):
+            with pytest.raises(ImportError, match=r"nifty_anilist\[http2\]"):
+                create_pooled_transport()
@@ -0,0 +1,96 @@
+import json
+from enum import Enum
+
+import pytest
+
+from nifty_anilist.client.enums import MediaType
+from nifty_anilist.client.input_types import FuzzyDateInput
+from nifty_anilist.settings import JsonCodecType
+from nifty_anilist.utils.json_utils import (
+    close_decode_process_pool,
+    create_json_codec,
+    get_decode_process_pool,
+    JsonCodec,
+    StdlibJsonCodec,
+)
+
+
+class Season(Enum):
+    WINTER = 1
+
+
+def get_installed_codecs():
+    """Get a codec for each JSON library that is installed."""
+    codecs = []
+
+    for codec_type in (
+        JsonCodecType.STDLIB,
+        JsonCodecType.ORJSON,
+        JsonCodecType.MSGSPEC,
+    ):
+        try:
+            codecs.append(create_json_codec(codec_type))
+        except ImportError:
+            pass
+
+    return codecs
+
+
+class TestJsonCodecs:
+
+    @pytest.mark.parametrize("codec", get_installed_codecs(), ids=lambda c: c.name)
+    def test_same_json_as_stdlib(self, codec: JsonCodec):
+        """Every codec encodes enums and pydantic inputs the same way, and decodes what it encoded."""
+        value = {
+            "type_0": MediaType.ANIME,
+            "season_0": Season.WINTER,
+            "startDate_0": FuzzyDateInput(year=2024, month=1),
+            "ids_0": [1, 2, 3],
+            "search_0": "Sōsō no Frieren",
+        }
+        expected = {
+            "type_0": "ANIME",
+            "season_0": 1,
+            "startDate_0": {"year": 2024, "month": 1, "day": None},
+            "ids_0": [1, 2, 3],
+            "search_0": "Sōsō no Frieren",
+        }
+
+        assert json.loads(codec.encode(value)) == expected
+        assert codec.decode(codec.encode(value)) == expected
+        assert codec.decode(StdlibJsonCodec().encode(value)) == expected
+
+        with pytest.raises(ValueError):
+            codec.decode(b'{"data": ')
+
+    @pytest.mark.asyncio
+    @pytest.mark.parametrize("codec", get_installed_codecs(), ids=lambda c: c.name)
+    async def test_decode_off_event_loop(self, codec: JsonCodec):
+        """Responses over the size thresholds are decoded in a worker thread or in another process, with the same result."""
+        content = codec.encode({"data": {"Page": {"media": [{"id": 1}] * 100}}})
+        expected = codec.decode(content)
+
+        for thread_threshold, process_threshold in [
+            (None, None),
+            (len(content), None),
+            (0, len(content)),
+        ]:
+            codec.thread_threshold_bytes = thread_threshold
+            codec.process_threshold_bytes = process_threshold
+            assert await codec.decode_async(content) == expected
+
+        with pytest.raises(ValueError):
+            await codec.decode_async(b'{"data": ')
+
+    @pytest.mark.asyncio
+    async def test_decode_process_pool(self):
+        """The decoding processes aren't forked from the current process, and can be stopped."""
+        codec = StdlibJsonCodec(process_threshold_bytes=0)
+        assert await codec.decode_async(b'{"data": 1}') == {"data": 1}
+
+        pool = get_decode_process_pool()
+        assert pool._mp_context.get_start_method() in ("forkserver", "spawn")
+
+        close_decode_process_pool()
+        assert get_decode_process_pool() is not pool
+        close_decode_process_pool()
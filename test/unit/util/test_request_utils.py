@@ -0,0 +1,236 @@
+import asyncio
+import sqlite3
+from time import monotonic
+from typing import List
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from nifty_anilist.client.exceptions import GraphQLClientHttpError
+from nifty_anilist.utils.rate_limit_utils import (
+    MemoryRateLimiterBackend,
+    RequestPriority,
+    SQLiteRateLimiterBackend,
+)
+from nifty_anilist.utils.request_utils import (
+    RATE_LIMITER,
+    RateLimiter,
+    run_request_with_retry,
+)
+from test.util.fake_clock import FakeClock
+
+
+@pytest.fixture
+def fake_clock():
+    fake_clock = FakeClock()
+    with (
+        fake_clock.patch(
+            "nifty_anilist.utils.request_utils", "nifty_anilist.utils.rate_limit_utils"
+        ),
+        patch("nifty_anilist.utils.request_utils.asyncio.sleep", fake_clock.sleep),
+    ):
+        yield fake_clock
+
+
+class TestRateLimiter:
+
+    @pytest.mark.asyncio
+    async def test_waits_exactly_until_slot_frees(self, fake_clock: FakeClock):
+        """When the limit is reached, the limiter waits until the oldest request leaves the window."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+
+        await rate_limiter.acquire(max_requests=3)
+        fake_clock.now += 10
+        await rate_limiter.acquire(max_requests=3)
+        await rate_limiter.acquire(max_requests=3)
+        assert fake_clock.sleeps == []
+        assert rate_limiter.get_request_count() == 3
+
+        # The first request was made 10 seconds ago, so its slot frees up in 50 seconds.
+        await rate_limiter.acquire(max_requests=3)
+        assert fake_clock.sleeps == [50]
+
+        # The next two requests were made at the same time, so both of their slots free up together.
+        fake_clock.now += 5
+        await rate_limiter.acquire(max_requests=3)
+        assert fake_clock.sleeps == [50, 5]
+        assert rate_limiter.get_request_count() == 2
+
+    @pytest.mark.asyncio
+    async def test_lower_limit(self, fake_clock: FakeClock):
+        """Lowering the limit waits for enough requests to leave the window."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+
+        for _ in range(5):
+            await rate_limiter.acquire(max_requests=5)
+            fake_clock.now += 1
+
+        assert rate_limiter.get_delay(max_requests=2) == pytest.approx(58)
+
+        rate_limiter.reset()
+        assert rate_limiter.get_delay(max_requests=2) == 0
+
+    @pytest.mark.asyncio
+    async def test_uses_limit_from_headers(self, fake_clock: FakeClock):
+        """The limit from Anilist's headers is used if it is lower than our own."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+        rate_limiter.update_from_headers(
+            {"X-RateLimit-Limit": "2", "X-RateLimit-Remaining": "2"}
+        )
+
+        await rate_limiter.acquire(max_requests=10)
+        await rate_limiter.acquire()
+        assert rate_limiter.get_delay(max_requests=10) == 60
+
+    @pytest.mark.asyncio
+    async def test_waits_when_no_requests_remaining(self, fake_clock: FakeClock):
+        """No requests are made once Anilist says there are none left, until the budget resets."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+
+        # Requests made by someone else used up the budget, and Anilist told us when it resets.
+        rate_limiter.update_from_headers(
+            {
+                "X-RateLimit-Limit": "90",
+                "X-RateLimit-Remaining": "0",
+                "X-RateLimit-Reset": str(int(fake_clock.time()) + 30),
+            }
+        )
+        await rate_limiter.acquire()
+        assert fake_clock.sleeps == [30]
+
+        # Without a reset time, assume the budget resets after a full window.
+        rate_limiter.update_from_headers(
+            {"X-RateLimit-Limit": "90", "X-RateLimit-Remaining": "1"}
+        )
+        await rate_limiter.acquire()
+        await rate_limiter.acquire()
+        assert fake_clock.sleeps == [30, 60]
+
+    @pytest.mark.asyncio
+    async def test_pause_holds_all_requests(self, fake_clock: FakeClock):
+        """While paused, every request waits until the pause is over, plus some jitter."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+        rate_limiter.pause(30)
+        rate_limiter.pause(10)  # A shorter pause doesn't shorten the current one.
+
+        await rate_limiter.acquire(release_jitter_seconds=2)
+        sleeps = list(fake_clock.sleeps)
+        assert 30 <= sum(sleeps) <= 32
+
+        await rate_limiter.acquire(release_jitter_seconds=2)
+        assert fake_clock.sleeps == sleeps
+
+    @pytest.mark.asyncio
+    async def test_pause_releases_waiters_at_different_times(self):
+        """Requests waiting behind a pause are each released at their own time within the jitter, in order."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+        rate_limiter.pause(0.1)
+        start = monotonic()
+        released: List[float] = []
+
+        async def acquire():
+            await rate_limiter.acquire(release_jitter_seconds=0.4)
+            released.append(monotonic() - start)
+
+        await asyncio.gather(*(acquire() for _ in range(8)))
+
+        assert released == sorted(released)
+        assert all(0.1 <= release < 0.6 for release in released)
+        assert released[-1] - released[0] > 0.05
+
+    @pytest.mark.asyncio
+    async def test_sqlite_backend_is_shared(self, fake_clock: FakeClock, tmp_path):
+        """Rate limiters using the same SQLite database share their requests and pauses, like separate processes would."""
+        path = str(tmp_path / "rate_limit.sqlite3")
+        first_limiter = RateLimiter(SQLiteRateLimiterBackend(path, period_seconds=60))
+        second_limiter = RateLimiter(SQLiteRateLimiterBackend(path, period_seconds=60))
+
+        await first_limiter.acquire(max_requests=2)
+        fake_clock.now += 10
+        await second_limiter.acquire(max_requests=2)
+        assert first_limiter.get_request_count() == 2
+
+        # The first request was made 10 seconds ago, so its slot frees up in 50 seconds.
+        await first_limiter.acquire(max_requests=2)
+        assert fake_clock.sleeps == [50]
+
+        second_limiter.pause(30)
+        await first_limiter.acquire(release_jitter_seconds=0)
+        assert fake_clock.sleeps == [50, 30]
+
+    @pytest.mark.asyncio
+    async def test_sqlite_backend_does_not_block_event_loop(self, tmp_path):
+        """Waiting for another process to unlock the SQLite database doesn't block the event loop."""
+        path = str(tmp_path / "rate_limit.sqlite3")
+        rate_limiter = RateLimiter(SQLiteRateLimiterBackend(path, period_seconds=60))
+        rate_limiter.reset()
+
+        other_process = sqlite3.connect(path, isolation_level=None)
+        other_process.execute("BEGIN IMMEDIATE")
+
+        acquire = asyncio.ensure_future(rate_limiter.acquire(max_requests=10))
+        await asyncio.sleep(0.05)
+        assert not acquire.done()
+
+        other_process.execute("COMMIT")
+        await asyncio.wait_for(acquire, timeout=5)
+        assert rate_limiter.get_request_count() == 1
+
+    @pytest.mark.asyncio
+    async def test_higher_priority_goes_first(self, fake_clock: FakeClock):
+        """Waiting requests get their slot by priority, then deadline, then arrival."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+        rate_limiter.pause(10)
+        acquired: List[str] = []
+
+        async def acquire(name: str, priority: RequestPriority, deadline=None):
+            await rate_limiter.acquire(priority=priority, deadline=deadline)
+            acquired.append(name)
+
+        await asyncio.gather(
+            acquire("low 1", RequestPriority.LOW),
+            acquire("low 2", RequestPriority.LOW),
+            acquire("normal", RequestPriority.NORMAL),
+            acquire("high", RequestPriority.HIGH),
+            acquire("low with deadline", RequestPriority.LOW, fake_clock.now + 100),
+        )
+
+        assert acquired == ["high", "normal", "low with deadline", "low 1", "low 2"]
+
+    @pytest.mark.asyncio
+    async def test_deadline(self, fake_clock: FakeClock):
+        """A request gives up right away if it can't get a slot before its deadline."""
+        rate_limiter = RateLimiter(MemoryRateLimiterBackend(period_seconds=60))
+        await rate_limiter.acquire(max_requests=1)
+
+        with pytest.raises(TimeoutError):
+            await rate_limiter.acquire(max_requests=1, deadline=fake_clock.now + 10)
+
+        assert fake_clock.sleeps == []
+        await rate_limiter.acquire(max_requests=1, deadline=fake_clock.now + 60)
+        assert fake_clock.sleeps == [60]
+
+    @pytest.mark.asyncio
+    async def test_rate_limit_error_pauses_requests(self, fake_clock: FakeClock):
+        """A rate limit error from Anilist pauses all requests for the "Retry-After" delay, then retries."""
+        RATE_LIMITER.reset()
+        request_times: List[float] = []
+
+        async def rate_limited_once():
+            request_times.append(fake_clock.now)
+            if len(request_times) == 1:
+                raise GraphQLClientHttpError(
+                    status_code=429,
+                    response=httpx.Response(429, headers={"Retry-After": "10"}),
+                )
+            return {"data": True}
+
+        with patch(
+            "nifty_anilist.utils.request_utils.anilist_settings.rate_limit_release_jitter_seconds",
+            0,
+        ):
+            assert await run_request_with_retry(rate_limited_once) == {"data": True}
+
+        assert request_times[1] - request_times[0] == 10
+        RATE_LIMITER.reset()
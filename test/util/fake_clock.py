@@ -0,0 +1,44 @@
+import asyncio
+from contextlib import ExitStack
+from typing import List
+from unittest.mock import patch
+
+
+real_sleep = asyncio.sleep
+
+
+class FakeClock:
+    """Fake clock that only moves forward when told to, or when something sleeps."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.sleeps: List[float] = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def time(self) -> float:
+        return self.now + 1_700_000_000
+
+    async def sleep(self, delay: float) -> None:
+        self.sleeps.append(delay)
+        # Still let other tasks run while "sleeping", like a real sleep would.
+        await real_sleep(0)
+        self.now += delay
+
+    def patch(self, *modules: str) -> ExitStack:
+        """Make some modules use this clock for `monotonic()` and `time()`.
+
+        Args:
+            modules: Import paths of the modules to patch.
+
+        Returns:
+            patches: Context manager that undoes the patches when it exits.
+        """
+        stack = ExitStack()
+
+        for module in modules:
+            stack.enter_context(patch(f"{module}.monotonic", self.monotonic))
+            stack.enter_context(patch(f"{module}.time", self.time))
+
+        return stack